@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+""" Micro-benchmark of the register interface codec.
+
+Compares the per-frame cost of the current codec (precompiled structs packed
+into reusable buffers) with the original implementation (new bytearray and
+int.to_bytes for each request, decoding by hand with shifts).
+
+Run with: python benchmarks/bench_codec.py
+"""
+import io
+import timeit
+from microfpga import regint
+
+N_REPEAT = 5
+N_NUMBER = 200_000
+
+
+def legacy_format_write_request(address, value):
+    if address >= 2**(4 * 8):
+        raise ValueError(f'Address {address} is too large (max 4 bytes).')
+    if address < 0:
+        raise ValueError(f'Address {address} cannot be negative.')
+    if value >= 2**(4 * 8):
+        raise ValueError(f'Value {value} is too large (max 4 bytes).')
+    if value < 0:
+        raise ValueError(f'Address {address} cannot be negative.')
+
+    buff = bytearray(9)
+    buff[0] = 1 << 7
+    buff[1:] = int.to_bytes(address, length=4, byteorder="little")
+    buff[5:] = int.to_bytes(value, length=4, byteorder="little")
+    return buff
+
+
+def legacy_format_read_request(address):
+    if address >= 2**(4 * 8):
+        raise ValueError(f'Address {address} is too large (max 4 bytes).')
+    if address < 0:
+        raise ValueError(f'Address {address} cannot be negative.')
+
+    buff = bytearray(5)
+    buff[0] = 0
+    buff[1:] = int.to_bytes(address, length=4, byteorder="little")
+    return buff
+
+
+def legacy_format_to_int(data):
+    assert len(data) == 4
+    return (
+        (data[0] & 0xFF) |
+        (data[1] & 0xFF) << 8 |
+        (data[2] & 0xFF) << 16 |
+        (data[3] & 0xFF) << 24
+    )
+
+
+def per_frame_ns(statement, setup="pass", global_vars=None):
+    """ Return the best per-call time in ns of a statement. """
+    timer = timeit.Timer(statement, setup=setup, globals=global_vars)
+    best = min(timer.repeat(repeat=N_REPEAT, number=N_NUMBER))
+    return best / N_NUMBER * 1e9
+
+
+def main():
+    buffer = bytearray(regint.WRITE_REQUEST_SIZE)
+    answer = memoryview(bytearray(regint.READ_ANSWER_SIZE))
+    source = io.BytesIO(bytes(regint.READ_ANSWER_SIZE * N_NUMBER))
+    env = {
+        "regint": regint,
+        "legacy_format_write_request": legacy_format_write_request,
+        "legacy_format_read_request": legacy_format_read_request,
+        "legacy_format_to_int": legacy_format_to_int,
+        "buffer": buffer,
+        "answer": answer,
+        "source": source,
+        "unpack_from": regint._READ_ANSWER.unpack_from,
+    }
+
+    cases = [
+        (
+            "write request",
+            "legacy_format_write_request(42, 1048575)",
+            "regint.pack_write_request_into(buffer, 0, 42, 1048575)",
+        ),
+        (
+            "read request",
+            "legacy_format_read_request(42)",
+            "regint.pack_read_request_into(buffer, 0, 42)",
+        ),
+        (
+            "answer decoding",
+            "legacy_format_to_int(b'\\x2a\\x0d\\x07\\x56')",
+            "regint.format_to_int(b'\\x2a\\x0d\\x07\\x56')",
+        ),
+        (
+            "answer read + decoding",
+            "legacy_format_to_int(source.read(4))",
+            "source.readinto(answer); unpack_from(answer)[0]",
+        ),
+    ]
+
+    print(
+        f"{'frame':<24}{'before (ns)':>14}{'after (ns)':>14}"
+        f"{'speed-up':>10}"
+    )
+    for name, before, after in cases:
+        t_before = per_frame_ns(before, "source.seek(0)", env)
+        t_after = per_frame_ns(after, "source.seek(0)", env)
+        print(
+            f"{name:<24}{t_before:>14.1f}{t_after:>14.1f}"
+            f"{t_before / t_after:>9.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,319 @@
+#!/usr/bin/env python
+""" Benchmark suite of the register access paths.
+
+Measures the codec hot paths, the MicroFPGA setters and getters against an
+emulated board behind an in-memory transport, the bulk configuration of the
+lasers and camera, and the analog polling throughput. For each case, the
+median time per call over several repeats is reported along with tracemalloc
+figures: the number of memory blocks allocated (and not freed) per call, and
+the peak memory used by a single call.
+
+Results are written to a JSON file and, if a baseline is given, compared
+against it. The script exits with a non-zero status if a case is slower than
+the baseline by more than the tolerance and by more than the noise floor, or
+allocates more blocks.
+
+Run with:
+    python benchmarks/bench_registers.py --output results.json \
+        --baseline benchmarks/baseline.json
+
+and update the baseline (on the reference machine) with:
+    python benchmarks/bench_registers.py --output benchmarks/baseline.json
+"""
+import argparse
+import json
+import platform
+import statistics
+import sys
+import timeit
+import tracemalloc
+from microfpga import regint, signals
+from microfpga.controller import MicroFPGA
+from microfpga.emulator import Emulator
+
+N_REPEAT = 9
+TOLERANCE = 0.25
+# Slow-downs (ns per call) below the noise floor are not regressions, which
+# matters for the sub-microsecond cases.
+NOISE_FLOOR = 500
+# Number of calls over which the allocations are counted, whatever the
+# number of timed calls, so that amortized allocations compare equally.
+N_ALLOCATION_CALLS = 1_000
+
+
+def _analog(channel, timestamp):
+    return channel
+
+
+def make_controller():
+    """ Return a controller connected to an emulated board, with all signals.
+    """
+    emulator = Emulator("Au", analog=_analog)
+    return MicroFPGA(
+        n_laser=signals.NUM_LASERS,
+        n_ttl=signals.NUM_TTL,
+        n_servo=signals.NUM_SERVOS,
+        n_pwm=signals.NUM_PWM,
+        n_ai=signals.NUM_AI,
+        transport=emulator.open_transport(),
+    )
+
+
+def configure_lasers(mufpga):
+    """ Set the state of all lasers. """
+    for channel in range(mufpga.get_number_lasers()):
+        mufpga.set_laser_state(channel, 2, 1000 + channel, 0xAAAA)
+
+
+def poll_analogs(mufpga):
+    """ Read all analog inputs. """
+    return [
+        mufpga.get_analog_state(channel)
+        for channel in range(mufpga.get_number_analogs())
+    ]
+
+
+def get_cases(mufpga):
+    """ Return the benchmark cases as name -> (function, number of calls per
+    timing, number of register accesses per call).
+    """
+    addresses = list(range(256))
+    values = list(range(256))
+    answers = bytes(4 * 256)
+    mufpga.register_preset(
+        "lasers",
+        {"lasers": [(2, 1000 + i, 0xAAAA) for i in range(signals.NUM_LASERS)]}
+    )
+
+    return {
+        "format_write_request": (
+            lambda: regint.format_write_request(42, 1048575), 100_000, 1
+        ),
+        "format_read_request": (
+            lambda: regint.format_read_request(42), 100_000, 1
+        ),
+        "format_to_int": (
+            lambda: regint.format_to_int(b"\x2a\x0d\x07\x56"), 100_000, 1
+        ),
+        "format_write_requests (256)": (
+            lambda: regint.format_write_requests(addresses, values), 1_000, 256
+        ),
+        "format_to_ints (256)": (
+            lambda: regint.format_to_ints(answers), 1_000, 256
+        ),
+        "set_ttl_state": (
+            lambda: mufpga.set_ttl_state(1, 1), 10_000, 1
+        ),
+        "get_ttl_state": (
+            lambda: mufpga.get_ttl_state(1), 10_000, 1
+        ),
+        "set_servo_state": (
+            lambda: mufpga.set_servo_state(0, 40000), 10_000, 1
+        ),
+        "get_servo_state": (
+            lambda: mufpga.get_servo_state(0), 10_000, 1
+        ),
+        "set_laser_state": (
+            lambda: mufpga.set_laser_state(0, 2, 1000, 0xAAAA), 10_000, 3
+        ),
+        "get_laser_state": (
+            lambda: mufpga.get_laser_state(0), 10_000, 3
+        ),
+        "configure lasers": (
+            lambda: configure_lasers(mufpga), 1_000, 3 * signals.NUM_LASERS
+        ),
+        "activate preset": (
+            lambda: mufpga.activate("lasers", force=True), 1_000,
+            3 * signals.NUM_LASERS
+        ),
+        "set_camera_state": (
+            lambda: mufpga.set_camera_state(100, 200, 300, 400), 10_000, 5
+        ),
+        "get_camera_state": (
+            lambda: mufpga.get_camera_state(), 10_000, 5
+        ),
+        "snapshot": (
+            lambda: mufpga.snapshot(), 1_000,
+            6 + 3 * signals.NUM_LASERS + signals.NUM_TTL +
+            signals.NUM_SERVOS + signals.NUM_PWM + signals.NUM_AI
+        ),
+        "poll analogs": (
+            lambda: poll_analogs(mufpga), 1_000, signals.NUM_AI
+        ),
+        "get_analog_states": (
+            lambda: mufpga.get_analog_states(), 1_000, signals.NUM_AI
+        ),
+    }
+
+
+def measure_times(cases):
+    """ Return the median time per call in ns of each case.
+
+    The repeats of the cases are interleaved, so that a slow period of the
+    machine affects all cases alike instead of a single one.
+    """
+    timings = {name: [] for name in cases}
+    for _ in range(N_REPEAT):
+        for name, (function, number, _) in cases.items():
+            timings[name].append(
+                timeit.Timer(function).timeit(number) / number * 1e9
+            )
+
+    return {name: statistics.median(times) for name, times in timings.items()}
+
+
+def measure_allocations(function, number):
+    """ Return the number of blocks allocated (and not freed) per call and
+    the peak memory (bytes) of a single call.
+    """
+    # warm up caches, lazily created objects and free lists
+    for _ in range(number):
+        function()
+
+    tracemalloc.start()
+    try:
+        base, _ = tracemalloc.get_traced_memory()
+        function()
+        peak = tracemalloc.get_traced_memory()[1] - base
+
+        before = tracemalloc.take_snapshot()
+        for _ in range(number):
+            function()
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+
+    n_blocks = sum(
+        stat.count_diff for stat in after.compare_to(before, "lineno")
+    )
+    return max(n_blocks, 0) / number, peak
+
+
+def run(quick=False):
+    """ Run the benchmark cases.
+
+    :param quick: True to run 10 times fewer calls.
+    :return: results as name -> measures.
+    """
+    results = {}
+    with make_controller() as mufpga:
+        cases = get_cases(mufpga)
+        if quick:
+            cases = {
+                name: (function, max(number // 10, 1), n_accesses)
+                for name, (function, number, n_accesses) in cases.items()
+            }
+
+        times = measure_times(cases)
+        for name, (function, _, n_accesses) in cases.items():
+            ns_per_call = times[name]
+            blocks, peak = measure_allocations(function, N_ALLOCATION_CALLS)
+            results[name] = {
+                "ns_per_call": ns_per_call,
+                "accesses_per_s": n_accesses * 1e9 / ns_per_call,
+                "blocks_per_call": blocks,
+                "peak_bytes": peak,
+            }
+
+    return results
+
+
+def compare(results, baseline, tolerance=TOLERANCE, noise_floor=NOISE_FLOOR):
+    """ Compare results against a baseline.
+
+    :param results: results as returned by run.
+    :param baseline: baseline results.
+    :param tolerance: relative slow-down tolerated.
+    :param noise_floor: slow-down (ns per call) always tolerated.
+    :return: list of the names of the cases that regressed.
+    """
+    print(
+        f"{'case':<30}{'baseline (ns)':>15}{'now (ns)':>12}{'ratio':>8}"
+        f"{'blocks':>8}"
+    )
+
+    regressions = []
+    for name, measures in results.items():
+        if name not in baseline:
+            print(f"{name:<30}{'-':>15}{measures['ns_per_call']:>12.0f}")
+            continue
+
+        reference = baseline[name]
+        ratio = measures["ns_per_call"] / reference["ns_per_call"]
+        slower = (
+            ratio > 1 + tolerance and
+            measures["ns_per_call"] - reference["ns_per_call"] > noise_floor
+        )
+        more_blocks = (
+            measures["blocks_per_call"] > reference["blocks_per_call"] + 0.5
+        )
+
+        flag = ""
+        if slower or more_blocks:
+            regressions.append(name)
+            flag = "  REGRESSION"
+
+        print(
+            f"{name:<30}{reference['ns_per_call']:>15.0f}"
+            f"{measures['ns_per_call']:>12.0f}{ratio:>8.2f}"
+            f"{measures['blocks_per_call']:>8.2f}{flag}"
+        )
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the register access paths."
+    )
+    parser.add_argument("--output", help="JSON file to write the results to")
+    parser.add_argument("--baseline", help="JSON file of baseline results")
+    parser.add_argument(
+        "--tolerance", type=float, default=TOLERANCE,
+        help="relative slow-down tolerated (default %(default)s)"
+    )
+    parser.add_argument(
+        "--noise-floor", type=float, default=NOISE_FLOOR,
+        help="slow-down (ns per call) always tolerated (default %(default)s)"
+    )
+    parser.add_argument(
+        "--quick", action="store_true", help="run 10 times fewer calls"
+    )
+    args = parser.parse_args()
+
+    results = run(args.quick)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(
+                {
+                    "python": platform.python_version(),
+                    "machine": platform.machine(),
+                    "results": results,
+                },
+                file,
+                indent=2,
+            )
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as file:
+            baseline = json.load(file)["results"]
+
+        regressions = compare(
+            results, baseline, args.tolerance, args.noise_floor
+        )
+        if regressions:
+            print(
+                f"{len(regressions)} regression(s): {', '.join(regressions)}"
+            )
+            sys.exit(1)
+    else:
+        for name, measures in results.items():
+            print(
+                f"{name:<30}{measures['ns_per_call']:>12.0f} ns"
+                f"{measures['accesses_per_s']:>14.0f} accesses/s"
+                f"{measures['blocks_per_call']:>8.2f} blocks"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+#!/usr/bin/env python
+""" Stream the analog signal of a single channel at the highest rate the link
+can sustain.
+"""
+import microfpga.controller as cl
+import microfpga.signals as sig
+
+
+def run_measurement(controller, channel, n):
+    chunks = []
+
+    with controller.open_analog_stream([channel]) as stream:
+        n_samples = 0
+        for chunk in stream:
+            chunks.append(chunk)
+            n_samples += len(chunk.timestamps)
+            if n_samples >= n:
+                break
+
+    return chunks
+
+
+with cl.MicroFPGA(n_ai=1, threaded=True) as mufpga:
+    # check if successful
+    if mufpga.is_connected():
+        print('Connected to ' + mufpga.get_id())
+
+        chunks = run_measurement(mufpga, channel=0, n=1000)
+
+        t_s = chunks[-1].timestamps[-1] - chunks[0].timestamps[0]
+        n = sum(len(chunk.timestamps) for chunk in chunks)
+        print(f'Sample rate: {n / t_s:.0f} Hz')
+
+        # result is returned in arbitrary unit, convert to volts
+        v = chunks[-1].values[:, 0] / sig.MAX_AI
+
+        print(f'Last results: {v}')
+
+    else:
+        print('Failed to connect')
+
+print('Disconnected')
@@ -0,0 +1,66 @@
+""" Fixtures shared by the unit tests.
+"""
+import pytest
+from microfpga.regint import RegisterInterface
+from microfpga.transport import LoopbackTransport
+
+# pylint: disable=redefined-outer-name
+
+
+class FakeSerial(LoopbackTransport):
+    """ In-memory transport answering the register interface protocol from a
+    register file.
+
+    Every call to write is recorded in `writes` to allow checking how many
+    transmissions were made.
+    """
+    def __init__(self, peer=None):
+        LoopbackTransport.__init__(self, peer)
+        self.writes = []
+
+    @property
+    def registers(self):
+        """ Registers of the fake device, address -> value. """
+        return self.peer.registers
+
+    def write(self, data):
+        self.writes.append(bytes(data))
+        return LoopbackTransport.write(self, data)
+
+
+@pytest.fixture
+def fake_serial():
+    """ Return a fake serial device. """
+    return FakeSerial()
+
+
+def connect_interface(fake_serial, **kwargs):
+    """ Return a register interface connected to a fake serial device.
+
+    :param fake_serial: fake serial device.
+    :param kwargs: parameters of the register interface.
+    :return: register interface.
+    """
+    return RegisterInterface(transport=fake_serial, **kwargs)
+
+
+@pytest.fixture
+def interface(fake_serial):
+    """ Return a register interface connected to a fake serial device. """
+    return connect_interface(fake_serial)
+
+
+@pytest.fixture
+def shadow_interface(fake_serial):
+    """ Return a register interface with shadow register file, connected to a
+    fake serial device. """
+    return connect_interface(fake_serial, use_shadow=True)
+
+
+@pytest.fixture
+def threaded_interface(fake_serial):
+    """ Return a register interface running in threaded mode, connected to a
+    fake serial device. """
+    reg_int = connect_interface(fake_serial, threaded=True)
+    yield reg_int
+    reg_int.disconnect()
@@ -0,0 +1,181 @@
+""" Tests of the asyncio interface, using an emulated FPGA behind a
+pseudo-terminal.
+"""
+import asyncio
+import sys
+import threading
+import pytest
+from microfpga import aio, regint
+from microfpga.emulator import Emulator
+
+# pylint: disable=redefined-outer-name
+
+pytestmark = pytest.mark.skipif(
+    not sys.platform.startswith("linux"), reason="requires a Linux pty"
+)
+
+
+class WithholdingEmulator(Emulator):
+    """ Emulator whose answers can be withheld by clearing the `answering`
+    event, or lost by setting `n_lost`.
+    """
+    def __init__(self):
+        Emulator.__init__(self, "Au")
+        self.answering = threading.Event()
+        self.answering.set()
+        self.n_lost = 0
+
+    def process(self, data):
+        answers = Emulator.process(self, data)
+        self.answering.wait()
+        while self.n_lost and answers:
+            answers = answers[regint.READ_ANSWER_SIZE:]
+            self.n_lost -= 1
+        return answers
+
+
+@pytest.fixture
+def pty_device(monkeypatch):
+    """ Return an emulated FPGA selected as the device to connect to. """
+    emulator = WithholdingEmulator()
+    server = emulator.serve_pty()
+    monkeypatch.setattr(regint, "select_device", lambda known: server.port)
+    yield emulator
+    emulator.answering.set()
+    server.close()
+
+
+@pytest.mark.usefixtures("pty_device")
+def test_async_register_interface():
+    """ Test writing and (concurrently) reading through the asynchronous
+    interface.
+
+    :return:
+    """
+    async def run():
+        interface = aio.AsyncRegisterInterface()
+        assert await interface.connect()
+
+        assert await interface.write(3, 42)
+        assert await interface.write_many([(4, 43), (5, -1), (6, 44)]) == [
+            True, False, True
+        ]
+        assert await interface.read(3) == 42
+
+        values = await asyncio.gather(
+            interface.read_many([6, 4]), interface.read(3), interface.read(7)
+        )
+        interface.disconnect()
+        return values
+
+    assert asyncio.run(run()) == [[44, 43], 42, 0]
+
+
+def test_async_timeout_keeps_order(pty_device):
+    """ Test that a timed out request does not shift the answers of the
+    following requests.
+
+    :param pty_device: emulated FPGA
+    :return:
+    """
+    pty_device.registers.update({1: 11, 2: 22})
+
+    async def run():
+        interface = aio.AsyncRegisterInterface()
+        await interface.connect()
+
+        pty_device.answering.clear()
+        with pytest.raises(asyncio.TimeoutError):
+            await interface.read(1, timeout=0.05)
+        pty_device.answering.set()
+
+        # the late answer is discarded while no request is in flight
+        await asyncio.sleep(0.05)
+        value = await interface.read(2)
+        interface.disconnect()
+        return value
+
+    assert asyncio.run(run()) == 22
+
+
+def test_async_timeout_lost_answer(pty_device):
+    """ Test that the interface recovers from an answer lost by the device.
+
+    :param pty_device: emulated FPGA
+    :return:
+    """
+    pty_device.registers.update({1: 11, 2: 22, 3: 33, 4: 44})
+
+    async def run():
+        interface = aio.AsyncRegisterInterface()
+        await interface.connect()
+
+        pty_device.n_lost = 1
+        with pytest.raises(asyncio.TimeoutError):
+            await interface.read(1, timeout=0.05)
+
+        values = [await interface.read(address) for address in (2, 3, 4)]
+        values.append(await interface.read_many([4, 1]))
+        interface.disconnect()
+        return values
+
+    assert asyncio.run(run()) == [22, 33, 44, [44, 11]]
+
+
+def test_async_timeout_concurrent_read(pty_device):
+    """ Test that a timeout fails the concurrent reads in flight without
+    cancelling their tasks.
+
+    :param pty_device: emulated FPGA
+    :return:
+    """
+    pty_device.registers.update({1: 11, 2: 22})
+
+    async def run():
+        interface = aio.AsyncRegisterInterface()
+        await interface.connect()
+
+        pty_device.answering.clear()
+        other = asyncio.ensure_future(interface.read(2, timeout=5))
+        with pytest.raises(asyncio.TimeoutError):
+            await interface.read(1, timeout=0.05)
+        with pytest.raises(aio.ResynchronizationError):
+            await other
+        assert not other.cancelled()
+        pty_device.answering.set()
+
+        await asyncio.sleep(0.05)
+        value = await interface.read(2)
+        interface.disconnect()
+        return value
+
+    assert asyncio.run(run()) == 22
+
+
+@pytest.mark.usefixtures("pty_device")
+def test_async_microfpga():
+    """ Test the asynchronous controller.
+
+    :return:
+    """
+    async def run():
+        async with aio.AsyncMicroFPGA(n_laser=2, n_ttl=1) as mufpga:
+            assert mufpga.get_id() == "Au"
+            assert await mufpga.is_active_sync()
+
+            await mufpga.set_laser_state(1, 2, 1500, 43690)
+            await mufpga.set_ttl_state(0, 1)
+            await mufpga.set_camera_state(10, 20, 30, 40)
+
+            return await asyncio.gather(
+                mufpga.get_laser_state(1),
+                mufpga.get_ttl_state(0),
+                mufpga.get_camera_state(),
+            )
+
+    laser, ttl, camera = asyncio.run(run())
+    assert laser == [2, 1500, 43690]
+    assert ttl == 1
+    assert camera == {
+        "pulse": 10, "delay": 20, "exposure": 30, "read-out": 40
+    }
@@ -1,7 +1,14 @@
-""" Test if controller can be instantiated.
+""" Test if controller can be instantiated, and its bulk methods.
 """
-
+import json
+import pytest
+from microfpga import regint, signals
 from microfpga.controller import MicroFPGA
+from microfpga.emulator import Emulator
+from microfpga.signals import LaserTriggerMode
+from microfpga._tests.conftest import FakeSerial
+
+# pylint: disable=redefined-outer-name
 
 
 def test_instantiation_microfpga():
@@ -13,3 +20,476 @@ def test_instantiation_microfpga():
     :return:
     """
     MicroFPGA()
+
+
+@pytest.fixture
+def emulated_serial():
+    """ Return a fake serial device connected to an emulated board. """
+    return FakeSerial(Emulator("Au"))
+
+
+@pytest.fixture
+def mufpga(emulated_serial):
+    """ Return a controller with 4 lasers connected to an emulated board. """
+    with MicroFPGA(n_laser=4, transport=emulated_serial) as controller:
+        emulated_serial.writes.clear()
+        yield controller
+
+
+def test_set_lasers(mufpga, emulated_serial):
+    """ Test setting several lasers in a single transmission.
+
+    :param mufpga: controller connected to an emulated board
+    :param emulated_serial: fake serial device
+    :return:
+    """
+    update = mufpga.set_lasers(
+        modes=[LaserTriggerMode.MODE_RISING, 1, 0, 4],
+        durations={1: 500, 3: 2000},
+        sequences={0: "1010101010101010"},
+    )
+
+    assert update.ok
+    assert update.sent == (
+        (1, "duration"), (3, "duration"), (0, "sequence"),
+        (0, "mode"), (1, "mode"), (2, "mode"), (3, "mode"),
+    )
+    assert len(emulated_serial.writes) == 1
+
+    assert mufpga.get_laser_state(0) == [2, 0, 43690]
+    assert mufpga.get_laser_state(1) == [1, 500, 0]
+    assert mufpga.get_laser_state(3) == [4, 2000, 0]
+
+
+def test_set_lasers_numpy(mufpga):
+    """ Test setting lasers from numpy arrays.
+
+    :param mufpga: controller connected to an emulated board
+    :return:
+    """
+    numpy = pytest.importorskip("numpy")
+
+    update = mufpga.set_lasers(
+        modes=numpy.array([3, 3]),
+        durations=numpy.full(4, 100, dtype=numpy.uint32),
+        sequences=numpy.array([65535, 255, 15, 1], dtype=numpy.int64),
+    )
+    assert update.ok
+    assert [mufpga.get_laser_state(i) for i in range(4)] == [
+        [3, 100, 65535], [3, 100, 255], [0, 100, 15], [0, 100, 1]
+    ]
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [
+        {"modes": [signals.MAX_MODE + 1]},
+        {"durations": {2: signals.MAX_DURATION + 1}},
+        {"sequences": ["10101"]},
+        {"durations": [1.5]},
+        {"modes": {4: 1}},
+    ],
+)
+def test_set_lasers_invalid(mufpga, emulated_serial, kwargs):
+    """ Test that nothing is sent if any value is invalid.
+
+    :param mufpga: controller connected to an emulated board
+    :param emulated_serial: fake serial device
+    :param kwargs: parameters of set_lasers
+    :return:
+    """
+    with pytest.raises(ValueError):
+        mufpga.set_lasers(**{"modes": [1, 1], "durations": [10], **kwargs})
+    assert emulated_serial.writes == []
+
+
+def test_set_lasers_disconnected(mufpga):
+    """ Test that the parameters fail once disconnected.
+
+    :param mufpga: controller connected to an emulated board
+    :return:
+    """
+    mufpga._serial.disconnect()  # pylint: disable=protected-access
+
+    update = mufpga.set_lasers(modes=[1, 2])
+    assert not update.ok
+    assert update.failed == ((0, "mode"), (1, "mode"))
+
+
+def test_configure_camera(mufpga, emulated_serial):
+    """ Test configuring the camera with a single transmission and a single
+    read-back.
+
+    :param mufpga: controller connected to an emulated board
+    :param emulated_serial: fake serial device
+    :return:
+    """
+    timing = mufpga.configure_camera(100, 2000, 15000, 5000, verify=True)
+
+    assert timing == (100, 2000, 15000, 5000, True, True)
+    assert timing.exposure_ms == 15.
+    assert timing.frame_period_ms == 22.
+    # sync mode check, parameters and read-back
+    assert len(emulated_serial.writes) == 3
+    assert mufpga.get_camera_state() == {
+        "pulse": 100, "delay": 2000, "exposure": 15000, "read-out": 5000
+    }
+
+
+def test_configure_camera_invalid(mufpga, emulated_serial):
+    """ Test that nothing is sent if any camera parameter is invalid.
+
+    :param mufpga: controller connected to an emulated board
+    :param emulated_serial: fake serial device
+    :return:
+    """
+    with pytest.raises(ValueError):
+        mufpga.configure_camera(100, signals.MAX_LASER_DELAY + 1, 10, 10)
+    assert emulated_serial.registers[signals.ADDR_CAM_PULSE] == 0
+
+
+def test_configure_camera_mismatch(emulated_serial):
+    """ Test that the read-back bypasses the cache and detects parameters
+    that were not applied.
+
+    :param emulated_serial: fake serial device
+    :return:
+    """
+    class DropExposure(regint.Interceptor):
+        """ Drop the writes to the camera exposure. """
+        def on_write(self, address, value):
+            if address == signals.ADDR_CAM_EXPO:
+                return regint.SKIP
+            return value
+
+    with MicroFPGA(
+            transport=emulated_serial,
+            use_cache=True,
+            use_shadow=True,
+            interceptors=[DropExposure()],
+    ) as controller:
+        timing = controller.configure_camera(100, 200, 300, 400, verify=True)
+        assert timing == (100, 200, 0, 400, True, False)
+        assert controller.get_camera_exposure() == 0
+
+
+def test_snapshot(emulated_serial):
+    """ Test reading the state of all signals in a single transmission.
+
+    :param emulated_serial: fake serial device
+    :return:
+    """
+    with MicroFPGA(
+            n_laser=2, n_ttl=2, n_servo=1, n_pwm=1, n_ai=2,
+            transport=emulated_serial
+    ) as controller:
+        controller.set_laser_state(1, 2, 500, 255)
+        controller.set_ttl_state(1, 1)
+        controller.set_pwm_state(0, 128)
+        controller.set_camera_state(10, 20, 30, 40)
+        emulated_serial.writes.clear()
+
+        snapshot = controller.snapshot()
+        assert len(emulated_serial.writes) == 1
+
+    assert snapshot.board_id == signals.ID_AU
+    assert snapshot.active_sync
+    assert not snapshot.camera_running
+    assert snapshot.camera == (10, 20, 30, 40)
+    assert snapshot.lasers == ((0, 0, 0), (2, 500, 255))
+    assert snapshot.ttls == (0, 1)
+    assert snapshot.pwms == (128,)
+    assert len(snapshot.analogs) == 2
+
+    state = json.loads(snapshot.to_json())
+    assert state["camera"]["exposure"] == 30
+    assert state["lasers"][1] == {"mode": 2, "duration": 500, "sequence": 255}
+    assert state == snapshot.to_dict()
+
+
+def test_snapshot_disconnected(mufpga):
+    """ Test that no snapshot is returned once disconnected.
+
+    :param mufpga: controller connected to an emulated board
+    :return:
+    """
+    mufpga.disconnect()
+    assert mufpga.snapshot() is None
+
+
+def test_snapshot_incomplete(mufpga, emulated_serial):
+    """ Test that no snapshot is returned if answers are missing.
+
+    :param mufpga: controller connected to an emulated board
+    :param emulated_serial: fake serial device
+    :return:
+    """
+    process = emulated_serial.peer.process
+    emulated_serial.peer.process = lambda data: process(data)[:-4]
+    assert mufpga.snapshot() is None
+
+    emulated_serial.peer.process = lambda data: b""
+    assert mufpga.snapshot() is None
+
+    emulated_serial.peer.process = process
+    assert mufpga.snapshot().lasers == ((0, 0, 0),) * 4
+
+
+def test_apply(mufpga, emulated_serial):
+    """ Test applying a desired state with the minimal number of writes.
+
+    :param mufpga: controller connected to an emulated board
+    :param emulated_serial: fake serial device
+    :return:
+    """
+    mufpga.set_laser_state(0, 2, 1000, 65535)
+    mufpga.set_laser_state(1, 1, 0, 0)
+    emulated_serial.writes.clear()
+
+    update = mufpga.apply({
+        "lasers": {
+            0: {"mode": LaserTriggerMode.MODE_RISING, "duration": 2000},
+            1: (0, 0, "0000000011111111"),
+        },
+        "camera": {"exposure": 5000},
+    })
+
+    # laser 1 is switched off before the parameters change
+    assert update.sent == (
+        ("mode", 1, 0),
+        ("duration", 0, 2000),
+        ("sequence", 1, 255),
+        ("camera_exposure", 0, 5000),
+    )
+    assert update.ok
+    # read of the current state, then writes
+    assert len(emulated_serial.writes) == 2
+    assert mufpga.get_laser_state(0) == [2, 2000, 65535]
+    assert mufpga.get_laser_state(1) == [0, 0, 255]
+
+    # nothing to write
+    emulated_serial.writes.clear()
+    assert mufpga.apply(mufpga.snapshot()).sent == ()
+    assert len(emulated_serial.writes) == 2
+
+
+def test_apply_cached(emulated_serial):
+    """ Test that the current state is served by the cache.
+
+    :param emulated_serial: fake serial device
+    :return:
+    """
+    with MicroFPGA(
+            n_laser=2, n_ttl=1, transport=emulated_serial, use_cache=True
+    ) as controller:
+        controller.apply({"ttls": [1], "lasers": [(1, 10, 20)]})
+        emulated_serial.writes.clear()
+
+        update = controller.apply({"ttls": [1], "lasers": {0: {"mode": 2}}})
+        assert update.sent == (("mode", 0, 2),)
+        assert len(emulated_serial.writes) == 1
+
+
+def test_apply_shadow(emulated_serial):
+    """ Test that registers changed outside of the shadow register file are
+    written.
+
+    :param emulated_serial: fake serial device
+    :return:
+    """
+    with MicroFPGA(
+            n_ttl=1, transport=emulated_serial, use_shadow=True
+    ) as controller:
+        controller.set_ttl_state(0, 1)
+
+        # e.g. board reset
+        emulated_serial.registers[signals.ADDR_TTL] = 0
+
+        update = controller.apply({"ttls": [1]})
+        assert update.sent == (("ttl", 0, 1),)
+        assert controller.get_ttl_state(0) == 1
+
+
+@pytest.mark.parametrize(
+    "state",
+    [
+        {"lasers": {4: {"mode": 1}}},
+        {"lasers": [{"mode": 1, "power": 2}]},
+        {"ttls": [2]},
+        {"camera": {"exposure": signals.MAX_CAM_EXPOSURE + 1}},
+        {"servos": [1]},
+        {"light": 1},
+        {"camera": None},
+        {"camera": 5},
+    ],
+)
+def test_apply_invalid(mufpga, emulated_serial, state):
+    """ Test that nothing is sent if the desired state is invalid.
+
+    :param mufpga: controller connected to an emulated board
+    :param emulated_serial: fake serial device
+    :param state: desired state
+    :return:
+    """
+    with pytest.raises(ValueError):
+        mufpga.apply({"lasers": [(1, 10, 20)], **state})
+    assert emulated_serial.writes == []
+
+
+def test_presets(mufpga, emulated_serial):
+    """ Test activating compiled presets with a single transmission.
+
+    :param mufpga: controller connected to an emulated board
+    :param emulated_serial: fake serial device
+    :return:
+    """
+    blue = mufpga.register_preset(
+        "blue", {"lasers": [(2, 1000, 65535), (0, 0, 0)]}
+    )
+    green = mufpga.register_preset(
+        "green", {"lasers": [(0, 0, 0), (2, 1000, 65535)]}
+    )
+    same = mufpga.register_preset(
+        "also blue", {"lasers": {0: (2, 1000, 65535), 1: (0, 0, 0)}}
+    )
+    assert blue.digest == same.digest != green.digest
+    # modes switched off first
+    assert blue.pairs[0] == (signals.ADDR_MODE + 1, 0)
+    assert emulated_serial.writes == []
+
+    assert mufpga.activate("blue")
+    assert emulated_serial.writes == [blue.frame]
+    assert mufpga.get_laser_state(0) == [2, 1000, 65535]
+
+    # already active
+    emulated_serial.writes.clear()
+    assert mufpga.activate("blue")
+    assert mufpga.activate("also blue")
+    assert emulated_serial.writes == []
+
+    assert mufpga.activate("green")
+    assert mufpga.activate("blue", force=True)
+    assert emulated_serial.writes == [green.frame, blue.frame]
+
+    with pytest.raises(ValueError):
+        mufpga.register_preset("red", {"lasers": [(5, 0, 0)]})
+    with pytest.raises(KeyError):
+        mufpga.activate("red")
+
+
+def test_set_sequences(mufpga, emulated_serial):
+    """ Test setting the sequences of several lasers from a pattern.
+
+    :param mufpga: controller connected to an emulated board
+    :param emulated_serial: fake serial device
+    :return:
+    """
+    update = mufpga.set_sequences({0: "10", 1: "01", 3: signals.every(4)})
+    assert update.ok
+    assert len(emulated_serial.writes) == 1
+    assert [mufpga.get_sequence_state(i) for i in range(4)] == [
+        0xAAAA, 0x5555, 0, 0x8888
+    ]
+
+
+def test_get_analog_states():
+    """ Test reading all analog inputs in a single transmission.
+
+    :return:
+    """
+    emulated_serial = FakeSerial(
+        Emulator("Au", analog=lambda channel, _: 1000 * channel)
+    )
+    with MicroFPGA(n_ai=signals.NUM_AI, transport=emulated_serial) as mufpga:
+        emulated_serial.writes.clear()
+        states = mufpga.get_analog_states()
+        assert len(emulated_serial.writes) == 1
+        assert list(states.values) == [1000 * i for i in range(8)]
+
+        volts = mufpga.get_analog_states([7, 2], volts=True)
+        assert list(volts.values) == [
+            7000 / signals.MAX_AI, 2000 / signals.MAX_AI
+        ]
+        assert volts.timestamp > states.timestamp
+
+        with pytest.raises(ValueError):
+            mufpga.get_analog_states([8])
+
+        mufpga.disconnect()
+        assert mufpga.get_analog_states() is None
+
+
+def test_get_analog_states_numpy(emulated_serial):
+    """ Test that the analog inputs are returned as numpy arrays.
+
+    :param emulated_serial: fake serial device
+    :return:
+    """
+    numpy = pytest.importorskip("numpy")
+
+    with MicroFPGA(n_ai=2, transport=emulated_serial) as mufpga:
+        assert mufpga.get_analog_states().values.dtype == numpy.uint16
+        assert mufpga.get_analog_states(volts=True).values.dtype == float
+
+
+def test_apply_without_camera(emulated_serial):
+    """ Test applying the snapshot of a controller without camera.
+
+    :param emulated_serial: fake serial device
+    :return:
+    """
+    with MicroFPGA(
+            n_laser=1, use_camera=False, transport=emulated_serial
+    ) as controller:
+        controller.set_laser_state(0, 1, 10, 20)
+        snapshot = controller.snapshot()
+        assert snapshot.camera is None
+
+        assert controller.apply(snapshot).sent == ()
+        assert controller.apply(snapshot.to_dict()).sent == ()
+        with pytest.raises(ValueError):
+            controller.apply({"camera": {"exposure": 10}})
+        with pytest.raises(ValueError):
+            controller.apply({"active_sync": True})
+
+
+def test_configure_camera_shadow(emulated_serial):
+    """ Test that a verified configuration is kept in the shadow registers.
+
+    :param emulated_serial: fake serial device
+    :return:
+    """
+    class DropPulse(regint.Interceptor):
+        """ Drop the first write to the camera pulse. """
+        def __init__(self):
+            self.dropped = False
+
+        def on_write(self, address, value):
+            if address == signals.ADDR_CAM_PULSE and not self.dropped:
+                self.dropped = True
+                return regint.SKIP
+            return value
+
+    with MicroFPGA(transport=emulated_serial, use_shadow=True) as controller:
+        controller.configure_camera(10, 20, 30, 40, verify=True)
+        counters = controller.get_shadow_counters()
+        controller.configure_camera(10, 20, 30, 40)
+        assert controller.get_shadow_counters() == {
+            "sent": counters["sent"], "skipped": counters["skipped"] + 4
+        }
+
+    # only the parameters that differ are forgotten
+    with MicroFPGA(
+            transport=FakeSerial(Emulator("Au")),
+            use_shadow=True,
+            interceptors=[DropPulse()],
+    ) as controller:
+        timing = controller.configure_camera(10, 20, 30, 40, verify=True)
+        assert not timing.verified
+        counters = controller.get_shadow_counters()
+        assert controller.configure_camera(10, 20, 30, 40, verify=True) == (
+            10, 20, 30, 40, True, True
+        )
+        assert controller.get_shadow_counters() == {
+            "sent": counters["sent"] + 1, "skipped": counters["skipped"] + 3
+        }
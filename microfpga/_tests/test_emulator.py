@@ -0,0 +1,158 @@
+""" Tests of the full MicroFPGA stack against the emulator.
+"""
+import sys
+import pytest
+from microfpga import signals
+from microfpga.controller import MicroFPGA
+from microfpga.emulator import Emulator
+from microfpga.regint import Interceptor
+
+
+@pytest.mark.parametrize("board", ["Au", "Au+", "Cu", "Mojo"])
+def test_emulated_boards(board):
+    """ Test that the controller identifies the emulated boards.
+
+    :param board: board name
+    :return:
+    """
+    emulator = Emulator(board)
+    with MicroFPGA(n_ai=2, transport=emulator.open_transport()) as mufpga:
+        assert mufpga.is_connected()
+        assert mufpga.get_id() == board
+
+        # the Cu has no analog input
+        n_analogs = 0 if board == "Cu" else 2
+        assert mufpga.get_number_analogs() == n_analogs
+
+
+def test_emulated_wrong_version():
+    """ Test that the controller disconnects from a board with the wrong
+    configuration version.
+
+    :return:
+    """
+    emulator = Emulator("Au", version=signals.CURR_VER - 1)
+    with pytest.warns(UserWarning):
+        mufpga = MicroFPGA(transport=emulator.open_transport())
+    assert not mufpga.is_connected()
+
+
+def test_emulated_analog():
+    """ Test that analog inputs return the synthetic values and are
+    read-only.
+
+    :return:
+    """
+    emulator = Emulator("Au", analog=lambda channel, t: 1000 * (channel + 1))
+    with MicroFPGA(n_ai=3, transport=emulator.open_transport()) as mufpga:
+        assert [mufpga.get_analog_state(i) for i in range(3)] == [
+            1000, 2000, 3000
+        ]
+
+    emulator.write_register(signals.ADDR_AI, 42)
+    emulator.write_register(signals.ADDR_ID, 42)
+    assert emulator.read_register(signals.ADDR_AI) == 1000
+    assert emulator.read_register(signals.ADDR_ID) == signals.ID_AU
+
+
+def test_emulated_default_analog():
+    """ Test that the default synthetic analog values are in range.
+
+    :return:
+    """
+    emulator = Emulator("Mojo")
+    for channel in range(signals.NUM_AI):
+        value = emulator.read_register(signals.ADDR_AI + channel)
+        assert 0 <= value <= signals.MAX_AI
+
+
+def test_emulated_controller():
+    """ Test setting and reading the signals of an emulated board.
+
+    :return:
+    """
+    emulator = Emulator("Au")
+    transport = emulator.open_transport()
+    with MicroFPGA(
+        n_laser=3, n_ttl=2, n_servo=1, transport=transport
+    ) as mufpga:
+        mufpga.set_laser_state(2, 3, 2000, 52428)
+        mufpga.set_ttl_state(1, 1)
+        mufpga.set_servo_state(0, 40000)
+        mufpga.set_camera_state(100, 200, 300, 400)
+        mufpga.start_camera()
+
+        assert mufpga.get_laser_state(2) == [3, 2000, 52428]
+        assert mufpga.get_ttl_state(1) == 1
+        assert mufpga.get_servo_state(0) == 40000
+        assert mufpga.get_camera_state() == {
+            "pulse": 100, "delay": 200, "exposure": 300, "read-out": 400
+        }
+        assert mufpga.is_camera_running()
+
+    assert emulator.registers[signals.ADDR_SEQ + 2] == 52428
+
+
+@pytest.mark.skipif(
+    not sys.platform.startswith("linux"), reason="requires a Linux pty"
+)
+def test_emulator_pty():
+    """ Test connecting to the emulator through a pseudo-terminal.
+
+    :return:
+    """
+    with Emulator("Au+").serve_pty() as server:
+        with MicroFPGA(n_pwm=1, transport=server.port) as mufpga:
+            assert mufpga.get_id() == "Au+"
+            mufpga.set_pwm_state(0, 200)
+            assert mufpga.get_pwm_state(0) == 200
+
+
+def test_emulated_stats():
+    """ Test that the controller records link statistics per register group.
+
+    :return:
+    """
+    emulator = Emulator("Au")
+    with MicroFPGA(
+        n_laser=1, n_ai=1, use_stats=True, transport=emulator.open_transport()
+    ) as mufpga:
+        mufpga.reset_stats()
+        mufpga.set_laser_state(0, 1, 100, 65535)
+        mufpga.get_analog_state(0)
+
+        stats = mufpga.get_stats()
+        assert stats["writes"] == 3
+        assert stats["reads"] == 1
+        assert {
+            group: sum(counts) for group, counts in stats["latency"].items()
+        } == {"laser": 3, "analog": 1}
+
+
+def test_emulated_interceptors():
+    """ Test configuring interceptors and batches on the controller.
+
+    :return:
+    """
+    class Counter(Interceptor):
+        """ Interceptor counting the writes. """
+        def __init__(self):
+            self.n_writes = 0
+
+        def on_write(self, address, value):
+            self.n_writes += 1
+            return value
+
+    counter = Counter()
+    emulator = Emulator("Au")
+    with MicroFPGA(
+        n_laser=2, interceptors=[counter], transport=emulator.open_transport()
+    ) as mufpga:
+        n_writes = emulator.n_writes
+        with mufpga.batch():
+            mufpga.set_laser_state(0, 1, 100, 65535)
+            mufpga.set_laser_state(1, 2, 200, 255)
+
+        assert counter.n_writes == 1 + 6
+        assert emulator.n_writes == n_writes + 6
+        assert mufpga.get_laser_state(1) == [2, 200, 255]
@@ -0,0 +1,103 @@
+""" Unit tests of microfpga.linkmodel.
+"""
+import pytest
+from microfpga import regint
+from microfpga.emulator import Emulator
+from microfpga.linkmodel import (
+    TimedTransport,
+    VirtualClock,
+    frame_period,
+    plan_frames,
+    wire_time
+)
+
+
+def test_timed_transport():
+    """ Test the delays added to the transfers.
+
+    :return:
+    """
+    clock = VirtualClock()
+    transport = TimedTransport(
+        Emulator().open_transport(), latency=1e-3, timeout=0.5, clock=clock
+    )
+    interface = regint.RegisterInterface(transport=transport)
+
+    interface.write(3, 42)
+    assert clock.monotonic() == pytest.approx(1e-3 + 9 * 10 / 57600)
+
+    start = clock.monotonic()
+    assert interface.read(3) == 42
+    assert clock.monotonic() - start == pytest.approx(2e-3 + wire_time(9))
+
+    # missing answers wait for the timeout
+    start = clock.monotonic()
+    transport.write(regint.format_read_request(3))
+    assert len(transport.read(8)) == 4
+    assert clock.monotonic() - start == pytest.approx(
+        2e-3 + wire_time(9) + 0.5
+    )
+
+
+def test_timed_transport_jitter():
+    """ Test that the jitter is bounded and reproducible.
+
+    :return:
+    """
+    def total_delay(seed):
+        clock = VirtualClock()
+        transport = TimedTransport(
+            Emulator().open_transport(),
+            latency=0,
+            jitter=1e-3,
+            clock=clock,
+            seed=seed,
+        )
+        for _ in range(100):
+            transport.write(b"")
+        return clock.monotonic()
+
+    assert 0 < total_delay(1) < 0.1
+    assert total_delay(1) == total_delay(1)
+    assert total_delay(1) != total_delay(2)
+
+
+def test_frame_period():
+    """ Test the frame period computed from the camera state.
+
+    :return:
+    """
+    camera_state = {"pulse": 5000, "delay": 0, "exposure": 8000,
+                    "read-out": 2000}
+    assert frame_period(camera_state) == pytest.approx(10e-3)
+
+
+def test_plan_frames():
+    """ Test the planning of calls within a frame.
+
+    :return:
+    """
+    calls = [
+        ("set_laser_state", 0, 1, 2000, 65535),
+        ("set_ttl_state", 1, 1),
+        ("get_analog_state", 0),
+    ]
+
+    report = plan_frames(calls, 20e-3, n_frames=3, latency=1e-3)
+    assert report.fits
+    assert len(report.frame_times) == 3
+    assert len(report.call_times) == 3
+
+    # a laser state is three writes, a ttl one write, an analog one read
+    assert report.call_times[0] == pytest.approx(3 * (1e-3 + wire_time(9)))
+    assert report.worst_time == pytest.approx(
+        4 * (1e-3 + wire_time(9)) + 1e-3 + wire_time(4) + 1e-3 + wire_time(5)
+    )
+    assert report.margin == pytest.approx(20e-3 - report.worst_time)
+
+    # a 16 ms latency does not fit
+    assert not plan_frames(calls, 20e-3, n_frames=1, latency=16e-3).fits
+
+    # repeated writes are skipped with the shadow register file
+    report = plan_frames(calls, 20e-3, n_frames=2, use_shadow=True)
+    assert report.frame_times[1] < report.frame_times[0]
@@ -0,0 +1,153 @@
+""" Unit tests of microfpga.recorder.
+"""
+import io
+import pytest
+from microfpga import signals
+from microfpga.controller import MicroFPGA
+from microfpga.emulator import Emulator
+from microfpga.recorder import (
+    MAGIC,
+    RECORD_SIZE,
+    Direction,
+    Recorder,
+    Replayer,
+    command_stream,
+    diff_logs,
+    read_log
+)
+from microfpga._tests.conftest import connect_interface
+
+
+@pytest.mark.parametrize("threaded", [False, True])
+def test_record_interface(fake_serial, threaded):
+    """ Test that the requests and answers are recorded.
+
+    :param fake_serial: fake serial device
+    :param threaded: whether the interface runs in threaded mode
+    :return:
+    """
+    log = io.BytesIO()
+    recorder = Recorder(log)
+    reg_int = connect_interface(fake_serial, threaded=threaded)
+    reg_int.set_recorder(recorder)
+
+    reg_int.write(1, 11)
+    reg_int.write_many([(2, 22), (3, 33)])
+    assert reg_int.read_many([3, 1]) == [33, 11]
+    assert reg_int.read(2) == 22
+
+    reg_int.set_recorder(None)
+    reg_int.write(4, 44)
+    reg_int.disconnect()
+    recorder.close()
+
+    assert log.getvalue().startswith(MAGIC)
+    assert len(log.getvalue()) == len(MAGIC) + 9 * RECORD_SIZE
+    assert recorder.n_records == 9
+
+    log.seek(0)
+    records = list(read_log(log))
+    assert [record[1:] for record in records] == [
+        (Direction.WRITE, 1, 11),
+        (Direction.WRITE, 2, 22),
+        (Direction.WRITE, 3, 33),
+        (Direction.READ, 3, 0),
+        (Direction.READ, 1, 0),
+        (Direction.ANSWER, 3, 33),
+        (Direction.ANSWER, 1, 11),
+        (Direction.READ, 2, 0),
+        (Direction.ANSWER, 2, 22),
+    ]
+
+    timestamps = [record.timestamp for record in records]
+    assert timestamps == sorted(timestamps)
+    assert records[1].timestamp == records[2].timestamp
+
+
+def record_session(path, laser_mode):
+    """ Record a session of a controller with an emulated board.
+
+    :param path: path of the log.
+    :param laser_mode: mode of the laser.
+    :return:
+    """
+    with Recorder(path) as recorder:
+        with MicroFPGA(
+            n_laser=1,
+            n_ttl=1,
+            recorder=recorder,
+            transport=Emulator().open_transport()
+        ) as mufpga:
+            mufpga.set_laser_state(0, laser_mode, 100, 65535)
+            mufpga.set_ttl_state(0, 1)
+            mufpga.get_laser_state(0)
+
+
+def test_replay(tmp_path):
+    """ Test replaying a recorded session against an emulator.
+
+    :param tmp_path: temporary directory
+    :return:
+    """
+    path = tmp_path / "session.log"
+    record_session(path, 1)
+
+    replayer = Replayer(path)
+    emulator = Emulator()
+    report = replayer.replay(emulator.open_transport())
+
+    assert report.n_writes == emulator.n_writes == 5
+    assert report.n_reads == emulator.n_reads == 5
+    assert report.mismatches == ()
+    assert emulator.registers[signals.ADDR_MODE] == 1
+
+    # a different board answers differently
+    report = replayer.replay(Emulator("Cu").open_transport())
+    assert len(report.mismatches) == 1
+    assert report.mismatches[0] == (
+        signals.ADDR_ID, signals.ID_AU, signals.ID_CU
+    )
+
+
+def test_timed_replay():
+    """ Test that a timed replay reproduces the gaps between exchanges.
+
+    :return:
+    """
+    log = io.BytesIO()
+    recorder = Recorder(log)
+    recorder.record(Direction.WRITE, 1, 1, timestamp=1_000_000_000)
+    recorder.record(Direction.WRITE, 1, 2, timestamp=1_100_000_000)
+    recorder.close()
+    log.seek(0)
+
+    replayer = Replayer(log)
+    assert replayer.replay("loop://").duration < 0.05
+    assert 0.1 <= replayer.replay("loop://", timed=True).duration < 0.5
+    assert replayer.replay("loop://", timed=True, speed=10).duration < 0.1
+
+
+def test_diff_logs(tmp_path):
+    """ Test comparing the command streams of two logs.
+
+    :param tmp_path: temporary directory
+    :return:
+    """
+    for name, mode in (("a.log", 1), ("b.log", 1), ("c.log", 2)):
+        record_session(tmp_path / name, mode)
+
+    assert len(list(command_stream(tmp_path / "a.log"))) == 10
+    assert not list(diff_logs(tmp_path / "a.log", tmp_path / "b.log"))
+
+    diff = list(diff_logs(tmp_path / "a.log", tmp_path / "c.log"))
+    assert "-WRITE 0 1" in diff
+    assert "+WRITE 0 2" in diff
+
+
+def test_read_invalid_log():
+    """ Test that reading a file which is not a log raises an error.
+
+    :return:
+    """
+    with pytest.raises(ValueError):
+        list(read_log(io.BytesIO(b"not a log")))
@@ -1,12 +1,22 @@
-""" Unit tests of microfpga.regint static functions.
+""" Unit tests of microfpga.regint functions and register interface.
 """
+from concurrent.futures import ThreadPoolExecutor
 import pytest
+from microfpga import regint
+from microfpga._tests.conftest import FakeSerial, connect_interface
 from microfpga.regint import (
+    READ_ANSWER_SIZE,
+    READ_REQUEST_SIZE,
+    WRITE_REQUEST_SIZE,
     format_read_request,
     format_write_request,
-    format_to_int
+    format_to_int,
+    pack_read_request_into,
+    pack_write_request_into
 )
 
+# pylint: disable=redefined-outer-name
+
 
 @pytest.mark.parametrize(
     "incorrect_data", [b"", b"\x2a\x0d\x07", b"\x2a\x0d\x07\x56\xca"]
@@ -108,3 +118,602 @@ def test_format_write_request_exception(address, value):
     """
     with pytest.raises(ValueError):
         format_write_request(address, value)
+
+
+def test_write_many(interface, fake_serial):
+    """ Test that write_many sends all requests in a single transmission.
+
+    :param interface: register interface connected to a fake device
+    :param fake_serial: fake serial device
+    :return:
+    """
+    pairs = [(0, 4), (8, 1048575), (16, 43690), (24, 1)]
+    status = interface.write_many(pairs)
+
+    assert status == [True, True, True, True]
+    assert len(fake_serial.writes) == 1
+    assert fake_serial.writes[0] == b"".join(
+        format_write_request(address, value) for address, value in pairs
+    )
+    for address, value in pairs:
+        assert fake_serial.registers[address] == value
+
+
+def test_write_many_partial_failure(interface, fake_serial):
+    """ Test that invalid pairs are reported and not sent, while valid pairs
+    are still sent.
+
+    :param interface: register interface connected to a fake device
+    :param fake_serial: fake serial device
+    :return:
+    """
+    status = interface.write_many([(0, 1), (1, -1), (4294967296, 2), (3, 4)])
+
+    assert status == [True, False, False, True]
+    assert len(fake_serial.writes) == 1
+    assert fake_serial.registers == {0: 1, 3: 4}
+
+
+def test_write_many_disconnected(interface):
+    """ Test that no request is reported as sent when disconnected.
+
+    :param interface: register interface connected to a fake device
+    :return:
+    """
+    interface.disconnect()
+    assert interface.write_many([(0, 1), (1, 2)]) == [False, False]
+
+
+def test_read_many(interface, fake_serial):
+    """ Test that read_many sends all read requests in a single transmission
+    and returns the values in the order of the addresses.
+
+    :param interface: register interface connected to a fake device
+    :param fake_serial: fake serial device
+    :return:
+    """
+    fake_serial.registers.update({3: 42, 7: 4294967295, 12: 65536})
+    values = interface.read_many([12, 3, 5, 7])
+
+    assert values == [65536, 42, 0, 4294967295]
+    assert len(fake_serial.writes) == 1
+    assert fake_serial.writes[0] == b"".join(
+        format_read_request(address) for address in [12, 3, 5, 7]
+    )
+
+
+def test_read_many_disconnected(interface):
+    """ Test that read_many returns -1 values when disconnected.
+
+    :param interface: register interface connected to a fake device
+    :return:
+    """
+    interface.disconnect()
+    assert interface.read_many([0, 1]) == [-1, -1]
+
+
+def test_pack_requests_into():
+    """ Test that requests packed into a shared buffer are identical to the
+    formatted requests.
+
+    :return:
+    """
+    buff = bytearray(9 + 5)
+
+    offset = pack_write_request_into(buff, 0, 86, 65536)
+    assert offset == 9
+    offset = pack_read_request_into(buff, offset, 42)
+    assert offset == 14
+
+    assert buff == format_write_request(86, 65536) + format_read_request(42)
+
+
+def test_read_short_answer(interface, fake_serial):
+    """ Test that an incomplete answer raises an assertion error.
+
+    :param interface: register interface connected to a fake device
+    :param fake_serial: fake serial device
+    :return:
+    """
+    fake_serial.peer.process = lambda data: b"\x2a\x0d"
+
+    with pytest.raises(AssertionError):
+        interface.read(0)
+
+
+@pytest.fixture(params=[True, False], ids=["numpy", "python"])
+def use_numpy(request, monkeypatch):
+    """ Run a test with and without numpy for the bulk formatting. """
+    if request.param:
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(regint, "np", None)
+    return request.param
+
+
+@pytest.mark.usefixtures("use_numpy")
+def test_format_write_requests():
+    """ Test that bulk write requests are the concatenation of the single
+    write requests.
+
+    :return:
+    """
+    addresses = [0, 42, 86, 2147483648]
+    values = [4294967295, 2147483648, 65536, 0]
+
+    requests = regint.format_write_requests(addresses, values)
+    assert requests == b"".join(
+        format_write_request(a, v) for a, v in zip(addresses, values)
+    )
+
+
+@pytest.mark.parametrize(
+    "addresses,values",
+    [([42, 11], [0, 4294967296]), ([4294967296, 1], [86, 1]),
+     ([11, 2], [-1, 1]), ([-1, 2], [65535, 3]), ([1, 2], [3])],
+)
+@pytest.mark.usefixtures("use_numpy")
+def test_format_write_requests_exception(addresses, values):
+    """ Test that out-of-range addresses and values, or length mismatch,
+    raise an error.
+
+    :param addresses: addresses
+    :param values: values
+    :return:
+    """
+    with pytest.raises(ValueError):
+        regint.format_write_requests(addresses, values)
+
+
+@pytest.mark.usefixtures("use_numpy")
+def test_format_read_requests():
+    """ Test that bulk read requests are the concatenation of the single
+    read requests.
+
+    :return:
+    """
+    addresses = [0, 42, 86, 4294967295]
+
+    requests = regint.format_read_requests(addresses)
+    assert requests == b"".join(format_read_request(a) for a in addresses)
+
+    with pytest.raises(ValueError):
+        regint.format_read_requests([1, -1])
+
+
+def test_format_to_ints(use_numpy):
+    """ Test decoding of concatenated answers.
+
+    :param use_numpy: whether numpy is used
+    :return:
+    """
+    values = [0, 42, 86, 65536, 2147483648, 4294967295]
+    data = b"".join(int.to_bytes(v, 4, byteorder="little") for v in values)
+
+    ints = regint.format_to_ints(data)
+    assert list(ints) == values
+    if use_numpy:
+        assert ints.dtype.itemsize == 4 and ints.dtype.kind == "u"
+
+    with pytest.raises(AssertionError):
+        regint.format_to_ints(data[:-1])
+
+
+def test_shadow_skips_redundant_writes(shadow_interface, fake_serial):
+    """ Test that redundant writes are skipped and counted, unless forced.
+
+    :param shadow_interface: register interface with shadow registers
+    :param fake_serial: fake serial device
+    :return:
+    """
+    assert shadow_interface.write(3, 42)
+    assert shadow_interface.write(3, 42)
+    assert shadow_interface.write(3, 43)
+    assert shadow_interface.write(3, 43, force=True)
+    assert len(fake_serial.writes) == 3
+    assert shadow_interface.get_shadow_counters() == {
+        "sent": 3, "skipped": 1
+    }
+
+    status = shadow_interface.write_many([(3, 43), (4, 1), (4, 1), (5, 2)])
+    assert status == [True, True, True, True]
+    assert fake_serial.writes[-1] == format_write_request(
+        4, 1
+    ) + format_write_request(5, 2)
+    assert shadow_interface.get_shadow_counters() == {
+        "sent": 5, "skipped": 3
+    }
+
+    shadow_interface.clear_shadow()
+    assert shadow_interface.write(3, 43)
+    assert shadow_interface.get_shadow_counters() == {
+        "sent": 1, "skipped": 0
+    }
+
+
+def test_no_shadow_by_default(interface, fake_serial):
+    """ Test that all writes are sent without shadow register file.
+
+    :param interface: register interface connected to a fake device
+    :param fake_serial: fake serial device
+    :return:
+    """
+    interface.write(3, 42)
+    interface.write(3, 42)
+    interface.write_many([(3, 42), (3, 42)])
+    assert len(fake_serial.writes) == 3
+
+
+def test_cache_policies(interface, fake_serial):
+    """ Test that static and write-through addresses are served from the
+    cache, while live addresses are always read.
+
+    :param interface: register interface connected to a fake device
+    :param fake_serial: fake serial device
+    :return:
+    """
+    fake_serial.registers.update({1: 11, 2: 22, 3: 33})
+    interface.set_cache_policy(1, regint.CachePolicy.STATIC)
+    interface.set_cache_policy(2, regint.CachePolicy.WRITE_THROUGH)
+
+    interface.write(2, 23)
+    n_writes = len(fake_serial.writes)
+    fake_serial.registers.update({1: 12, 2: 24, 3: 34})
+
+    # the static address is read once, the write-through one is cached
+    assert interface.read_many([1, 2, 3]) == [12, 23, 34]
+    assert interface.read(1) == 12
+    assert interface.read(2) == 23
+    assert len(fake_serial.writes) == n_writes + 1
+
+    fake_serial.registers.update({1: 13, 2: 25, 3: 35})
+    assert interface.read_many([1, 2]) == [12, 23]
+    assert interface.read(3) == 35
+    assert len(fake_serial.writes) == n_writes + 2
+
+    interface.clear_cache()
+    assert interface.read_many([1, 2, 3]) == [13, 25, 35]
+
+
+def test_cache_ttl(interface, fake_serial, monkeypatch):
+    """ Test that cached values expire after their time-to-live.
+
+    :param interface: register interface connected to a fake device
+    :param fake_serial: fake serial device
+    :param monkeypatch: pytest monkeypatch fixture
+    :return:
+    """
+    now = [100.0]
+    monkeypatch.setattr(regint.time, "monotonic", lambda: now[0])
+
+    interface.set_cache_policy(5, regint.CachePolicy.WRITE_THROUGH, ttl=1)
+    interface.write(5, 8)
+    fake_serial.registers[5] = 9
+
+    now[0] += 0.5
+    assert interface.read(5) == 8
+    now[0] += 1
+    assert interface.read(5) == 9
+
+
+def test_threaded_interface(threaded_interface, fake_serial):
+    """ Test that queued requests are batched by the I/O thread and their
+    answers dispatched in order.
+
+    :param threaded_interface: register interface in threaded mode
+    :param fake_serial: fake serial device
+    :return:
+    """
+    assert threaded_interface.is_threaded()
+    assert threaded_interface.write(1, 11)
+    assert threaded_interface.write_many([(2, 22), (3, -1)]) == [True, False]
+    assert threaded_interface.read(1) == 11
+
+    futures = [threaded_interface.submit_write(i, 100 + i) for i in range(50)]
+    futures += [threaded_interface.submit_read(i) for i in range(50)]
+    futures.append(threaded_interface.submit_read_many([49, 0]))
+
+    results = [future.result(timeout=5) for future in futures]
+    assert results == [True] * 50 + [100 + i for i in range(50)] + [[149, 100]]
+    assert len(fake_serial.writes) < 104
+
+
+class LateSerial(FakeSerial):
+    """ Fake serial device whose answers arrive after the read timed out
+    while n_late is set. """
+    def __init__(self):
+        FakeSerial.__init__(self)
+        self.n_late = 0
+
+    def readinto(self, buffer):
+        if self.n_late:
+            self.n_late -= 1
+            return 0
+        return FakeSerial.readinto(self, buffer)
+
+
+@pytest.mark.parametrize("threaded", [False, True])
+def test_late_answers(threaded):
+    """ Test that answers arriving after a read timed out are discarded.
+
+    :param threaded: whether the interface runs in threaded mode
+    :return:
+    """
+    late_serial = LateSerial()
+    late_serial.registers.update({1: 11, 2: 22, 3: 33})
+    reg_int = connect_interface(late_serial, threaded=threaded)
+
+    late_serial.n_late = 1
+    with pytest.raises(AssertionError):
+        reg_int.read(1)
+    assert reg_int.read(2) == 22
+
+    late_serial.n_late = 1
+    assert reg_int.read_many([1, 2]) == [-1, -1]
+    assert reg_int.read_many([3, 1]) == [33, 11]
+    reg_int.disconnect()
+
+
+@pytest.mark.parametrize("threaded", [False, True])
+def test_concurrent_reads(fake_serial, threaded):
+    """ Test that reads from several threads are not interleaved.
+
+    :param fake_serial: fake serial device
+    :param threaded: whether the interface runs in threaded mode
+    :return:
+    """
+    reg_int = connect_interface(fake_serial, threaded=threaded)
+    fake_serial.registers.update({i: 1000 + i for i in range(8)})
+
+    def read_all(address):
+        return [reg_int.read(address) for _ in range(200)]
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(read_all, range(8)))
+
+    reg_int.disconnect()
+    for address, values in enumerate(results):
+        assert values == [1000 + address] * 200
+
+
+@pytest.mark.parametrize("threaded", [False, True])
+def test_stats(fake_serial, threaded):
+    """ Test the link counters and latency histograms.
+
+    :param fake_serial: fake serial device
+    :param threaded: whether the interface runs in threaded mode
+    :return:
+    """
+    reg_int = connect_interface(fake_serial, use_stats=True, threaded=threaded)
+    reg_int.set_stats_group(1, "laser")
+    reg_int.set_stats_group(2, "laser")
+    reg_int.set_stats_group(3, "ttl")
+
+    reg_int.write(1, 11)
+    reg_int.write_many([(1, 12), (2, 22)])
+    reg_int.read_many([1, 2, 3])
+    reg_int.read(4)
+
+    stats = reg_int.get_stats()
+    assert {key: stats[key] for key in stats if key != "latency"} == {
+        "reads": 4,
+        "writes": 3,
+        "bytes_out": 3 * WRITE_REQUEST_SIZE + 4 * READ_REQUEST_SIZE,
+        "bytes_in": 4 * READ_ANSWER_SIZE,
+        "timeouts": 0,
+        "short_reads": 0,
+    }
+    assert {
+        group: sum(histogram) for group, histogram in stats["latency"].items()
+    } == {"laser": 2, "mixed": 1, "other": 1}
+    assert all(
+        len(histogram) == regint.N_LATENCY_BUCKETS
+        for histogram in stats["latency"].values()
+    )
+
+    # missing and incomplete answers
+    fake_serial.peer.process = lambda data: b""
+    assert reg_int.read_many([1]) == [-1]
+    fake_serial.peer.process = lambda data: b"\x2a\x0d"
+    assert reg_int.read_many([1, 2]) == [-1, -1]
+
+    stats = reg_int.get_stats()
+    assert stats["timeouts"] == 1
+    assert stats["short_reads"] == 1
+    assert stats["bytes_in"] == 4 * READ_ANSWER_SIZE + 2
+
+    reg_int.reset_stats()
+    assert reg_int.get_stats()["reads"] == 0
+    assert reg_int.get_stats()["latency"] == {}
+    reg_int.disconnect()
+
+
+def test_stats_disabled(interface):
+    """ Test that no statistics are recorded by default.
+
+    :param interface: register interface connected to a fake device
+    :return:
+    """
+    interface.set_stats_group(1, "laser")
+    interface.write(1, 11)
+    assert interface.get_stats() is None
+    interface.reset_stats()
+
+
+class RecordingInterceptor(regint.Interceptor):
+    """ Interceptor recording the calls of its hooks. """
+    def __init__(self, name, calls):
+        self.name = name
+        self.calls = calls
+
+    def on_write(self, address, value):
+        self.calls.append((self.name, "write", address, value))
+        return value
+
+    def on_read(self, address):
+        self.calls.append((self.name, "read", address))
+
+    def on_answer(self, address, value):
+        self.calls.append((self.name, "answer", address, value))
+        return value
+
+    def batch_begin(self):
+        self.calls.append((self.name, "begin"))
+
+    def batch_end(self):
+        self.calls.append((self.name, "end"))
+
+
+class DoublingInterceptor(regint.Interceptor):
+    """ Interceptor doubling the values written, dropping writes to address
+    0 and answering reads of address 99. """
+    def on_write(self, address, value):
+        return regint.SKIP if address == 0 else 2 * value
+
+    def on_read(self, address):
+        return 1234 if address == 99 else None
+
+
+def test_interceptor_chain(interface):
+    """ Test the order of the interceptor hooks.
+
+    :param interface: register interface connected to a fake device
+    :return:
+    """
+    calls = []
+    interface.set_interceptors([
+        RecordingInterceptor("a", calls), RecordingInterceptor("b", calls)
+    ])
+
+    interface.write(1, 11)
+    assert interface.read(1) == 11
+    assert interface.read_many([1]) == [11]
+    assert calls == [
+        ("a", "write", 1, 11), ("b", "write", 1, 11),
+        ("a", "read", 1), ("b", "read", 1),
+        ("b", "answer", 1, 11), ("a", "answer", 1, 11),
+        ("a", "begin"), ("b", "begin"),
+        ("a", "read", 1), ("b", "read", 1),
+        ("b", "answer", 1, 11), ("a", "answer", 1, 11),
+        ("b", "end"), ("a", "end"),
+    ]
+
+    interface.set_interceptors(None)
+    assert interface.get_interceptors() == ()
+    calls.clear()
+    interface.write(1, 12)
+    assert not calls
+
+
+def test_interceptor_short_circuit(interface, fake_serial):
+    """ Test that interceptors can modify, drop and answer requests.
+
+    :param interface: register interface connected to a fake device
+    :param fake_serial: fake serial device
+    :return:
+    """
+    interface.set_interceptors([DoublingInterceptor()])
+
+    assert interface.write(0, 5)
+    assert interface.write(1, 5)
+    assert interface.write_many([(0, 6), (2, 6), (3, -1)]) == [
+        True, True, False
+    ]
+    assert fake_serial.registers == {1: 10, 2: 12}
+
+    n_writes = len(fake_serial.writes)
+    assert interface.read(99) == 1234
+    assert interface.read_many([2, 99, 1]) == [12, 1234, 10]
+    assert len(fake_serial.writes) == n_writes + 1
+
+
+def test_batch(interface, fake_serial):
+    """ Test that writes within a batch are sent in a single transmission.
+
+    :param interface: register interface connected to a fake device
+    :param fake_serial: fake serial device
+    :return:
+    """
+    calls = []
+    interface.set_interceptors([RecordingInterceptor("a", calls)])
+
+    with interface.batch():
+        assert interface.write(1, 11)
+        with interface.batch():
+            assert interface.write_many([(2, 22), (3, 33)]) == [True, True]
+        assert fake_serial.writes == []
+
+        with pytest.raises(ValueError):
+            interface.write(4, -1)
+
+    assert len(fake_serial.writes) == 1
+    assert fake_serial.registers == {1: 11, 2: 22, 3: 33}
+    assert calls[0] == ("a", "begin")
+    assert calls[-1] == ("a", "end")
+
+    # reads flush the pending writes
+    interface.set_interceptors(None)
+    with interface.batch():
+        interface.write(1, 12)
+        assert interface.read(1) == 12
+        interface.write(1, 13)
+    assert interface.read(1) == 13
+
+
+def test_write_compiled(shadow_interface, fake_serial):
+    """ Test sending formatted write requests and updating the shadow.
+
+    :param shadow_interface: register interface with shadow registers
+    :param fake_serial: fake serial device
+    :return:
+    """
+    pairs = ((3, 42), (4, 1))
+    request = format_write_request(3, 42) + format_write_request(4, 1)
+
+    assert shadow_interface.write_compiled(request, pairs)
+    assert shadow_interface.write_compiled(request, pairs)
+    assert fake_serial.writes == [request, request]
+    assert fake_serial.registers == {3: 42, 4: 1}
+
+    # the shadow knows the values sent
+    assert shadow_interface.write(4, 1)
+    assert len(fake_serial.writes) == 2
+
+    shadow_interface.disconnect()
+    assert not shadow_interface.write_compiled(request, pairs)
+
+
+def test_batch_per_thread(interface, fake_serial):
+    """ Test that the batch of a thread does not capture the writes of the
+    other threads.
+
+    :param interface: register interface connected to a fake device
+    :param fake_serial: fake serial device
+    :return:
+    """
+    with interface.batch():
+        interface.write(1, 11)
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            executor.submit(interface.write, 2, 22).result()
+            assert executor.submit(interface.read, 2).result() == 22
+        assert fake_serial.registers == {2: 22}
+
+    assert fake_serial.registers == {1: 11, 2: 22}
+    assert len(fake_serial.writes) == 3
+
+
+def test_batch_exception(interface, fake_serial):
+    """ Test that the writes of a batch are dropped if it raises.
+
+    :param interface: register interface connected to a fake device
+    :param fake_serial: fake serial device
+    :return:
+    """
+    with pytest.raises(RuntimeError):
+        with interface.batch():
+            interface.write(3, 33)
+            raise RuntimeError
+
+    assert fake_serial.writes == []
+    assert interface.write(3, 34)
+    assert fake_serial.registers == {3: 34}
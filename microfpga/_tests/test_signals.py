@@ -2,7 +2,23 @@
 mechanisms of the signals.
 """
 import pytest
-from microfpga.signals import Signal, _Mode, LaserTriggerMode, format_sequence
+from microfpga.signals import (
+    ADDR_CAM_EXPO,
+    ADDR_TTL,
+    MAX_CAM_EXPOSURE,
+    REGISTER_MAP,
+    Analog,
+    Camera,
+    RegisterMap,
+    Signal,
+    Ttl,
+    _Mode,
+    LaserTrigger,
+    LaserTriggerMode,
+    compile_sequences,
+    every,
+    format_sequence
+)
 
 
 class SignalTest(Signal):
@@ -137,3 +153,189 @@ def test_format_sequence(sequence, value):
     :return:
     """
     assert format_sequence(sequence) == value
+
+
+def test_laser_trigger_get_state(interface, fake_serial):
+    """ Test that the laser trigger state is read in a single transmission.
+
+    :param interface: register interface connected to a fake device
+    :param fake_serial: fake serial device
+    :return:
+    """
+    laser = LaserTrigger(2, interface)
+    laser.set_state(LaserTriggerMode.MODE_RISING, 1500, 43690)
+    fake_serial.writes.clear()
+
+    assert laser.get_state() == [2, 1500, 43690]
+    assert len(fake_serial.writes) == 1
+
+
+def test_signal_precomputed_address(interface, fake_serial):
+    """ Test that signals resolve their absolute address at instantiation
+    and have no instance dictionary.
+
+    :param interface: register interface connected to a fake device
+    :param fake_serial: fake serial device
+    :return:
+    """
+    ttl = Ttl(3, interface)
+    assert ttl.address == ADDR_TTL + 3
+    assert not hasattr(ttl, "__dict__")
+
+    assert ttl.set_state(1)
+    assert fake_serial.registers[ADDR_TTL + 3] == 1
+    assert ttl.get_state() == 1
+
+    with pytest.raises(ValueError):
+        ttl.set_state(2)
+
+
+def test_read_only_signal_set_state():
+    """ Test that setting the state of a read-only signal raises an error.
+
+    :return:
+    """
+    sig = SignalTest(output=False, max_value=10)
+    with pytest.raises(ValueError, match="read-only"):
+        sig.set_state(5)
+
+
+def test_register_map():
+    """ Test the consistency of the register map with the signals.
+
+    :return:
+    """
+    assert REGISTER_MAP["ttl"].address == ADDR_TTL
+    assert REGISTER_MAP.get_block(ADDR_TTL + 2).name == "ttl"
+    assert REGISTER_MAP.get_block(150) is None
+
+    assert Ttl(1, None).get_num_signal() == REGISTER_MAP["ttl"].count
+    assert _Mode(0, None).get_max() == REGISTER_MAP["mode"].max
+    assert Analog(0, None).get_max() == -1
+
+    writable = REGISTER_MAP.get_writable_addresses()
+    assert ADDR_TTL in writable
+    assert REGISTER_MAP["analog"].address not in writable
+    assert REGISTER_MAP["version"].address not in writable
+
+    for block in REGISTER_MAP:
+        assert block.max < 2**block.width
+
+
+@pytest.mark.parametrize(
+    "address, value, message",
+    [(ADDR_TTL, 2, "not allowed"), (150, 0, "not mapped"),
+     (REGISTER_MAP["analog"].address, 0, "read-only")]
+)
+def test_register_map_check_writes(address, value, message):
+    """ Test the validation of the values written to the registers.
+
+    :param address: register address
+    :param value: value
+    :param message: expected error message
+    :return:
+    """
+    assert REGISTER_MAP.check_writes([(ADDR_TTL, 1)]) == [(ADDR_TTL, 1)]
+    assert not REGISTER_MAP.is_allowed(address, value)
+    with pytest.raises(ValueError, match=message):
+        REGISTER_MAP.check_writes([(ADDR_TTL, 1), (address, value)])
+
+
+def test_camera_requests():
+    """ Test that the camera requests are validated by the register map.
+
+    :return:
+    """
+    camera = Camera(None)
+    assert camera.get_requests(10, 20, 30, 40)[2] == (ADDR_CAM_EXPO, 30)
+    with pytest.raises(ValueError, match="camera_exposure"):
+        camera.get_requests(10, 20, MAX_CAM_EXPOSURE + 1, 40)
+
+
+def test_register_map_bulk(interface, fake_serial):
+    """ Test reading a block of registers in one transmission.
+
+    :param interface: register interface connected to a fake device
+    :param fake_serial: fake serial device
+    :return:
+    """
+    interface.write_many(
+        REGISTER_MAP.check_writes(
+            zip(REGISTER_MAP.get_addresses("pwm", [1, 3]), [10, 20])
+        )
+    )
+    assert REGISTER_MAP.read(interface, "pwm") == [0, 10, 0, 20, 0]
+    assert REGISTER_MAP.read(interface, "pwm", [3]) == [20]
+    assert len(fake_serial.writes) == 3
+
+    with pytest.raises(ValueError):
+        REGISTER_MAP.read(interface, "pwm", [5])
+    assert len(fake_serial.writes) == 3
+
+
+def test_register_map_overlap():
+    """ Test that overlapping blocks are rejected.
+
+    :return:
+    """
+    blocks = [REGISTER_MAP["ttl"], REGISTER_MAP["ttl"]._replace(name="other")]
+    with pytest.raises(ValueError):
+        RegisterMap(blocks)
+
+
+@pytest.mark.parametrize(
+    "pattern, expected",
+    [
+        ({0: "10", 2: every(4, 1)}, {0: 0xAAAA, 2: 0x4444}),
+        ([[1, 0], [0, 1]], [0xAAAA, 0x5555]),
+        ([[True] + [False] * 7, "0011"], [0x8080, 0x3333]),
+        ([[1, 1, 0, 0] * 8], [0xCCCC]),
+        ([[1] * 16], [0xFFFF]),
+        (([1, 0] for _ in range(2)), [0xAAAA, 0xAAAA]),
+        (iter(["01", "0001"]), [0x5555, 0x1111]),
+    ],
+)
+def test_compile_sequences(pattern, expected):
+    """ Test compiling sequences, the first frame being the MSB.
+
+    :param pattern: frame pattern
+    :param expected: expected sequences
+    :return:
+    """
+    assert compile_sequences(pattern) == expected
+
+
+def test_compile_sequences_numpy():
+    """ Test compiling a numpy matrix.
+
+    :return:
+    """
+    numpy = pytest.importorskip("numpy")
+
+    pattern = numpy.zeros((3, 48), dtype=bool)
+    pattern[0, ::2] = True
+    pattern[1, 1::2] = True
+    pattern[2, ::4] = True
+    assert compile_sequences(pattern) == [0xAAAA, 0x5555, 0x8888]
+
+
+@pytest.mark.parametrize(
+    "pattern",
+    [
+        [[1, 0, 0]],
+        ["100"],
+        [[1, 0] * 8 + [1, 1]],
+        {0: [1] * 16 + [0] * 16},
+        [[2, 0]],
+        {1: "10a0"},
+        [[]],
+    ],
+)
+def test_compile_sequences_invalid(pattern):
+    """ Test that patterns that do not fit in the sequences are rejected.
+
+    :param pattern: frame pattern
+    :return:
+    """
+    with pytest.raises(ValueError):
+        compile_sequences(pattern)
@@ -0,0 +1,128 @@
+""" Tests of the streaming acquisition of the analog inputs.
+"""
+import time
+import pytest
+from microfpga import signals
+from microfpga.controller import MicroFPGA
+from microfpga.emulator import Emulator
+from microfpga.regint import Interceptor
+from microfpga.stream import AnalogStream
+
+np = pytest.importorskip("numpy")
+
+
+def _analog(channel, _timestamp):
+    return 1000 * (channel + 1)
+
+
+@pytest.mark.parametrize("threaded", [False, True])
+def test_analog_stream(threaded):
+    """ Test that samples are acquired in order with their timestamps.
+
+    :param threaded: True to use a threaded controller
+    :return:
+    """
+    emulator = Emulator("Au", analog=_analog)
+    with MicroFPGA(
+            n_ai=3, transport=emulator.open_transport(), threaded=threaded
+    ) as mufpga:
+        analog_stream = mufpga.open_analog_stream([2, 0], burst=8)
+        with analog_stream:
+            chunks = []
+            for chunk in analog_stream.chunks(max_samples=20):
+                chunks.append(chunk)
+                if sum(len(c.timestamps) for c in chunks) >= 100:
+                    break
+        assert not analog_stream.is_running()
+
+    values = np.concatenate([chunk.values for chunk in chunks])
+    timestamps = np.concatenate([chunk.timestamps for chunk in chunks])
+    assert all(len(chunk.timestamps) <= 20 for chunk in chunks)
+    assert values.dtype == np.uint16
+    assert (values == [3000, 1000]).all()
+    assert (np.diff(timestamps) >= 0).all()
+    assert analog_stream.n_samples % 8 == 0
+    assert emulator.n_reads >= 2 * analog_stream.n_samples
+
+
+def test_analog_stream_overrun():
+    """ Test that the oldest samples are dropped when the buffer is full.
+
+    :return:
+    """
+    emulator = Emulator("Au", analog=_analog)
+    with MicroFPGA(n_ai=1, transport=emulator.open_transport()) as mufpga:
+        with mufpga.open_analog_stream(capacity=16, burst=4) as analog_stream:
+            while analog_stream.n_samples < 40:
+                time.sleep(0.001)
+
+    assert analog_stream.n_dropped == analog_stream.n_samples - 16
+    chunk = analog_stream.read()
+    assert len(chunk.timestamps) == 16
+    assert (np.diff(chunk.timestamps) >= 0).all()
+
+    # stopped and consumed
+    assert len(analog_stream.read().timestamps) == 0
+    assert not list(analog_stream)
+
+
+def test_analog_stream_invalid(interface):
+    """ Test that unavailable or missing channels are rejected.
+
+    :param interface: register interface connected to a fake device
+    :return:
+    """
+    emulator = Emulator("Au")
+    with MicroFPGA(n_ai=2, transport=emulator.open_transport()) as mufpga:
+        with pytest.raises(ValueError):
+            mufpga.open_analog_stream([2])
+        with pytest.raises(ValueError):
+            mufpga.open_analog_stream(capacity=8, burst=16)
+        with pytest.raises(ValueError):
+            mufpga.open_analog_stream([])
+        with pytest.raises(ValueError):
+            AnalogStream(interface, [])
+
+    with MicroFPGA(transport=emulator.open_transport()) as mufpga:
+        with pytest.raises(ValueError):
+            mufpga.open_analog_stream()
+
+
+class FailingReads(Interceptor):
+    """ Interceptor answering -1 to the first reads of an address. """
+    def __init__(self, address, n_failing):
+        self.address = address
+        self.n_failing = n_failing
+
+    def on_read(self, address):
+        if address == self.address and self.n_failing:
+            self.n_failing -= 1
+            return -1
+        return None
+
+
+def test_analog_stream_failed():
+    """ Test that bursts with missing answers are counted as failed, and
+    that the acquisition stops upon disconnection.
+
+    :return:
+    """
+    emulator = Emulator("Au", analog=_analog)
+    with MicroFPGA(
+            n_ai=1,
+            transport=emulator.open_transport(),
+            interceptors=[FailingReads(signals.ADDR_AI, 3 * 4)],
+    ) as mufpga:
+        with mufpga.open_analog_stream(burst=4) as analog_stream:
+            chunk = analog_stream.read(timeout=5)
+            assert len(chunk.timestamps) > 0
+            assert (chunk.values == 1000).all()
+        assert analog_stream.n_failed == 3 * 4
+
+        analog_stream = mufpga.open_analog_stream(burst=4)
+        mufpga.disconnect()
+        analog_stream.start()
+        assert len(analog_stream.read(timeout=5).timestamps) == 0
+        assert not analog_stream.is_running()
+        assert analog_stream.n_samples == 0
+        assert analog_stream.n_failed == 4
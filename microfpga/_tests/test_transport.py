@@ -0,0 +1,143 @@
+""" Unit tests of microfpga.transport.
+"""
+import socket
+import threading
+import time
+from microfpga import signals
+from microfpga.controller import MicroFPGA
+from microfpga.regint import (
+    RegisterInterface,
+    format_read_request,
+    format_write_request
+)
+from microfpga.transport import (
+    LoopbackTransport,
+    RegisterFile,
+    SerialTransport,
+    TcpTransport,
+    open_transport
+)
+
+
+def test_register_file_split_requests():
+    """ Test that requests split across several calls are processed once
+    complete.
+
+    :return:
+    """
+    register_file = RegisterFile()
+    data = format_write_request(3, 42) + format_read_request(3)
+
+    assert register_file.process(data[:4]) == b""
+    assert register_file.process(data[4:11]) == b""
+    assert register_file.registers == {3: 42}
+    assert register_file.process(data[11:]) == int.to_bytes(42, 4, "little")
+
+
+def test_open_loopback():
+    """ Test opening an in-memory transport from its URL.
+
+    :return:
+    """
+    transport = open_transport("loop://")
+    assert isinstance(transport, LoopbackTransport)
+    assert isinstance(transport.peer, RegisterFile)
+    assert open_transport(transport) is transport
+
+
+def test_open_serial_url():
+    """ Test that serial URLs are opened with pyserial.
+
+    :return:
+    """
+    transport = open_transport("serial://loop://")
+    assert isinstance(transport, SerialTransport)
+    assert transport.write(b"\x2a\x0d") == 2
+    assert transport.read(2) == b"\x2a\x0d"
+    transport.close()
+
+
+def test_tcp_transport():
+    """ Test the register interface over a TCP connection to a server
+    answering with a register file.
+
+    :return:
+    """
+    server = socket.socket()
+    server.bind(("127.0.0.1", 0))
+    server.listen(1)
+    host, port = server.getsockname()
+
+    def serve():
+        connection, _ = server.accept()
+        register_file = RegisterFile()
+        with connection:
+            while True:
+                data = connection.recv(1024)
+                if not data:
+                    break
+                connection.sendall(register_file.process(data))
+
+    thread = threading.Thread(target=serve, daemon=True)
+    thread.start()
+
+    interface = RegisterInterface(transport=f"tcp://{host}:{port}")
+    assert isinstance(interface.get_device(), str)
+    interface.write_many([(1, 11), (2, 22)])
+    assert interface.read_many([2, 1, 3]) == [22, 11, 0]
+    interface.disconnect()
+
+    thread.join(timeout=5)
+    server.close()
+
+
+def test_tcp_transport_timeout():
+    """ Test that reads return fewer bytes after the timeout, and that the
+    data received late can be discarded.
+
+    :return:
+    """
+    server = socket.socket()
+    server.bind(("127.0.0.1", 0))
+    server.listen(1)
+
+    transport = TcpTransport(*server.getsockname(), timeout=0.05)
+    assert transport.read(4) == b""
+
+    # late answer
+    connection, _ = server.accept()
+    connection.sendall(b"\x2a\x00\x00\x00")
+    time.sleep(0.05)
+    transport.reset_input_buffer()
+    assert transport.read(4) == b""
+    connection.sendall(b"\x0b\x00\x00\x00")
+    assert transport.read(4) == b"\x0b\x00\x00\x00"
+
+    connection.close()
+    transport.close()
+    server.close()
+
+
+def test_controller_with_transport():
+    """ Test the controller with an in-memory transport.
+
+    :return:
+    """
+    transport = LoopbackTransport(
+        RegisterFile(
+            {signals.ADDR_VER: signals.CURR_VER,
+             signals.ADDR_ID: signals.ID_CU}
+        )
+    )
+
+    with MicroFPGA(n_laser=2, n_pwm=1, transport=transport) as mufpga:
+        assert mufpga.is_connected()
+        assert mufpga.get_id() == "Cu"
+
+        mufpga.set_laser_state(1, 4, 100, 65535)
+        mufpga.set_pwm_state(0, 128)
+        assert mufpga.get_laser_state(1) == [4, 100, 65535]
+        assert mufpga.get_pwm_state(0) == 128
+        assert mufpga.is_active_sync()
+
+    assert not mufpga.is_connected()
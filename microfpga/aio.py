@@ -0,0 +1,749 @@
+""" Asyncio interface to MicroFPGA.
+
+AsyncRegisterInterface implements the register interface protocol without
+blocking the event loop: requests are written immediately and the answers are
+read whenever the serial port is readable. Since the FPGA answers read
+requests in order, many read requests can be in flight at once, each one
+being resolved by the next 4 bytes received.
+
+AsyncMicroFPGA mirrors the public methods of controller.MicroFPGA as
+coroutines. It must be connected before use, which is done when entering its
+asynchronous context:
+
+    async with AsyncMicroFPGA(n_laser=2) as mufpga:
+        await mufpga.set_mode_state(0, LaserTriggerMode.MODE_ON)
+
+Every coroutine reading from the FPGA accepts a timeout (s). Since the
+answers carry no address, a read that times out resynchronizes the interface:
+the other requests in flight fail with a ResynchronizationError (a
+TimeoutError) and the data received so far is discarded, so that an answer
+lost by the device does not shift the answers of the following requests. An
+answer arriving after its request timed out is discarded as well, as long as
+no other request is in flight.
+"""
+import asyncio
+from collections import deque
+import serial
+from microfpga import regint
+from microfpga import signals
+from microfpga.controller import SignalChannels
+from microfpga.signals import ActiveParameters
+
+# pylint: disable=too-many-arguments
+# pylint: disable=too-many-instance-attributes
+# pylint: disable=too-many-public-methods
+
+_CAMERA_PARAMETERS = (
+    (ActiveParameters.PULSE.value, signals.ADDR_CAM_PULSE),
+    (ActiveParameters.DELAY.value, signals.ADDR_LASER_DELAY),
+    (ActiveParameters.EXPOSURE.value, signals.ADDR_CAM_EXPO),
+    (ActiveParameters.READOUT.value, signals.ADDR_CAM_READOUT),
+)
+
+
+class ResynchronizationError(asyncio.TimeoutError):
+    """ Raised by the reads that were in flight when another read timed out.
+    """
+
+
+class AsyncRegisterInterface:
+    """ Asynchronous communication interface for the FPGA.
+
+    The serial port is opened in non-blocking mode and read from the event
+    loop when data is available. On platforms where the event loop cannot
+    watch the serial port (e.g. Windows), the port is read in a worker thread
+    instead.
+
+    Args:
+        known_device (str): device to connect to if several compatible
+            devices are detected.
+        timeout (float): default timeout (s) of the read requests.
+    """
+    def __init__(self, known_device=None, timeout=regint.TIMEOUT):
+        self._known_device = known_device
+        self._timeout = timeout
+
+        self._device = None
+        self._serial = None
+        self._connected = False
+
+        self._loop = None
+        self._reader_task = None
+        self._pending = deque()
+        self._answers = bytearray()
+
+    async def connect(self):
+        """ Connect to the USB port.
+
+        :return: True if connected, False otherwise.
+        """
+        if self._connected:
+            return True
+
+        self._device = regint.select_device(self._known_device)
+        if self._device is None:
+            return False
+
+        self._loop = asyncio.get_running_loop()
+        self._serial = serial.Serial(self._device, regint.BAUDRATE, timeout=0)
+
+        try:
+            self._loop.add_reader(self._serial.fileno(), self._on_readable)
+        except (NotImplementedError, AttributeError):
+            # poll the port from a worker thread instead
+            self._serial.timeout = 0.1
+            self._reader_task = self._loop.create_task(self._read_in_thread())
+
+        self._connected = True
+        return True
+
+    def is_connected(self):
+        """ Check if it is connected to a USB port.
+
+        :return: True if it is, False otherwise.
+        """
+        return self._connected
+
+    def disconnect(self):
+        """ Disconnect from the USB port and cancel the pending requests.
+
+        :return:
+        """
+        if self._serial:
+            if self._reader_task is not None:
+                self._reader_task.cancel()
+                self._reader_task = None
+            else:
+                self._loop.remove_reader(self._serial.fileno())
+            self._serial.close()
+
+        while self._pending:
+            self._pending.popleft().cancel()
+        self._answers.clear()
+
+        self._connected = False
+
+    def get_device(self):
+        """ Return the device.
+
+        :return: device.
+        """
+        return self._device
+
+    def _on_readable(self):
+        self._receive(self._serial.read(max(1, self._serial.in_waiting)))
+
+    async def _read_in_thread(self):
+        while True:
+            data = await self._loop.run_in_executor(
+                None, self._serial.read, regint.READ_ANSWER_SIZE
+            )
+            if data:
+                self._receive(data)
+
+    def _receive(self, data):
+        self._answers += data
+
+        # answers arrive in the order of the requests, including those that
+        # were cancelled in the meantime
+        while self._pending and len(self._answers) >= regint.READ_ANSWER_SIZE:
+            future = self._pending.popleft()
+            value = regint.format_to_int(
+                bytes(self._answers[:regint.READ_ANSWER_SIZE])
+            )
+            del self._answers[:regint.READ_ANSWER_SIZE]
+
+            if not future.done():
+                future.set_result(value)
+
+        # unexpected data
+        if not self._pending:
+            self._answers.clear()
+
+    async def _wait(self, awaitable, timeout):
+        if timeout is None:
+            timeout = self._timeout
+        return await asyncio.wait_for(awaitable, timeout)
+
+    async def write(self, address, value, force=False):
+        """ Write a new value at the specified address.
+
+        :param address: address at which to write the value.
+        :param value: new value.
+        :param force: unused, kept for compatibility with RegisterInterface.
+        :return: True if the request was sent, False if the device is not
+            connected.
+        """
+        # pylint: disable=unused-argument
+        if self._connected:
+            self._serial.write(regint.format_write_request(address, value))
+            return True
+        return False
+
+    async def write_many(self, pairs, force=False):
+        """ Write several values in a single transmission.
+
+        See RegisterInterface.write_many.
+
+        :param pairs: iterable of (address, value) pairs.
+        :param force: unused, kept for compatibility with RegisterInterface.
+        :return: list of booleans, one per pair, True if the corresponding
+            request was sent, False if it was invalid or if the device is not
+            connected.
+        """
+        # pylint: disable=unused-argument
+        pairs = list(pairs)
+        status = [False] * len(pairs)
+        if not self._connected:
+            return status
+
+        buff = bytearray(regint.WRITE_REQUEST_SIZE * len(pairs))
+        offset = 0
+        for i, (address, value) in enumerate(pairs):
+            try:
+                offset = regint.pack_write_request_into(
+                    buff, offset, address, value
+                )
+            except ValueError:
+                continue
+            status[i] = True
+
+        if offset:
+            self._serial.write(memoryview(buff)[:offset])
+
+        return status
+
+    async def read(self, address, timeout=None):
+        """ Read the value at the specified address.
+
+        :param address: address to read from.
+        :param timeout: timeout (s), None for the default timeout.
+        :return: value returned by the FPGA, -1 if not connected.
+        """
+        values = await self.read_many([address], timeout)
+        return values[0]
+
+    async def read_many(self, addresses, timeout=None):
+        """ Read several addresses with pipelined requests.
+
+        :param addresses: iterable of addresses to read from.
+        :param timeout: timeout (s) for all values, None for the default
+            timeout.
+        :return: list of values returned by the FPGA, in the same order as the
+            addresses, -1 if not connected.
+        """
+        addresses = list(addresses)
+        if not self._connected:
+            return [-1] * len(addresses)
+
+        if not addresses:
+            return []
+
+        futures = [self._loop.create_future() for _ in addresses]
+        self._serial.write(regint.format_read_requests(addresses))
+        self._pending.extend(futures)
+
+        try:
+            return list(await self._wait(asyncio.gather(*futures), timeout))
+        except ResynchronizationError:
+            raise
+        except asyncio.TimeoutError:
+            self._resynchronize()
+            raise
+
+    def _resynchronize(self):
+        """ Fail the requests in flight and discard the data received, so
+        that the next answers match the next requests.
+
+        :return:
+        """
+        while self._pending:
+            future = self._pending.popleft()
+            if not future.done():
+                future.set_exception(
+                    ResynchronizationError(
+                        "Request dropped after another request timed out."
+                    )
+                )
+        self._answers.clear()
+        if self._serial is not None:
+            self._serial.reset_input_buffer()
+
+
+class AsyncMicroFPGA(SignalChannels):
+    """ Asynchronous MicroFPGA controller.
+
+    The parameters are the same as for controller.MicroFPGA. The controller is
+    connected by awaiting connect() or by entering its asynchronous context.
+    """
+    def __init__(
+            self,
+            n_laser=0,
+            n_ttl=0,
+            n_servo=0,
+            n_pwm=0,
+            n_ai=0,
+            use_camera=True,
+            known_device=None,
+            timeout=regint.TIMEOUT,
+    ):
+        self._n_laser = n_laser
+        self._n_ttl = n_ttl
+        self._n_servo = n_servo
+        self._n_pwm = n_pwm
+        self._n_ai = n_ai
+        self._use_camera = use_camera
+
+        SignalChannels.__init__(self)
+        self._serial = AsyncRegisterInterface(known_device, timeout)
+        self.device = None
+
+        self._version = -1
+        self._id = -1
+        self._camera = None
+        self._sync_mode = None
+
+    async def connect(self):
+        """ Connect to the FPGA and instantiate the signals.
+
+        :return: True if connected, False otherwise.
+        """
+        if not await self._serial.connect():
+            return False
+        self.device = self._serial.get_device()
+
+        self._version, self._id = await self._serial.read_many(
+            [signals.ADDR_VER, signals.ADDR_ID]
+        )
+
+        if not signals.check_compatibility(self._version, self._id):
+            self.disconnect()
+            return False
+
+        com = self._serial
+        self._lasers = [
+            signals.LaserTrigger(i, com) for i in range(self._n_laser)
+        ]
+        self._ttls = [signals.Ttl(i, com) for i in range(self._n_ttl)]
+        self._servos = [signals.Servo(i, com) for i in range(self._n_servo)]
+        self._pwms = [signals.Pwm(i, com) for i in range(self._n_pwm)]
+        if self._id in signals.get_analog_ids():
+            self._ais = [signals.Analog(i, com) for i in range(self._n_ai)]
+
+        if self._use_camera:
+            self._camera = signals.Camera(com)
+            self._sync_mode = signals.SyncMode(com)
+            await self._sync_mode.set_state(
+                signals.TriggerSyncMode.ACTIVE.value
+            )
+        else:
+            await signals.SyncMode(com).set_state(
+                signals.TriggerSyncMode.PASSIVE.value
+            )
+
+        return True
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        self.disconnect()
+
+    def disconnect(self):
+        """ Disconnect for the connected device.
+
+        :return:
+        """
+        if self.is_connected():
+            self._serial.disconnect()
+
+    def is_connected(self):
+        """ Check if the controller is connected to a device.
+
+        :return: True if it is, False otherwise.
+        """
+        return self._serial.is_connected()
+
+    @staticmethod
+    async def _set(channels, channel, value):
+        if 0 <= channel < len(channels):
+            return await channels[channel].set_state(value)
+        return False
+
+    async def _get(self, channels, channel, timeout):
+        if 0 <= channel < len(channels):
+            signal = channels[channel]
+            return await self._serial.read(signal.address, timeout)
+        return -1
+
+    async def set_ttl_state(self, channel, value):
+        """ Set the state of the specified TTL channel to a new value.
+
+        :param channel: TTL channel.
+        :param value: new value.
+        :return: True if the request was sent, False if disconnected.
+        """
+        return await self._set(self._ttls, channel, value)
+
+    async def get_ttl_state(self, channel, timeout=None):
+        """ Get the current state of the specified TTL channel.
+
+        :param channel: TTL channel.
+        :param timeout: timeout (s), None for the default timeout.
+        :return: TTL state.
+        """
+        return await self._get(self._ttls, channel, timeout)
+
+    async def set_servo_state(self, channel, value):
+        """ Set the state of the specified servo channel to a new value.
+
+        :param channel: servo channel.
+        :param value: new value.
+        :return: True if the request was sent, False if disconnected.
+        """
+        return await self._set(self._servos, channel, value)
+
+    async def get_servo_state(self, channel, timeout=None):
+        """ Get the current state of the specified servo channel.
+
+        :param channel: servo channel.
+        :param timeout: timeout (s), None for the default timeout.
+        :return: servo state.
+        """
+        return await self._get(self._servos, channel, timeout)
+
+    async def set_pwm_state(self, channel, value):
+        """ Set the state of the specified PWM channel to a new value.
+
+        :param channel: PWM channel.
+        :param value: new value.
+        :return: True if the request was sent, False if disconnected.
+        """
+        return await self._set(self._pwms, channel, value)
+
+    async def get_pwm_state(self, channel, timeout=None):
+        """ Get the current state of the specified PWM channel.
+
+        :param channel: PWM channel.
+        :param timeout: timeout (s), None for the default timeout.
+        :return: PWM state.
+        """
+        return await self._get(self._pwms, channel, timeout)
+
+    async def get_analog_state(self, channel, timeout=None):
+        """ Get the latest measurement of the analog input specified channel.
+
+        :param channel: analog channel
+        :param timeout: timeout (s), None for the default timeout.
+        :return: voltage measurement.
+        """
+        return await self._get(self._ais, channel, timeout)
+
+    async def set_mode_state(self, channel, value):
+        """ Set the trigger mode of the specified channel.
+
+        :param channel: laser channel.
+        :param value: new mode.
+        :return: True if the request was sent, False if disconnected.
+        """
+        modes = [laser.mode for laser in self._lasers]
+        return await self._set(modes, channel, value)
+
+    async def get_mode_state(self, channel, timeout=None):
+        """ Return the trigger mode of the specified channel.
+
+        :param channel: laser channel.
+        :param timeout: timeout (s), None for the default timeout.
+        :return: triggering mode.
+        """
+        modes = [laser.mode for laser in self._lasers]
+        return await self._get(modes, channel, timeout)
+
+    async def set_duration_us(self, channel, value):
+        """ Set the pulse duration (us) of the specified channel.
+
+        :param channel: laser channel
+        :param value: duration value in us.
+        :return: True if the request was sent, False if disconnected.
+        """
+        durations = [laser.duration for laser in self._lasers]
+        return await self._set(durations, channel, value)
+
+    async def get_duration_us(self, channel, timeout=None):
+        """ Get the pulse duration (us) of the specified channel.
+
+        :param channel: laser channel
+        :param timeout: timeout (s), None for the default timeout.
+        :return: duration value in us.
+        """
+        durations = [laser.duration for laser in self._lasers]
+        return await self._get(durations, channel, timeout)
+
+    async def set_sequence_state(self, channel, value):
+        """ Set the sequence of the specified channel to a new value.
+
+        :param channel: laser channel.
+        :param value: new value.
+        :return: True if the request was sent, False if disconnected.
+        """
+        sequences = [laser.seq for laser in self._lasers]
+        return await self._set(sequences, channel, value)
+
+    async def get_sequence_state(self, channel, timeout=None):
+        """ Get the specified channel's current sequence state.
+
+        :param channel: laser channel
+        :param timeout: timeout (s), None for the default timeout.
+        :return: sequence value.
+        """
+        sequences = [laser.seq for laser in self._lasers]
+        return await self._get(sequences, channel, timeout)
+
+    async def set_laser_state(self, channel, mode, duration, sequence):
+        """ Set the laser trigger parameters value for the specified channel.
+
+        :param channel: laser channel.
+        :param mode: new trigger mode.
+        :param duration: new pulse duration.
+        :param sequence: new sequence.
+        :return: True if the requests were sent, False if disconnected.
+        """
+        if 0 <= channel < self.get_number_lasers():
+            laser = self._lasers[channel]
+            return (
+                await laser.set_mode(mode) and
+                await laser.set_duration(duration) and
+                await laser.set_sequence(sequence)
+            )
+        return False
+
+    async def get_laser_state(self, channel, timeout=None):
+        """ Return a list of the laser trigger parameters value for the
+        specified channel.
+
+        The parameters are read with a single pipelined request.
+
+        :param channel: laser channel
+        :param timeout: timeout (s), None for the default timeout.
+        :return: list of parameters value [mode, duration, sequence].
+        """
+        if 0 <= channel < self.get_number_lasers():
+            return await self._serial.read_many(
+                [
+                    signals.ADDR_MODE + channel,
+                    signals.ADDR_DUR + channel,
+                    signals.ADDR_SEQ + channel,
+                ],
+                timeout
+            )
+        return [-1, -1, -1]
+
+    async def _get_sync_mode(self, timeout=None):
+        if self._sync_mode is None:
+            return False
+        return await self._serial.read(signals.ADDR_ACTIVE_SYNC, timeout)
+
+    async def is_active_sync(self, timeout=None):
+        """ Check if the FPGA is in active synchronization mode.
+
+        :param timeout: timeout (s), None for the default timeout.
+        :return: True if it is, False otherwise.
+        """
+        return await self._get_sync_mode(timeout)
+
+    async def _set_camera(self, setter, value):
+        if await self._get_sync_mode():
+            await setter(value)
+
+    async def _get_camera(self, address, timeout):
+        if await self._get_sync_mode(timeout):
+            return await self._serial.read(address, timeout)
+        return -1
+
+    async def set_camera_pulse(self, value):
+        """ Set the camera pulse (us) to a new value.
+
+        See MicroFPGA.set_camera_pulse.
+
+        :return:
+        """
+        if self._camera is not None:
+            await self._set_camera(self._camera.set_pulse, value)
+
+    async def get_camera_pulse(self, timeout=None):
+        """ Return the camera pulse in us.
+
+        :param timeout: timeout (s), None for the default timeout.
+        :return: pulse (us)
+        """
+        return await self._get_camera(signals.ADDR_CAM_PULSE, timeout)
+
+    async def set_camera_readout(self, value):
+        """ Set the camera read-out (us) to a new value.
+
+        See MicroFPGA.set_camera_readout.
+
+        :return:
+        """
+        if self._camera is not None:
+            await self._set_camera(self._camera.set_readout, value)
+
+    async def get_camera_readout(self, timeout=None):
+        """ Return the camera read-out in us.
+
+        :param timeout: timeout (s), None for the default timeout.
+        :return: read-out (us)
+        """
+        return await self._get_camera(signals.ADDR_CAM_READOUT, timeout)
+
+    async def set_camera_exposure(self, value):
+        """ Set the camera exposure (us) to a new value.
+
+        See MicroFPGA.set_camera_exposure.
+
+        :return:
+        """
+        if self._camera is not None:
+            await self._set_camera(self._camera.set_exposure, value)
+
+    async def get_camera_exposure(self, timeout=None):
+        """ Return the camera exposure (us).
+
+        :param timeout: timeout (s), None for the default timeout.
+        :return: exposure (us)
+        """
+        return await self._get_camera(signals.ADDR_CAM_EXPO, timeout)
+
+    async def set_laser_delay(self, value):
+        """ Set the delay (us) between camera and laser trigger.
+
+        :return:
+        """
+        if self._camera is not None:
+            await self._set_camera(self._camera.set_delay, value)
+
+    async def get_laser_delay(self, timeout=None):
+        """ Return the delay (us) between camera and laser trigger.
+
+        :param timeout: timeout (s), None for the default timeout.
+        :return: delay (us)
+        """
+        return await self._get_camera(signals.ADDR_LASER_DELAY, timeout)
+
+    async def set_camera_state(self, pulse, delay, exposure, readout):
+        """ Set the state of the camera trigger module in us.
+
+        See MicroFPGA.set_camera_state.
+
+        :param pulse: fire pulse length of the camera trigger signal in us.
+        :param delay: delay between the start of the camera pulse and the
+            start of the exposure in us.
+        :param exposure: camera exposure used to generate a "fire" signal to
+            the lasers in us.
+        :param readout: period in us between the end of the exposure and the
+            next fire pulse.
+        """
+        if await self._get_sync_mode():
+            await self._serial.write_many(
+                self._camera.get_requests(pulse, delay, exposure, readout)
+            )
+
+    async def get_camera_state(self, timeout=None):
+        """ Return the parameters of the camera trigger module in us.
+
+        The parameters are read with a single pipelined request.
+
+        :param timeout: timeout (s), None for the default timeout.
+        :return: State of the camera trigger module
+        """
+        values = await self._serial.read_many(
+            [address for _, address in _CAMERA_PARAMETERS], timeout
+        )
+        return {
+            name: value
+            for (name, _), value in zip(_CAMERA_PARAMETERS, values)
+        }
+
+    async def set_camera_state_ms(self, pulse, delay, exposure, readout):
+        """ Set the state of the camera trigger module in ms.
+
+        :param pulse: fire pulse length of the camera trigger signal in ms.
+        :param delay: delay between the start of the camera pulse and the
+            start of the exposure in ms.
+        :param exposure: camera exposure used to generate a "fire" signal to
+            the lasers in ms.
+        :param readout: period in ms between the end of the exposure and the
+            next fire pulse.
+        """
+        await self.set_camera_state(
+            int(pulse * 1_000),
+            int(delay * 1_000),
+            int(exposure * 1_000),
+            int(readout * 1_000)
+        )
+
+    async def get_camera_state_ms(self, timeout=None):
+        """ Return the parameters of the camera trigger module in ms.
+
+        :param timeout: timeout (s), None for the default timeout.
+        :return: State of the camera trigger module
+        """
+        state = await self.get_camera_state(timeout)
+        return {name: value / 1_000.0 for name, value in state.items()}
+
+    async def start_camera(self):
+        """ Start camera triggering and synchronization.
+
+        This method only has effect in active synchronization mode.
+        """
+        if await self._get_sync_mode():
+            await self._camera.start()
+
+    async def stop_camera(self):
+        """ Stop camera triggering and synchronization.
+
+        This method only has effect in active synchronization mode.
+        """
+        if await self._get_sync_mode():
+            await self._camera.stop()
+
+    async def is_camera_running(self, timeout=None):
+        """ Check if the camera is currently being triggered and synced with
+        the lasers.
+
+        :param timeout: timeout (s), None for the default timeout.
+        :return: True if it is running, False otherwise.
+        """
+        if await self._get_sync_mode(timeout):
+            return await self._serial.read(
+                signals.ADDR_START_TRIGGER, timeout
+            )
+        return False
+
+    async def set_active_sync(self):
+        """ Set the FPGA to active synchronization.
+
+        See MicroFPGA.set_active_sync.
+        """
+        if self._sync_mode is not None:
+            await self._sync_mode.set_state(
+                signals.TriggerSyncMode.ACTIVE.value
+            )
+
+    async def set_passive_sync(self):
+        """ Set the FPGA to passive synchronization.
+
+        See MicroFPGA.set_passive_sync.
+        """
+        if self._sync_mode is not None:
+            await self._sync_mode.set_state(
+                signals.TriggerSyncMode.PASSIVE.value
+            )
+
+    def get_id(self):
+        """ Return human-readable id.
+
+        :return: FPGA id.
+        """
+        return signals.get_board_name(self._id)
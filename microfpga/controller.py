@@ -10,19 +10,281 @@ creating multiple ports for the FPGA, a warning is emitting listing each
 compatible port found on the system. Users can pass on the port name to
 select to which USB port to connect.
 """
-import warnings
+import hashlib
+import json
+import operator
+import time
+from collections.abc import Mapping
+from enum import Enum
+from typing import NamedTuple, Optional, Sequence, Tuple
 from microfpga import signals
 from microfpga import regint
-from microfpga.signals import ActiveParameters
+from microfpga import stream
+from microfpga.signals import (
+    ActiveParameters,
+    LaserTriggerMode,
+    TriggerSyncMode
+)
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class LasersUpdate(NamedTuple):
+    """ Result of MicroFPGA.set_lasers.
+
+    Attributes:
+        sent: (channel, parameter) of the parameters that were sent, the
+            parameter being "mode", "duration" or "sequence".
+        failed: (channel, parameter) of the parameters that could not be
+            sent, e.g. because the device is disconnected.
+    """
+    sent: Tuple[Tuple[int, str], ...]
+    failed: Tuple[Tuple[int, str], ...]
+
+    @property
+    def ok(self):  # pylint: disable=invalid-name
+        """ True if all parameters were sent. """
+        return not self.failed
+
+
+class CameraTiming(NamedTuple):
+    """ Result of MicroFPGA.configure_camera.
+
+    Attributes:
+        pulse: pulse length (us) of the fire signal.
+        delay: delay (us) between fire and exposure signal pulses.
+        exposure: pulse length (us) of the exposure signal.
+        readout: delay (us) between the end of the exposure signal pulse and
+            the beginning of the fire signal pulse.
+        sent: True if the parameters were sent.
+        verified: True if the parameters read back from the FPGA are the ones
+            sent, False if they differ, None if they were not read back.
+    """
+    pulse: int
+    delay: int
+    exposure: int
+    readout: int
+    sent: bool
+    verified: Optional[bool] = None
+
+    @property
+    def pulse_ms(self):
+        """ Pulse length (ms) of the fire signal. """
+        return self.pulse / 1_000.0
+
+    @property
+    def delay_ms(self):
+        """ Delay (ms) between fire and exposure signal pulses. """
+        return self.delay / 1_000.0
+
+    @property
+    def exposure_ms(self):
+        """ Pulse length (ms) of the exposure signal. """
+        return self.exposure / 1_000.0
+
+    @property
+    def readout_ms(self):
+        """ Delay (ms) between exposure and fire signal pulses. """
+        return self.readout / 1_000.0
+
+    @property
+    def frame_period_ms(self):
+        """ Period (ms) of the fire signal. """
+        return (self.delay + self.exposure + self.readout) / 1_000.0
+
+
+class AnalogStates(NamedTuple):
+    """ Result of MicroFPGA.get_analog_states.
+
+    Attributes:
+        timestamp: time.monotonic() timestamp (s), halfway through the
+            reading of the channels.
+        values: value of each channel, as a numpy array (uint16, or float64
+            in volts) if numpy is available, or as a list otherwise.
+    """
+    timestamp: float
+    values: Sequence
+
+
+class BoardSnapshot(NamedTuple):
+    """ State of the board, as returned by MicroFPGA.snapshot.
+
+    Attributes:
+        timestamp: time.time() timestamp (s) of the reading.
+        version: FPGA configuration version.
+        board_id: FPGA ID.
+        active_sync: True if the FPGA is in active synchronization mode.
+        camera_running: True if the camera is being triggered.
+        camera: camera trigger parameters (us) in the order pulse, delay,
+            exposure and read-out, None if the camera is not used.
+        lasers: (mode, duration, sequence) of each laser.
+        ttls: state of each TTL output.
+        servos: position of each servo.
+        pwms: duty cycle of each PWM output.
+        analogs: value of each analog input.
+    """
+    timestamp: float
+    version: int
+    board_id: int
+    active_sync: bool
+    camera_running: bool
+    camera: Optional[Tuple[int, int, int, int]]
+    lasers: Tuple[Tuple[int, int, int], ...]
+    ttls: Tuple[int, ...]
+    servos: Tuple[int, ...]
+    pwms: Tuple[int, ...]
+    analogs: Tuple[int, ...]
+
+    def to_dict(self):
+        """ Return the snapshot as a dictionary of built-in types.
+
+        The camera parameters are indexed by ActiveParameters enum values,
+        and the laser parameters by "mode", "duration" and "sequence".
+
+        :return: dictionary.
+        """
+        state = self._asdict()  # pylint: disable=no-member
+        if self.camera is not None:
+            state["camera"] = dict(
+                zip((p.value for p in ActiveParameters), self.camera)
+            )
+        state["lasers"] = [
+            dict(zip(("mode", "duration", "sequence"), laser))
+            for laser in self.lasers
+        ]
+        for name in ("ttls", "servos", "pwms", "analogs"):
+            state[name] = list(state[name])
+        return state
+
+    def to_json(self, **kwargs):
+        """ Return the snapshot as a JSON string.
+
+        :param kwargs: arguments of json.dumps (e.g. indent).
+        :return: JSON string of to_dict.
+        """
+        return json.dumps(self.to_dict(), **kwargs)
+
+
+class StateUpdate(NamedTuple):
+    """ Result of MicroFPGA.apply.
+
+    Attributes:
+        sent: (register block, channel, value) of the registers written, in
+            the order they were sent, e.g. ("mode", 0, 2) for laser 0 set to
+            rising mode.
+        failed: (register block, channel, value) of the registers that could
+            not be written, e.g. because the device is disconnected.
+    """
+    sent: Tuple[Tuple[str, int, int], ...]
+    failed: Tuple[Tuple[str, int, int], ...]
+
+    @property
+    def ok(self):  # pylint: disable=invalid-name
+        """ True if all registers were written. """
+        return not self.failed
+
+
+class Preset(NamedTuple):
+    """ Configuration compiled by MicroFPGA.register_preset.
+
+    Attributes:
+        name: name of the preset.
+        pairs: (address, value) of the registers written, in the order they
+            are sent.
+        frame: formatted write requests.
+        digest: SHA-256 hash of the frame, identical for presets with the
+            same content.
+    """
+    name: str
+    pairs: Tuple[Tuple[int, int], ...]
+    frame: bytes
+    digest: str
+
+
+# Items of BoardSnapshot.to_dict that cannot be applied.
+_READ_ONLY_STATE = ("timestamp", "version", "board_id", "analogs")
+
+# Order in which MicroFPGA.apply writes the registers.
+_STOP_STAGE = 0
+_PARAMETER_STAGE = 1
+_START_STAGE = 2
+
+
+def _register_name(address):
+    """ Return the (register block, channel) of an address. """
+    block = signals.REGISTER_MAP.get_block(address)
+    return block.name, address - block.address
+
+
+def _per_channel(values):
+    """ Return the (channel, value) pairs of a sequence or a mapping. """
+    if values is None:
+        return []
+    if isinstance(values, Mapping):
+        return list(values.items())
+    return list(enumerate(values))
+
+
+class SignalChannels:
+    """ Signal channels of a controller, shared by MicroFPGA and
+    aio.AsyncMicroFPGA.
+    """
+    def __init__(self):
+        self._lasers = []
+        self._ttls = []
+        self._servos = []
+        self._pwms = []
+        self._ais = []
+
+    def get_number_lasers(self):
+        """ Return the number of laser channels.
+
+        :return: number of laser channels.
+        """
+        return len(self._lasers)
+
+    def get_number_ttls(self):
+        """ Return the number of TTL channels.
+
+        :return: number of TTL channels.
+        """
+        return len(self._ttls)
+
+    def get_number_servos(self):
+        """ Return the number of servo channels.
+
+        :return: number of servo channels.
+        """
+        return len(self._servos)
+
+    def get_number_pwms(self):
+        """ Return the number of PWM channels.
+
+        :return: number of PWM channels.
+        """
+        return len(self._pwms)
+
+    def get_number_analogs(self):
+        """ Return the number of analog input channels.
+
+        :return: number of analog input channels.
+        """
+        return len(self._ais)
 
 
 # pylint: disable=too-many-arguments
 # pylint: disable=too-many-instance-attributes
 # pylint: disable=too-many-branches
 # pylint: disable=too-many-public-methods
+# pylint: disable=too-many-locals
+# pylint: disable=too-many-statements
+# pylint: disable=too-many-lines
 
 
-class MicroFPGA:
+class MicroFPGA(SignalChannels):
     """ MicroFPGA controller.
 
     Upon instantiation, users can decide the number of signals (inputs/outputs
@@ -34,6 +296,33 @@ class MicroFPGA:
     drivers creating multiple ports for the FPGA, a warning is emitting
     listing each compatible port found on the system. Users can pass on the
     port name to select to which USB port to connect.
+
+    With use_shadow=True, the register interface remembers the last value
+    written to each register and skips writes that would not change it.
+
+    With use_cache=True, registers that only change when written by the host
+    (e.g. laser, camera and synchronization parameters) are served from the
+    last value written or read, optionally for at most cache_ttl seconds,
+    and the version and ID are only read once. The analog inputs are always
+    read from the FPGA.
+
+    With use_stats=True, the register interface counts the requests, bytes,
+    timeouts and short reads, and records latency histograms per register
+    group (laser, ttl, servo, pwm, camera, analog), see get_stats.
+
+    A recorder.Recorder passed as recorder logs all the requests and answers
+    exchanged with the FPGA, from the connection on.
+
+    Interceptors (see regint.Interceptor) passed as interceptors can observe,
+    modify or answer the requests of this controller before they are sent,
+    e.g. to add profiling, validation or caching.
+
+    With threaded=True, a dedicated I/O thread owns the serial port and
+    batches the requests of all threads sharing the controller.
+
+    Instead of detecting the USB port, the controller can communicate through
+    a transport (e.g. TCP bridge), passed as a transport.Transport object or
+    a URL such as "tcp://192.168.1.20:4000".
     """
     def __init__(
             self,
@@ -44,22 +333,43 @@ class MicroFPGA:
             n_ai=0,
             use_camera=True,
             known_device=None,
+            use_shadow=False,
+            use_cache=False,
+            cache_ttl=None,
+            threaded=False,
+            transport=None,
+            use_stats=False,
+            recorder=None,
+            interceptors=None,
     ):
-        self._serial = regint.RegisterInterface(known_device)
+        self._serial = regint.RegisterInterface(
+            known_device, use_shadow, threaded, transport, use_stats
+        )
+        if use_stats:
+            for address, group in signals.get_register_groups().items():
+                self._serial.set_stats_group(address, group)
+        if recorder is not None:
+            self._serial.set_recorder(recorder)
+        if interceptors:
+            self._serial.set_interceptors(interceptors)
+        if use_cache:
+            for address, policy in signals.get_cache_policies().items():
+                self._serial.set_cache_policy(
+                    address,
+                    policy,
+                    cache_ttl if policy is regint.CachePolicy.WRITE_THROUGH
+                    else None
+                )
         self.device = self._serial.get_device()
 
-        self._lasers = []
-        self._ttls = []
-        self._servos = []
-        self._pwms = []
-        self._ais = []
+        SignalChannels.__init__(self)
+        self._presets = {}
+        self._active_preset = None
         if self._serial.is_connected():
             self._version = self._serial.read(signals.ADDR_VER)
             self._id = self._serial.read(signals.ADDR_ID)
 
-            if (
-                    self._version == signals.CURR_VER
-            ) and self._id in signals.get_compatible_ids():
+            if signals.check_compatibility(self._version, self._id):
                 # instantiate lasers
                 for i in range(n_laser):
                     self._lasers.append(signals.LaserTrigger(i, self._serial))
@@ -94,21 +404,6 @@ class MicroFPGA:
             else:
                 self.disconnect()
 
-                if self._version != signals.CURR_VER:
-                    warnings.warn(
-                        f"Wrong version: expected {str(signals.CURR_VER)}, "
-                        f"got {str(self._version)}. The port has been "
-                        f"disconnected"
-                    )
-
-                if self._id not in signals.get_compatible_ids():
-                    warnings.warn(
-                        f"Wrong board id: expected {signals.ID_MOJO} (Mojo),"
-                        f" {signals.ID_CU} (Cu), {signals.ID_AU} (Au) or"
-                        f" {signals.ID_AUP} (Au+),"
-                        f" got {self._id}. The port has been disconnected"
-                    )
-
     def __enter__(self):
         return self
 
@@ -132,40 +427,41 @@ class MicroFPGA:
         """
         return self._serial.is_connected()
 
-    def get_number_lasers(self):
-        """ Return the number of laser channels.
+    def get_shadow_counters(self):
+        """ Return the number of write requests sent and skipped by the shadow
+        register file (see use_shadow parameter).
 
-        :return: number of laser channels.
+        :return: dictionary with "sent" and "skipped" number of requests.
         """
-        return len(self._lasers)
+        return self._serial.get_shadow_counters()
 
-    def get_number_ttls(self):
-        """ Return the number of TTL channels.
+    def get_stats(self):
+        """ Return a snapshot of the link statistics (see use_stats
+        parameter and RegisterInterface.get_stats).
 
-        :return: number of TTL channels.
+        :return: dictionary of the statistics, None if they are disabled.
         """
-        return len(self._ttls)
+        return self._serial.get_stats()
 
-    def get_number_servos(self):
-        """ Return the number of servo channels.
+    def reset_stats(self):
+        """ Reset the link statistics.
 
-        :return: number of servo channels.
+        :return:
         """
-        return len(self._servos)
+        self._serial.reset_stats()
 
-    def get_number_pwms(self):
-        """ Return the number of PWM channels.
+    def batch(self):
+        """ Group the writes of a block into a single transmission, e.g.:
 
-        :return: number of PWM channels.
-        """
-        return len(self._pwms)
+            with mufpga.batch():
+                mufpga.set_laser_state(0, 1, 1000, 65535)
+                mufpga.set_ttl_state(0, 1)
 
-    def get_number_analogs(self):
-        """ Return the number of analog input channels.
+        See RegisterInterface.batch.
 
-        :return: number of analog input channels.
+        :return: context manager.
         """
-        return len(self._ais)
+        return self._serial.batch()
 
     def set_ttl_state(self, channel, value):
         """ Set the state of the specified TTL channel to a new value.
@@ -240,6 +536,78 @@ class MicroFPGA:
             return self._ais[channel].get_state()
         return -1
 
+    def _analog_channels(self, channels):
+        """ Return the analog channels, checking that they are available.
+
+        :param channels: analog channels, None for all.
+        :return: list of channels.
+        """
+        if channels is None:
+            return list(range(self.get_number_analogs()))
+
+        channels = list(channels)
+        for channel in channels:
+            if not 0 <= channel < self.get_number_analogs():
+                raise ValueError(f"Analog input {channel} is not available.")
+        return channels
+
+    def get_analog_states(self, channels=None, volts=False):
+        """ Read several analog inputs with a single pipelined request.
+
+        The channels are sampled back to back, within the time needed to
+        transmit a read request, and share a single timestamp.
+
+        :param channels: analog channels, by default all.
+        :param volts: True to convert the values to volts (value / MAX_AI).
+        :return: AnalogStates, or None if the device is not connected or
+            the answers are incomplete.
+        """
+        channels = self._analog_channels(channels)
+
+        start = time.monotonic()
+        values = signals.REGISTER_MAP.read(self._serial, "analog", channels)
+        timestamp = (start + time.monotonic()) / 2
+        if not self.is_connected() or -1 in values:
+            return None
+
+        if np is not None:
+            values = np.array(values, dtype=np.uint16)
+            if volts:
+                values = values / signals.MAX_AI
+        elif volts:
+            values = [value / signals.MAX_AI for value in values]
+
+        return AnalogStates(timestamp, values)
+
+    def open_analog_stream(
+            self, channels=None, capacity=65536, burst=32, depth=2
+    ):
+        """ Return a stream acquiring analog inputs continuously (see
+        stream.AnalogStream), started upon entering its context:
+
+            with mufpga.open_analog_stream([0]) as analog_stream:
+                for chunk in analog_stream:
+                    ...
+
+        Several bursts are only in flight if the controller is threaded. The
+        stream requires numpy.
+
+        :param channels: analog channels, by default all.
+        :param capacity: number of samples held by the ring buffer.
+        :param burst: number of samples of each channel read per round trip.
+        :param depth: number of bursts in flight.
+        :return: AnalogStream.
+        """
+        channels = self._analog_channels(channels)
+        if not channels:
+            raise ValueError("No analog input to stream.")
+
+        return stream.AnalogStream(
+            self._serial,
+            signals.REGISTER_MAP.get_addresses("analog", channels),
+            capacity, burst, depth
+        )
+
     def set_mode_state(self, channel, value):
         """ Return the trigger mode of the specified channel.
 
@@ -345,6 +713,92 @@ class MicroFPGA:
             return self._lasers[channel].set_state(mode, duration, sequence)
         return False
 
+    def set_lasers(self, modes=None, durations=None, sequences=None):
+        """ Set the trigger parameters of several lasers in a single
+        transmission.
+
+        Each parameter is either a sequence of values (e.g. list or numpy
+        array) for the lasers 0, 1, 2..., or a mapping of laser channel to
+        value. Parameters that are None, or lasers that are absent from a
+        mapping, are left unchanged. Modes can be LaserTriggerMode values,
+        and sequences binary strings (see signals.format_sequence).
+
+        All values are validated before anything is sent. Durations and
+        sequences are sent before the modes, so that lasers are switched to
+        their new mode with their new parameters.
+
+        :param modes: trigger modes.
+        :param durations: pulse durations (us).
+        :param sequences: trigger sequences.
+        :return: LasersUpdate listing the parameters sent and those that
+            failed.
+        """
+        pairs = []
+        parameters = []
+        errors = []
+        for name, values in (
+                ("duration", durations),
+                ("sequence", sequences),
+                ("mode", modes),
+        ):
+            block = signals.REGISTER_MAP[name]
+            for channel, value in _per_channel(values):
+                if not 0 <= channel < self.get_number_lasers():
+                    errors.append(f"laser {channel} is not available")
+                    continue
+
+                if isinstance(value, LaserTriggerMode):
+                    value = value.value
+                elif isinstance(value, str):
+                    value = signals.format_sequence(value)
+
+                try:
+                    value = operator.index(value)
+                except TypeError:
+                    errors.append(
+                        f"laser {channel} {name}: {value!r} is not an integer"
+                    )
+                    continue
+
+                address = block.address + channel
+                if not signals.REGISTER_MAP.is_allowed(address, value):
+                    errors.append(
+                        f"laser {channel} {name}: {value} is not in "
+                        f"[0, {block.max}]"
+                    )
+                    continue
+
+                pairs.append((address, value))
+                parameters.append((channel, name))
+
+        if errors:
+            raise ValueError("Invalid laser states: " + "; ".join(errors))
+
+        status = self._serial.write_many(pairs) if pairs else []
+        return LasersUpdate(
+            sent=tuple(p for p, is_sent in zip(parameters, status) if is_sent),
+            failed=tuple(
+                p for p, is_sent in zip(parameters, status) if not is_sent
+            ),
+        )
+
+    def set_sequences(self, pattern):
+        """ Set the trigger sequences of several lasers from a frame pattern,
+        in a single transmission.
+
+        The pattern is a matrix (lasers x frames) of booleans, e.g. a numpy
+        array, or a mapping of laser channel to frames, for instance:
+
+            mufpga.set_sequences({0: "10", 1: "01", 2: signals.every(4)})
+
+        See signals.compile_sequences for details.
+
+        :param pattern: matrix or mapping.
+        :return: LasersUpdate listing the sequences sent and those that
+            failed.
+        """
+        return self.set_lasers(sequences=signals.compile_sequences(pattern))
+
     def get_laser_state(self, channel):
         """ Return a list of the laser trigger parameters value for the
         specified channel.
@@ -502,6 +956,57 @@ class MicroFPGA:
         if self._get_sync_mode():
             self._camera.set_state(pulse, delay, exposure, readout)
 
+    def configure_camera(
+            self,
+            pulse: int,
+            delay: int,
+            exposure: int,
+            readout: int,
+            verify: bool = False,
+    ):
+        """ Set the parameters of the camera trigger module (us) in a single
+        transmission, and optionally read them back.
+
+        All values are validated before anything is sent (see
+        set_camera_state for their meaning). With verify=True, the four
+        parameters are then read back from the FPGA with a single pipelined
+        request, bypassing the cache. Parameters that differ from the values
+        sent are forgotten by the shadow register file, so that the next
+        configuration sends them again.
+
+        :param pulse: fire pulse length of the camera trigger signal in us.
+        :param delay: delay between the start of the camera pulse and the
+            start of the exposure in us.
+        :param exposure: camera exposure in us.
+        :param readout: period in us between the end of the exposure and the
+            next fire pulse.
+        :param verify: True to read back the parameters.
+        :return: CameraTiming with the parameters applied (read back if
+            verified), or None if the FPGA is not in active synchronization.
+        """
+        if not self._get_sync_mode():
+            return None
+
+        values = (pulse, delay, exposure, readout)
+        sent = self._camera.set_state(*values)
+        if not verify:
+            return CameraTiming(*values, sent=sent)
+
+        addresses = [
+            signal.address for signal in self._camera.get_signals().values()
+        ]
+        self._serial.forget(addresses, shadow=False)
+        applied = self._serial.read_many(addresses)
+        verified = tuple(applied) == values
+        if not verified:
+            self._serial.forget(
+                address
+                for address, value, read in zip(addresses, values, applied)
+                if value != read
+            )
+
+        return CameraTiming(*applied, sent=sent, verified=verified)
+
     def get_camera_state(self):
         """
         Return the parameters of the camera trigger module in us.
@@ -605,21 +1110,303 @@ class MicroFPGA:
         if self._sync_mode is not None:
             self._sync_mode.set_passive_sync()
 
-    def get_id(self):
-        """ Return human-readable id.
+    def snapshot(self):
+        """ Read the state of all the signals of the controller with a single
+        pipelined request.
 
-        :return: FPGA id.
+        :return: BoardSnapshot, or None if the device is not connected or
+            the answers are incomplete.
+        """
+        if not self.is_connected():
+            return None
+
+        addresses = [signals.ADDR_ACTIVE_SYNC, signals.ADDR_START_TRIGGER]
+        if self._camera is not None:
+            addresses += [
+                signal.address
+                for signal in self._camera.get_signals().values()
+            ]
+        for laser in self._lasers:
+            addresses += [
+                laser.mode.address, laser.duration.address, laser.seq.address
+            ]
+        for outputs in (self._ttls, self._servos, self._pwms, self._ais):
+            addresses += [signal.address for signal in outputs]
+
+        timestamp = time.time()
+        values = self._serial.read_many(addresses)
+        if not self.is_connected() or -1 in values:
+            return None
+
+        values = iter(values)
+
+        def take(n_values):
+            return tuple(next(values) for _ in range(n_values))
+
+        active_sync, running = take(2)
+        camera = take(4) if self._camera is not None else None
+        return BoardSnapshot(
+            timestamp=timestamp,
+            version=self._version,
+            board_id=self._id,
+            active_sync=active_sync == TriggerSyncMode.ACTIVE.value,
+            camera_running=camera is not None and running == 1,
+            camera=camera,
+            lasers=tuple(take(3) for _ in self._lasers),
+            ttls=take(len(self._ttls)),
+            servos=take(len(self._servos)),
+            pwms=take(len(self._pwms)),
+            analogs=take(len(self._ais)),
+        )
+
+    def apply(self, desired_state):
+        """ Bring the signals to a desired state with the minimal number of
+        writes.
+
+        The desired state is a BoardSnapshot, or a dictionary in the format
+        of BoardSnapshot.to_dict from which items can be omitted to leave the
+        corresponding signals unchanged. Lasers, TTLs, servos and PWMs are
+        either a sequence for the channels 0, 1, 2... or a mapping of channel
+        to state. A laser state is a (mode, duration, sequence) sequence or a
+        mapping with any of the "mode", "duration" and "sequence" keys, and
+        the camera parameters a mapping indexed by ActiveParameters values.
+        Read-only items (timestamp, version, board_id and analogs) are
+        ignored, as are the camera items of a controller without camera
+        (use_camera=False) if they are None or False.
+
+        All values are validated before anything is sent. The current values
+        of the registers are then read with a single pipelined request, which
+        is served without any transmission for the registers held in the
+        cache (use_cache=True). Only the registers whose value differs are
+        written, in a single transmission and in the following order:
+            - camera stop and lasers switched off,
+            - synchronization mode, camera parameters, laser durations and
+                sequences, TTLs, servos and PWMs,
+            - other laser modes and camera start.
+
+        :param desired_state: BoardSnapshot or dictionary.
+        :return: StateUpdate listing the registers written and those that
+            failed.
+        """
+        requests = self._compile_state(desired_state)
+        current = self._serial.read_many(
+            [address for _, address, _ in requests]
+        )
+        changes = sorted(
+            (
+                request for request, value in zip(requests, current)
+                if request[2] != value
+            ),
+            key=operator.itemgetter(0)
+        )
+        pairs = [(address, value) for _, address, value in changes]
+
+        # the changes are computed against the device, not the shadow
+        status = self._serial.write_many(pairs, force=True) if pairs else []
+        registers = [
+            (*_register_name(address), value) for address, value in pairs
+        ]
+        return StateUpdate(
+            sent=tuple(r for r, is_sent in zip(registers, status) if is_sent),
+            failed=tuple(
+                r for r, is_sent in zip(registers, status) if not is_sent
+            ),
+        )
+
+    def _compile_state(self, desired_state):
+        """ Validate a desired state (see apply).
+
+        :param desired_state: BoardSnapshot or dictionary.
+        :return: list of (stage, address, value) of the desired registers.
+        """
+        if isinstance(desired_state, BoardSnapshot):
+            desired_state = desired_state.to_dict()
+
+        requests = []
+        errors = []
+
+        def add(stage, address, value):
+            if isinstance(value, Enum):
+                value = value.value
+            elif isinstance(value, str):
+                value = signals.format_sequence(value)
+
+            name, channel = _register_name(address)
+            try:
+                value = operator.index(value)
+            except TypeError:
+                errors.append(f"{name} {channel}: {value!r} is not an integer")
+                return
+
+            if not signals.REGISTER_MAP.is_allowed(address, value):
+                errors.append(f"{name} {channel}: {value} is not allowed")
+                return
+
+            requests.append((stage, address, value))
+
+        for key, state in desired_state.items():
+            if key in _READ_ONLY_STATE:
+                continue
+
+            if key in ("active_sync", "camera_running", "camera"):
+                if self._camera is None:
+                    # state of a controller without camera, e.g. snapshot
+                    if state is not None and (
+                            not isinstance(state, int) or state
+                    ):
+                        errors.append(f"{key}: the camera is not used")
+                elif key == "active_sync":
+                    add(
+                        _PARAMETER_STAGE,
+                        self._sync_mode.address,
+                        TriggerSyncMode.ACTIVE if state
+                        else TriggerSyncMode.PASSIVE
+                    )
+                elif key == "camera_running":
+                    add(
+                        _START_STAGE if state else _STOP_STAGE,
+                        signals.ADDR_START_TRIGGER,
+                        int(bool(state))
+                    )
+                else:
+                    parameters = self._camera.get_signals()
+                    if state is None or isinstance(state, (str, bytes)):
+                        errors.append(f"camera: {state!r} is not a state")
+                        continue
+                    if not isinstance(state, Mapping):
+                        try:
+                            state = dict(zip(parameters, state))
+                        except TypeError:
+                            errors.append(f"camera: {state!r} is not a state")
+                            continue
+                    for parameter, value in state.items():
+                        if parameter in parameters:
+                            add(
+                                _PARAMETER_STAGE,
+                                parameters[parameter].address,
+                                value
+                            )
+                        else:
+                            errors.append(
+                                f"camera: unknown parameter {parameter!r}"
+                            )
+
+            elif key == "lasers":
+                for channel, laser in _per_channel(state):
+                    if not 0 <= channel < self.get_number_lasers():
+                        errors.append(f"laser {channel} is not available")
+                        continue
+
+                    if not isinstance(laser, Mapping):
+                        laser = dict(
+                            zip(("mode", "duration", "sequence"), laser)
+                        )
+                    for parameter, value in laser.items():
+                        if parameter == "mode":
+                            add(
+                                _STOP_STAGE if value in (
+                                    0, LaserTriggerMode.MODE_OFF
+                                ) else _START_STAGE,
+                                signals.REGISTER_MAP["mode"].address + channel,
+                                value
+                            )
+                        elif parameter in ("duration", "sequence"):
+                            add(
+                                _PARAMETER_STAGE,
+                                signals.REGISTER_MAP[parameter].address +
+                                channel,
+                                value
+                            )
+                        else:
+                            errors.append(
+                                f"laser {channel}: unknown parameter "
+                                f"{parameter!r}"
+                            )
+
+            elif key in ("ttls", "servos", "pwms"):
+                outputs = getattr(self, "_" + key)
+                for channel, value in _per_channel(state):
+                    if 0 <= channel < len(outputs):
+                        add(_PARAMETER_STAGE, outputs[channel].address, value)
+                    else:
+                        errors.append(f"{key[:-1]} {channel} is not available")
+
+            else:
+                errors.append(f"unknown item {key!r}")
+
+        if errors:
+            raise ValueError("Invalid state: " + "; ".join(errors))
+
+        return requests
+
+    def register_preset(self, name, state):
+        """ Validate and compile a configuration to be activated later.
+
+        The state is in the format of apply, and is written as a whole upon
+        activation, in the same order. Registering a preset under an existing
+        name replaces it.
+
+        :param name: name of the preset.
+        :param state: BoardSnapshot or dictionary (see apply).
+        :return: Preset.
+        """
+        requests = sorted(
+            self._compile_state(state), key=operator.itemgetter(0)
+        )
+        pairs = tuple((address, value) for _, address, value in requests)
+        frame = b"".join(
+            regint.format_write_request(address, value)
+            for address, value in pairs
+        )
+        preset = Preset(
+            name=name,
+            pairs=pairs,
+            frame=frame,
+            digest=hashlib.sha256(frame).hexdigest(),
+        )
+        self._presets[name] = preset
+        return preset
+
+    def get_preset(self, name):
+        """ Return a registered preset.
+
+        :param name: name of the preset.
+        :return: Preset, or None if there is no such preset.
+        """
+        return self._presets.get(name)
+
+    def remove_preset(self, name):
+        """ Remove a registered preset.
+
+        :param name: name of the preset.
+        :return:
         """
-        if self._id == signals.ID_AU:
-            return "Au"
+        self._presets.pop(name, None)
+
+    def activate(self, name, force=False):
+        """ Write a registered preset in a single transmission.
 
-        if self._id == signals.ID_AUP:
-            return "Au+"
+        Nothing is sent if the last preset activated has the same content,
+        unless force is True. Note that changes made with other methods since
+        the last activation are not taken into account: use force=True after
+        modifying the signals otherwise.
 
-        if self._id == signals.ID_CU:
-            return "Cu"
+        :param name: name of the preset.
+        :param force: True to send the preset even if it is already active.
+        :return: True if the preset is active, False if it could not be sent
+            (e.g. the device is not connected).
+        """
+        preset = self._presets[name]
+        if not force and preset.digest == self._active_preset:
+            return True
+
+        sent = self._serial.write_compiled(preset.frame, preset.pairs)
+        self._active_preset = preset.digest if sent else None
+        return sent
 
-        if self._id == signals.ID_MOJO:
-            return "Mojo"
+    def get_id(self):
+        """ Return human-readable id.
 
-        return "Unknown"
+        :return: FPGA id.
+        """
+        return signals.get_board_name(self._id)
@@ -0,0 +1,210 @@
+""" Software emulator of a MicroFPGA board.
+
+The emulator answers the register interface protocol with the register map
+defined in signals (REGISTER_MAP), or any other RegisterMap. It reports the
+configuration version and the ID of the chosen board (Au, Au+, Cu or Mojo),
+ignores writes to read-only registers and produces synthetic analog input
+values.
+
+It can be reached in-process through a loopback transport:
+
+    emulator = Emulator("Au")
+    mufpga = MicroFPGA(n_laser=4, transport=emulator.open_transport())
+
+or, on Linux, through a pseudo-terminal, to which unmodified code can connect
+as if it were a serial port:
+
+    with Emulator("Au").serve_pty() as server:
+        mufpga = MicroFPGA(n_laser=4, transport=server.port)
+
+The latter is also available from the command line:
+
+    python -m microfpga.emulator --board Au
+"""
+import argparse
+import math
+import os
+import select
+import threading
+import time
+from microfpga import signals
+from microfpga.transport import LoopbackTransport, RegisterFile
+
+# pylint: disable=too-many-instance-attributes
+
+_BOARD_IDS = {
+    "Au": signals.ID_AU,
+    "Au+": signals.ID_AUP,
+    "Cu": signals.ID_CU,
+    "Mojo": signals.ID_MOJO,
+}
+
+
+def sine_analog(channel, timestamp):
+    """ Default synthetic analog signal: a 1 Hz sine wave spanning the whole
+    range, with a phase shift between channels.
+
+    :param channel: analog channel.
+    :param timestamp: time (s).
+    :return: analog value in [0, MAX_AI].
+    """
+    phase = 2 * math.pi * (timestamp + channel / signals.NUM_AI)
+    return int(round(signals.MAX_AI * (1 + math.sin(phase)) / 2))
+
+
+class Emulator(RegisterFile):
+    """ Emulated MicroFPGA board.
+
+    Args:
+        board (str or int): board name ("Au", "Au+", "Cu" or "Mojo") or ID.
+        version (int): configuration version reported by the board.
+        analog: function of (channel, time in s) returning the analog input
+            values, by default sine_analog. Boards without analog inputs (Cu)
+            always return 0.
+        register_map (RegisterMap): register layout of the emulated
+            configuration, with "version", "id" and "analog" blocks.
+    """
+    def __init__(
+            self,
+            board="Au",
+            version=signals.CURR_VER,
+            analog=None,
+            register_map=signals.REGISTER_MAP,
+    ):
+        RegisterFile.__init__(self)
+
+        self.board_id = _BOARD_IDS.get(board, board)
+        self.version = version
+        self.analog = sine_analog if analog is None else analog
+
+        self._writable = register_map.get_writable_addresses()
+        self._version_address = register_map["version"].address
+        self._id_address = register_map["id"].address
+        self._analog_block = register_map["analog"]
+        self._has_analog = self.board_id in signals.get_analog_ids()
+        self._start_time = time.monotonic()
+
+        self.registers.update({address: 0 for address in self._writable})
+        self.n_reads = 0
+        self.n_writes = 0
+
+    def write_register(self, address, value):
+        self.n_writes += 1
+        if address in self._writable:
+            self.registers[address] = value
+
+    def read_register(self, address):
+        self.n_reads += 1
+
+        if address == self._version_address:
+            return self.version
+
+        if address == self._id_address:
+            return self.board_id
+
+        channel = address - self._analog_block.address
+        if 0 <= channel < self._analog_block.count:
+            if not self._has_analog:
+                return 0
+            return self.analog(channel, time.monotonic() - self._start_time)
+
+        return self.registers.get(address, 0)
+
+    def open_transport(self):
+        """ Return an in-process transport to the emulator.
+
+        :return: loopback transport.
+        """
+        return LoopbackTransport(self)
+
+    def serve_pty(self):
+        """ Serve the emulator on a pseudo-terminal (Linux only).
+
+        :return: running PtyServer, whose port attribute is the path of the
+            pseudo-terminal to connect to.
+        """
+        return PtyServer(self)
+
+
+class PtyServer:
+    """ Serve a peer answering the register interface protocol on a
+    pseudo-terminal (Linux only).
+
+    The requests written to the pseudo-terminal are processed by the peer in
+    a background thread, and its answers written back.
+
+    Args:
+        peer: object processing the requests with a process(data) method
+            returning the answers (e.g. an Emulator).
+    """
+    def __init__(self, peer):
+        # tty is not available on Windows
+        # pylint: disable=import-outside-toplevel
+        import tty
+
+        self.peer = peer
+
+        self._master, self._slave = os.openpty()
+        tty.setraw(self._slave)
+        self.port = os.ttyname(self._slave)
+
+        self._running = True
+        self._thread = threading.Thread(
+            target=self._serve, name="microfpga-emulator", daemon=True
+        )
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _serve(self):
+        while self._running:
+            ready, _, _ = select.select([self._master], [], [], 0.1)
+            if not ready:
+                continue
+
+            try:
+                data = os.read(self._master, 4096)
+            except OSError:
+                break
+
+            answers = self.peer.process(data)
+            if answers:
+                os.write(self._master, answers)
+
+    def close(self):
+        """ Stop serving and close the pseudo-terminal.
+
+        :return:
+        """
+        if self._running:
+            self._running = False
+            self._thread.join()
+            os.close(self._slave)
+            os.close(self._master)
+
+
+def main():
+    """ Serve an emulated board on a pseudo-terminal until interrupted.
+
+    :return:
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("--board", default="Au", choices=list(_BOARD_IDS))
+    parser.add_argument("--version", type=int, default=signals.CURR_VER)
+    args = parser.parse_args()
+
+    with Emulator(args.board, args.version).serve_pty() as server:
+        print(f"Emulated {args.board} board listening on {server.port}")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+""" Timing model of the serial link, for offline capacity planning.
+
+The FPGA is reached through a USB-serial bridge running at 57600 baud. Each
+byte takes 10 bits on the wire (start, 8 data and stop bits), so that a write
+request (9 bytes) takes about 1.6 ms, a read request and its answer (5 + 4
+bytes) as long. On top of this, each USB transfer suffers from a latency
+(e.g. the latency timer of the FTDI bridge, 16 ms by default and commonly
+lowered to 1 ms), with some jitter.
+
+TimedTransport wraps any transport and delays each transfer accordingly,
+either in real time or on a VirtualClock, in which case nothing actually
+waits. plan_frames uses the latter to run a planned sequence of MicroFPGA
+calls against the emulator and report whether they fit within the camera
+frame period:
+
+    report = plan_frames(
+        [("set_laser_state", 0, 1, 2000, 65535), ("get_analog_state", 0)],
+        frame_period(mufpga.get_camera_state()),
+    )
+    print(report.fits, report.worst_time)
+
+The model is conservative: requests and answers are counted as separate
+transfers, while the bridge is full-duplex. Host-side processing time is not
+taken into account.
+"""
+import random
+import threading
+import time
+from typing import NamedTuple, Tuple
+from microfpga import signals
+from microfpga.controller import MicroFPGA
+from microfpga.emulator import Emulator
+from microfpga.signals import ActiveParameters
+from microfpga.transport import BAUDRATE, TIMEOUT, Transport
+
+# pylint: disable=too-many-arguments
+# pylint: disable=too-many-instance-attributes
+# pylint: disable=too-many-locals
+
+# Bits on the wire per byte (start bit, 8 data bits, stop bit).
+BITS_PER_BYTE = 10
+
+# Default latency of a USB transfer (s).
+USB_LATENCY = 1e-3
+
+
+class VirtualClock:
+    """ Clock whose time only advances when sleeping, without waiting.
+
+    Args:
+        start (float): initial time (s).
+    """
+    def __init__(self, start=0.):
+        self._now = start
+        self._lock = threading.Lock()
+
+    def monotonic(self):
+        """ Return the current time.
+
+        :return: time (s).
+        """
+        return self._now
+
+    def sleep(self, seconds):
+        """ Advance the time.
+
+        :param seconds: duration (s).
+        :return:
+        """
+        with self._lock:
+            self._now += seconds
+
+
+def wire_time(n_bytes, baudrate=BAUDRATE):
+    """ Return the time needed to serialize bytes on the link.
+
+    :param n_bytes: number of bytes.
+    :param baudrate: baud rate.
+    :return: duration (s).
+    """
+    return n_bytes * BITS_PER_BYTE / baudrate
+
+
+class TimedTransport(Transport):
+    """ Transport adding the delays of a serial link to another transport.
+
+    Each write and read is a USB transfer, delayed by the latency, a random
+    jitter and the serialization time of its bytes. Reads returning fewer
+    bytes than requested are further delayed by the timeout, as a real read
+    would be.
+
+    Args:
+        transport (Transport): wrapped transport, e.g. to an Emulator.
+        baudrate (int): baud rate of the link.
+        latency (float): latency of each USB transfer (s).
+        jitter (float): maximum additional latency (s), drawn uniformly for
+            each transfer.
+        timeout (float): read timeout (s).
+        clock: clock providing monotonic() and sleep(seconds), by default
+            the time module. Use a VirtualClock to model the link without
+            waiting.
+        seed: seed of the jitter random generator.
+    """
+    def __init__(
+            self,
+            transport,
+            baudrate=BAUDRATE,
+            latency=USB_LATENCY,
+            jitter=0.,
+            timeout=TIMEOUT,
+            clock=None,
+            seed=None,
+    ):
+        self.name = transport.name
+        self.transport = transport
+        self.baudrate = baudrate
+        self.latency = latency
+        self.jitter = jitter
+        self.timeout = timeout
+        self.clock = time if clock is None else clock
+        self._random = random.Random(seed)
+
+    def _transfer(self, n_bytes):
+        delay = self.latency + wire_time(n_bytes, self.baudrate)
+        if self.jitter:
+            delay += self._random.uniform(0., self.jitter)
+        self.clock.sleep(delay)
+
+    def write(self, data):
+        n_bytes = self.transport.write(data)
+        self._transfer(len(data))
+        return n_bytes
+
+    def readinto(self, buffer):
+        n_bytes = self.transport.readinto(buffer)
+        self._transfer(n_bytes)
+        if n_bytes < len(buffer):
+            self.clock.sleep(self.timeout)
+        return n_bytes
+
+    def read(self, size):
+        buff = bytearray(size)
+        return bytes(buff[:self.readinto(buff)])
+
+    def reset_input_buffer(self):
+        self.transport.reset_input_buffer()
+
+    def close(self):
+        self.transport.close()
+
+
+def frame_period(camera_state):
+    """ Return the camera frame period from the camera trigger parameters.
+
+    A frame consists of the delay between the fire pulse and the exposure,
+    the exposure and the read-out, after which the next fire pulse starts.
+
+    :param camera_state: camera state as returned by
+        MicroFPGA.get_camera_state (us).
+    :return: frame period (s).
+    """
+    return (
+        camera_state[ActiveParameters.DELAY.value] +
+        camera_state[ActiveParameters.EXPOSURE.value] +
+        camera_state[ActiveParameters.READOUT.value]
+    ) / 1e6
+
+
+class FramePlan(NamedTuple):
+    """ Timing of a planned sequence of calls repeated each frame.
+
+    Attributes:
+        frame_period: frame period (s).
+        call_times: duration (s) of each call during the slowest frame.
+        frame_times: duration (s) of the calls in each frame.
+        worst_time: duration (s) of the slowest frame.
+        margin: frame period minus the worst time (s), negative if the calls
+            do not fit.
+        fits: True if the calls fit within each frame.
+    """
+    frame_period: float
+    call_times: Tuple[float, ...]
+    frame_times: Tuple[float, ...]
+    worst_time: float
+    margin: float
+    fits: bool
+
+
+def plan_frames(
+        calls,
+        period,
+        n_frames=10,
+        board="Au",
+        baudrate=BAUDRATE,
+        latency=USB_LATENCY,
+        jitter=0.,
+        seed=None,
+        **kwargs,
+):
+    """ Model the time needed to issue a sequence of MicroFPGA calls in each
+    camera frame.
+
+    The calls are run n_frames times on a MicroFPGA connected to an emulated
+    board through a TimedTransport on a VirtualClock. The controller has all
+    the signals of the board available.
+
+    :param calls: sequence of (method name, *arguments) tuples, e.g.
+        ("set_ttl_state", 0, 1).
+    :param period: frame period (s), see frame_period.
+    :param n_frames: number of frames to model.
+    :param board: emulated board.
+    :param baudrate: baud rate of the link.
+    :param latency: latency of each USB transfer (s).
+    :param jitter: maximum additional latency of each transfer (s).
+    :param seed: seed of the jitter random generator.
+    :param kwargs: additional MicroFPGA arguments (e.g. use_shadow).
+    :return: FramePlan.
+    """
+    clock = VirtualClock()
+    transport = TimedTransport(
+        Emulator(board).open_transport(),
+        baudrate=baudrate,
+        latency=latency,
+        jitter=jitter,
+        clock=clock,
+        seed=seed,
+    )
+
+    worst_calls = ()
+    frame_times = []
+    with MicroFPGA(
+            n_laser=signals.NUM_LASERS,
+            n_ttl=signals.NUM_TTL,
+            n_servo=signals.NUM_SERVOS,
+            n_pwm=signals.NUM_PWM,
+            n_ai=signals.NUM_AI,
+            transport=transport,
+            **kwargs
+    ) as mufpga:
+        if not mufpga.is_connected():
+            raise ValueError(f"Board {board} cannot be emulated.")
+
+        for _ in range(n_frames):
+            call_times = []
+            for name, *args in calls:
+                start = clock.monotonic()
+                getattr(mufpga, name)(*args)
+                call_times.append(clock.monotonic() - start)
+
+            frame_times.append(sum(call_times))
+            if frame_times[-1] >= max(frame_times):
+                worst_calls = tuple(call_times)
+
+    worst_time = max(frame_times, default=0.)
+    return FramePlan(
+        frame_period=period,
+        call_times=worst_calls,
+        frame_times=tuple(frame_times),
+        worst_time=worst_time,
+        margin=period - worst_time,
+        fits=worst_time <= period,
+    )
@@ -0,0 +1,397 @@
+""" Recording and replay of the register interface traffic.
+
+A Recorder appends every request sent and every answer received by a
+RegisterInterface to a compact binary log. Each record holds a monotonic
+timestamp (ns), the direction of the frame (write request, read request or
+answer), the address and the value:
+
+    with Recorder("session.log") as recorder:
+        mufpga = MicroFPGA(n_laser=4, recorder=recorder)
+        ...
+
+A Replayer sends the recorded requests again through any transport, either
+at full speed or with the original timing, for instance to an Emulator as a
+load test:
+
+    report = Replayer("session.log").replay(Emulator().open_transport())
+
+The command streams of two logs can be compared with diff_logs, e.g. to
+check that two software versions send the same requests.
+"""
+import argparse
+import difflib
+import struct
+import threading
+import time
+from enum import IntEnum
+from typing import NamedTuple, Tuple
+from microfpga.regint import (
+    READ_ANSWER_SIZE,
+    READ_REQUEST_SIZE,
+    WRITE_FLAG,
+    WRITE_REQUEST_SIZE,
+    format_read_request,
+    format_write_request
+)
+from microfpga.transport import open_transport
+
+# pylint: disable=too-many-locals
+
+# First bytes of a log file, followed by the records.
+MAGIC = b"MFPGLOG1"
+
+# Record: timestamp (ns), direction, address and value.
+_RECORD = struct.Struct("<QBII")
+RECORD_SIZE = struct.calcsize(_RECORD.format)
+
+_WRITE_REQUEST = struct.Struct("<xII")
+_READ_REQUEST = struct.Struct("<xI")
+_ANSWER = struct.Struct("<I")
+
+
+class Direction(IntEnum):
+    """ Direction of a recorded frame.
+
+    WRITE: write request sent to the FPGA.
+    READ: read request sent to the FPGA (value 0).
+    ANSWER: answer received from the FPGA, with the address of its request.
+    """
+    WRITE = 0
+    READ = 1
+    ANSWER = 2
+
+
+class Record(NamedTuple):
+    """ Recorded frame. """
+    timestamp: int
+    direction: Direction
+    address: int
+    value: int
+
+
+def iter_requests(data):
+    """ Iterate over the requests of a formatted buffer.
+
+    :param data: formatted requests.
+    :return: iterator of (direction, address, value), value being 0 for read
+        requests.
+    """
+    view = memoryview(data).cast("B")
+    offset = 0
+    while offset < len(view):
+        if view[offset] & WRITE_FLAG:
+            if len(view) - offset < WRITE_REQUEST_SIZE:
+                break
+            address, value = _WRITE_REQUEST.unpack_from(view, offset)
+            yield Direction.WRITE, address, value
+            offset += WRITE_REQUEST_SIZE
+        else:
+            if len(view) - offset < READ_REQUEST_SIZE:
+                break
+            yield Direction.READ, _READ_REQUEST.unpack_from(view, offset)[0], 0
+            offset += READ_REQUEST_SIZE
+
+
+class Recorder:
+    """ Append-only binary log of the register interface traffic.
+
+    Records are buffered by the file and written upon flush or close. A
+    recorder can be shared by several interfaces and threads.
+
+    Args:
+        file: path of the log, or binary file object opened for writing.
+            New records are appended to existing logs.
+    """
+    def __init__(self, file):
+        if isinstance(file, (str, bytes)) or hasattr(file, "__fspath__"):
+            # pylint: disable=consider-using-with
+            self._file = open(file, "ab")
+            self._owned = True
+        else:
+            self._file = file
+            self._owned = False
+
+        self._lock = threading.Lock()
+        self.n_records = 0
+        if self._file.tell() == 0:
+            self._file.write(MAGIC)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def record(self, direction, address, value, timestamp=None):
+        """ Append a record.
+
+        :param direction: Direction of the frame.
+        :param address: register address.
+        :param value: value written or received, 0 for read requests.
+        :param timestamp: time.monotonic_ns() timestamp, by default now.
+        :return:
+        """
+        if timestamp is None:
+            timestamp = time.monotonic_ns()
+
+        with self._lock:
+            self._file.write(
+                _RECORD.pack(timestamp, direction, address, value)
+            )
+            self.n_records += 1
+
+    def record_exchange(self, request, answers, sent, received):
+        """ Append the records of an exchange of requests and answers.
+
+        :param request: formatted requests sent.
+        :param answers: answers received, in the order of the read requests.
+        :param sent: time.monotonic_ns() timestamp of the requests.
+        :param received: time.monotonic_ns() timestamp of the answers.
+        :return:
+        """
+        records = bytearray()
+        reads = []
+        for direction, address, value in iter_requests(request):
+            records += _RECORD.pack(sent, direction, address, value)
+            if direction is Direction.READ:
+                reads.append(address)
+
+        n_answers = len(answers) // READ_ANSWER_SIZE
+        for address, (value,) in zip(
+            reads,
+            _ANSWER.iter_unpack(
+                memoryview(answers)[:READ_ANSWER_SIZE * n_answers]
+            )
+        ):
+            records += _RECORD.pack(received, Direction.ANSWER, address, value)
+
+        with self._lock:
+            self._file.write(records)
+            self.n_records += len(records) // RECORD_SIZE
+
+    def flush(self):
+        """ Write the buffered records to the file.
+
+        :return:
+        """
+        with self._lock:
+            self._file.flush()
+
+    def close(self):
+        """ Flush the records, and close the file if opened by the recorder.
+
+        :return:
+        """
+        with self._lock:
+            self._file.flush()
+            if self._owned:
+                self._file.close()
+
+
+def read_log(file):
+    """ Iterate over the records of a log.
+
+    :param file: path of the log, or binary file object.
+    :return: iterator of Record.
+    """
+    if isinstance(file, (str, bytes)) or hasattr(file, "__fspath__"):
+        with open(file, "rb") as log:
+            yield from read_log(log)
+        return
+
+    if file.read(len(MAGIC)) != MAGIC:
+        raise ValueError("Not a MicroFPGA transaction log.")
+
+    while True:
+        data = file.read(RECORD_SIZE * 4096)
+        n_records = len(data) // RECORD_SIZE
+        for timestamp, direction, address, value in _RECORD.iter_unpack(
+            memoryview(data)[:RECORD_SIZE * n_records]
+        ):
+            yield Record(timestamp, Direction(direction), address, value)
+
+        if len(data) < RECORD_SIZE * 4096:
+            break
+
+
+def command_stream(file, answers=False):
+    """ Iterate over the commands of a log, without their timing.
+
+    :param file: path of the log, or binary file object.
+    :param answers: True to include the answers.
+    :return: iterator of (direction, address, value).
+    """
+    for record in read_log(file):
+        if answers or record.direction is not Direction.ANSWER:
+            yield record.direction, record.address, record.value
+
+
+def format_command(command):
+    """ Format a command as a line of text.
+
+    :param command: (direction, address, value).
+    :return: text, e.g. "WRITE 12 4000".
+    """
+    direction, address, value = command
+    if direction is Direction.READ:
+        return f"{direction.name} {address}"
+    return f"{direction.name} {address} {value}"
+
+
+def diff_logs(file_a, file_b, answers=False):
+    """ Compare the command streams of two logs.
+
+    :param file_a: path of the first log.
+    :param file_b: path of the second log.
+    :param answers: True to include the answers.
+    :return: iterator of the lines of a unified diff, empty if the command
+        streams are identical.
+    """
+    return difflib.unified_diff(
+        [format_command(cmd) for cmd in command_stream(file_a, answers)],
+        [format_command(cmd) for cmd in command_stream(file_b, answers)],
+        fromfile=str(file_a),
+        tofile=str(file_b),
+        lineterm="",
+    )
+
+
+class ReplayReport(NamedTuple):
+    """ Result of a replay.
+
+    Attributes:
+        n_writes: number of write requests sent.
+        n_reads: number of read requests sent.
+        mismatches: (address, recorded value, replayed value) of the answers
+            that differ from the log, the replayed value being -1 if missing.
+        duration: duration of the replay (s).
+    """
+    n_writes: int
+    n_reads: int
+    mismatches: Tuple[Tuple[int, int, int], ...]
+    duration: float
+
+
+class Replayer:
+    """ Replay of a transaction log through a transport.
+
+    Requests recorded with the same timestamp (i.e. sent in a single
+    transmission) are sent together, followed by the reading of their
+    answers.
+
+    Args:
+        file: path of the log, or binary file object.
+    """
+    def __init__(self, file):
+        self.records = list(read_log(file))
+
+    def exchanges(self):
+        """ Iterate over the recorded exchanges.
+
+        :return: iterator of (timestamp, requests, answers), requests being a
+            list of (direction, address, value) and answers the list of the
+            recorded answer values.
+        """
+        timestamp = None
+        requests = []
+        answers = []
+        for record in self.records:
+            if record.direction is Direction.ANSWER:
+                answers.append(record.value)
+                continue
+
+            if requests and (answers or record.timestamp != timestamp):
+                yield timestamp, requests, answers
+                requests = []
+                answers = []
+
+            timestamp = record.timestamp
+            requests.append(record[1:])
+
+        if requests:
+            yield timestamp, requests, answers
+
+    def replay(self, transport, timed=False, speed=1.):
+        """ Send the recorded requests through a transport.
+
+        :param transport: Transport, or URL of the transport.
+        :param timed: True to reproduce the original timing, False to send
+            the requests at full speed.
+        :param speed: speed-up of the timed replay.
+        :return: ReplayReport.
+        """
+        transport = open_transport(transport)
+
+        n_writes = 0
+        n_reads = 0
+        mismatches = []
+        start = time.monotonic_ns()
+        origin = None
+        for timestamp, requests, recorded in self.exchanges():
+            if timed:
+                if origin is None:
+                    origin = timestamp
+                delay = (timestamp - origin) / speed - (
+                    time.monotonic_ns() - start
+                )
+                if delay > 0:
+                    time.sleep(delay / 1e9)
+
+            buff = bytearray()
+            addresses = []
+            for direction, address, value in requests:
+                if direction is Direction.WRITE:
+                    buff += format_write_request(address, value)
+                    n_writes += 1
+                else:
+                    buff += format_read_request(address)
+                    addresses.append(address)
+            n_reads += len(addresses)
+
+            transport.write(buff)
+            if addresses:
+                answers = transport.read(READ_ANSWER_SIZE * len(addresses))
+                values = [value for (value,) in _ANSWER.iter_unpack(
+                    answers[:len(answers) - len(answers) % READ_ANSWER_SIZE]
+                )]
+                values += [-1] * (len(addresses) - len(values))
+
+                # answers missing from the log are not compared
+                for address, expected, value in zip(
+                    addresses, recorded, values
+                ):
+                    if expected != value:
+                        mismatches.append((address, expected, value))
+
+        return ReplayReport(
+            n_writes=n_writes,
+            n_reads=n_reads,
+            mismatches=tuple(mismatches),
+            duration=(time.monotonic_ns() - start) / 1e9,
+        )
+
+
+def main():
+    """ Print a transaction log, or the diff of two logs.
+
+    :return:
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("log")
+    parser.add_argument("other", nargs="?", help="log to compare to")
+    parser.add_argument(
+        "--answers", action="store_true", help="include the answers"
+    )
+    args = parser.parse_args()
+
+    if args.other:
+        for line in diff_logs(args.log, args.other, args.answers):
+            print(line)
+    else:
+        for record in read_log(args.log):
+            if args.answers or record.direction is not Direction.ANSWER:
+                print(record.timestamp, format_command(record[1:]))
+
+
+if __name__ == "__main__":
+    main()
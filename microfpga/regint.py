@@ -3,38 +3,129 @@ reading data from the FPGA.
 
 It is based on the original register interface from Alchitry.
 """
+import contextlib
+import queue
+import struct
+import threading
+import time
 import warnings
+from concurrent.futures import Future
+from enum import Enum
 import serial.tools.list_ports
+from microfpga.transport import (
+    BAUDRATE,
+    TIMEOUT,
+    SerialTransport,
+    open_transport
+)
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# pylint: disable=too-many-instance-attributes
+# pylint: disable=too-many-public-methods
+# pylint: disable=too-many-arguments
+# pylint: disable=too-many-lines
 
 # Vendor and hardware ID, used to detect the FPGAs.
 AU_CU_VID = "0403:6010"
 VID_PID = "VID:PID"[::-1]
 SER = " SER"
 
+# Size in bytes of the requests and answers of the register interface.
+WRITE_REQUEST_SIZE = 9
+READ_REQUEST_SIZE = 5
+READ_ANSWER_SIZE = 4
 
-def format_write_request(address, value):
-    """ Format a write request based on an address and the value to write to
-    the FPGA.
+# First byte of the requests, the MSB flags a write request.
+WRITE_FLAG = 1 << 7
+READ_FLAG = 0
 
-    :param address: address at which to write date.
-    :param value: data to write to the address.
-    :return: formatted request.
-    """
-    if address >= 2**(4 * 8):
+# Largest address or value (4 bytes).
+MAX_INT = 2**(4 * 8) - 1
+
+# Number of log2 buckets of the latency histograms (see get_stats).
+N_LATENCY_BUCKETS = 32
+
+# Precompiled (little endian) formats of the requests and answers.
+_WRITE_REQUEST = struct.Struct("<BII")
+_READ_REQUEST = struct.Struct("<BI")
+_READ_ANSWER = struct.Struct("<I")
+
+# Equivalent numpy (packed) types, used for bulk formatting.
+if np is not None:
+    _WRITE_DTYPE = np.dtype(
+        [("flag", "u1"), ("address", "<u4"), ("value", "<u4")]
+    )
+    _READ_DTYPE = np.dtype([("flag", "u1"), ("address", "<u4")])
+    _ANSWER_DTYPE = np.dtype("<u4")
+
+
+def _check_address(address):
+    if address > MAX_INT:
         raise ValueError(f'Address {address} is too large (max 4 bytes).')
     if address < 0:
         raise ValueError(f'Address {address} cannot be negative.')
 
-    if value >= 2**(4 * 8):
+
+def _check_value(value):
+    if value > MAX_INT:
         raise ValueError(f'Value {value} is too large (max 4 bytes).')
     if value < 0:
-        raise ValueError(f'Address {address} cannot be negative.')
+        raise ValueError(f'Value {value} cannot be negative.')
+
+
+def pack_write_request_into(buffer, offset, address, value):
+    """ Format a write request directly into a buffer.
+
+    This avoids allocating a new request, the buffer can be reused between
+    calls or hold several consecutive requests.
+
+    :param buffer: writable buffer (e.g. bytearray) of sufficient length.
+    :param offset: position in the buffer at which to write the request.
+    :param address: address at which to write data.
+    :param value: data to write to the address.
+    :return: offset following the request in the buffer.
+    """
+    try:
+        _WRITE_REQUEST.pack_into(buffer, offset, WRITE_FLAG, address, value)
+    except struct.error as error:
+        _check_address(address)
+        _check_value(value)
+        raise ValueError(str(error)) from error
+
+    return offset + WRITE_REQUEST_SIZE
 
-    buff = bytearray(9)
 
-    buff[0] = 1 << 7
-    buff[1:] = int.to_bytes(address, length=4, byteorder="little")
-    buff[5:] = int.to_bytes(value, length=4, byteorder="little")
+def pack_read_request_into(buffer, offset, address):
+    """ Format a read request directly into a buffer.
+
+    :param buffer: writable buffer (e.g. bytearray) of sufficient length.
+    :param offset: position in the buffer at which to write the request.
+    :param address: address at which to read data.
+    :return: offset following the request in the buffer.
+    """
+    try:
+        _READ_REQUEST.pack_into(buffer, offset, READ_FLAG, address)
+    except struct.error as error:
+        _check_address(address)
+        raise ValueError(str(error)) from error
+
+    return offset + READ_REQUEST_SIZE
+
+
+def format_write_request(address, value):
+    """ Format a write request based on an address and the value to write to
+    the FPGA.
+
+    :param address: address at which to write date.
+    :param value: data to write to the address.
+    :return: formatted request.
+    """
+    buff = bytearray(WRITE_REQUEST_SIZE)
+    pack_write_request_into(buff, 0, address, value)
 
     return buff
 
@@ -45,15 +136,8 @@ def format_read_request(address):
     :param address: address at which to read date from the FPGA.
     :return: formatted request.
     """
-    if address >= 2**(4 * 8):
-        raise ValueError(f'Address {address} is too large (max 4 bytes).')
-    if address < 0:
-        raise ValueError(f'Address {address} cannot be negative.')
-
-    buff = bytearray(5)
-
-    buff[0] = 0
-    buff[1:] = int.to_bytes(address, length=4, byteorder="little")
+    buff = bytearray(READ_REQUEST_SIZE)
+    pack_read_request_into(buff, 0, address)
 
     return buff
 
@@ -67,18 +151,130 @@ def format_to_int(data):
     :return: int value corresponding to the data (little endian).
     """
     assert (
-        len(data) == 4
+        len(data) == READ_ANSWER_SIZE
     ), f"Data has the wrong number of bytes (got {len(data)}, expected 4)"
 
     # regint returns a byte array with little endian encoding
-    val = (
-        (data[0] & 0xFF) |
-        (data[1] & 0xFF) << 8 |
-        (data[2] & 0xFF) << 16 |
-        (data[3] & 0xFF) << 24
+    return _READ_ANSWER.unpack(data)[0]
+
+
+def _is_integer_array(array):
+    return array.dtype.kind in "iu"
+
+
+def _check_array(array, name):
+    if array.size > 0:
+        if array.max() > MAX_INT:
+            raise ValueError(
+                f'{name} cannot exceed 4 bytes (max {array.max()}).'
+            )
+        if array.min() < 0:
+            raise ValueError(
+                f'{name} cannot be negative (min {array.min()}).'
+            )
+
+
+def format_write_requests(addresses, values):
+    """ Format a series of write requests into one contiguous buffer.
+
+    If numpy is available, the requests are validated and formatted in bulk,
+    otherwise each request is formatted in turn.
+
+    :param addresses: sequence or array of addresses at which to write data.
+    :param values: sequence or array of data to write, one per address.
+    :return: formatted requests, concatenated in a single bytes object.
+    """
+    if np is not None:
+        addresses = np.asarray(addresses)
+        values = np.asarray(values)
+
+        if addresses.ndim != 1 or addresses.shape != values.shape:
+            raise ValueError(
+                f"Addresses and values must be 1D with the same length (got "
+                f"shapes {addresses.shape} and {values.shape})."
+            )
+
+        if _is_integer_array(addresses) and _is_integer_array(values):
+            _check_array(addresses, 'Addresses')
+            _check_array(values, 'Values')
+
+            frames = np.empty(len(addresses), dtype=_WRITE_DTYPE)
+            frames["flag"] = WRITE_FLAG
+            frames["address"] = addresses
+            frames["value"] = values
+
+            return frames.tobytes()
+
+        # e.g. python ints too large for numpy, validated one by one
+        addresses = addresses.tolist()
+        values = values.tolist()
+    elif len(addresses) != len(values):
+        raise ValueError(
+            f"Addresses and values must have the same length (got "
+            f"{len(addresses)} and {len(values)})."
+        )
+
+    buff = bytearray(WRITE_REQUEST_SIZE * len(addresses))
+    offset = 0
+    for address, value in zip(addresses, values):
+        offset = pack_write_request_into(buff, offset, address, value)
+
+    return bytes(buff)
+
+
+def format_read_requests(addresses):
+    """ Format a series of read requests into one contiguous buffer.
+
+    If numpy is available, the requests are validated and formatted in bulk,
+    otherwise each request is formatted in turn.
+
+    :param addresses: sequence or array of addresses at which to read data.
+    :return: formatted requests, concatenated in a single bytes object.
+    """
+    if np is not None:
+        addresses = np.asarray(addresses)
+
+        if addresses.ndim != 1:
+            raise ValueError(
+                f"Addresses must be 1D (got shape {addresses.shape})."
+            )
+
+        if _is_integer_array(addresses):
+            _check_array(addresses, 'Addresses')
+
+            frames = np.empty(len(addresses), dtype=_READ_DTYPE)
+            frames["flag"] = READ_FLAG
+            frames["address"] = addresses
+
+            return frames.tobytes()
+
+        addresses = addresses.tolist()
+
+    buff = bytearray(READ_REQUEST_SIZE * len(addresses))
+    offset = 0
+    for address in addresses:
+        offset = pack_read_request_into(buff, offset, address)
+
+    return bytes(buff)
+
+
+def format_to_ints(data):
+    """ Format the concatenated answers to several read requests.
+
+    :param data: data read from the FPGA, whose length is a multiple of 4
+        bytes.
+    :return: uint32 numpy array of the values (little endian) if numpy is
+        available, list of int otherwise.
+    """
+    assert len(data) % READ_ANSWER_SIZE == 0, (
+        f"Data has the wrong number of bytes (got {len(data)}, expected a "
+        f"multiple of 4)"
     )
 
-    return val
+    if np is not None:
+        return np.frombuffer(data, dtype=_ANSWER_DTYPE)
+
+    return [value for value, in _READ_ANSWER.iter_unpack(data)]
 
 
 def _find_port():
@@ -105,47 +301,411 @@ def _find_port():
     return au_cu_list
 
 
+def select_device(known_device=None):
+    """ Select the USB port to connect to.
+
+    If a single compatible port is detected, it is selected. If several
+    compatible ports are detected, then known_device is selected if it is one
+    of them. Otherwise, a warning is emitted.
+
+    :param known_device: port to select if several ports are detected.
+    :return: selected port, or None if no port could be selected.
+    """
+    devices = _find_port()
+
+    if devices:
+        if len(devices) == 1:
+            return devices[0]
+
+        if known_device in devices:
+            return known_device
+
+        warnings.warn(
+            f"Cannot choose between detected devices {devices} "
+            f"(known_device={known_device}). Choose a device from"
+            f" the list and pass it as known_device parameter to "
+            f"the controller. If there is no detected device in "
+            f"the list, check the physical device connection."
+        )
+    else:
+        warnings.warn("No device found.")
+
+    return None
+
+
+class CachePolicy(Enum):
+    """ Caching policies of the register values.
+
+    LIVE: always read from the FPGA.
+    STATIC: read once from the FPGA, then served from the cache.
+    WRITE_THROUGH: served from the last value written (or read), the register
+        only changes when the host writes it.
+    """
+
+    LIVE = 0
+    STATIC = 1
+    WRITE_THROUGH = 2
+
+
+# Returned by Interceptor.on_write to drop a write request.
+SKIP = object()
+
+
+class Interceptor:
+    """ Base class of the interceptors of the register interface requests.
+
+    Interceptors see the requests before they are sent, in the order in which
+    they were added to the interface, and can modify, drop (on_write) or
+    answer them (on_read). The values read are then passed to on_answer in
+    reverse order. The batch hooks are called around write_many, read_many
+    and RegisterInterface.batch blocks.
+
+    All hooks do nothing by default.
+    """
+    # pylint: disable=unused-argument,no-self-use
+
+    def on_write(self, address, value):
+        """ Called before a write request.
+
+        :param address: address to write to.
+        :param value: value to write.
+        :return: value to write, or SKIP to drop the request (the write then
+            reports success).
+        """
+        return value
+
+    def on_read(self, address):
+        """ Called before a read request.
+
+        :param address: address to read from.
+        :return: None to read the address, or a value to return instead.
+        """
+
+    def on_answer(self, address, value):
+        """ Called with the value read from an address.
+
+        :param address: address read.
+        :param value: value read (-1 if missing).
+        :return: value to return.
+        """
+        return value
+
+    def batch_begin(self):
+        """ Called when a batch of requests begins.
+
+        :return:
+        """
+
+    def batch_end(self):
+        """ Called when a batch of requests ends.
+
+        :return:
+        """
+
+
+class _IOThread(threading.Thread):
+    """ Thread owning the serial port, processing queued requests.
+
+    Requests queued at the time the thread is ready are concatenated and
+    sent in a single write, then all their answers are read at once and
+    dispatched in FIFO order. After a short read, the input buffer is flushed
+    so that late answers are not dispatched to the next requests.
+    """
+    def __init__(self, port, max_batch=256):
+        threading.Thread.__init__(self, name="microfpga-io", daemon=True)
+        self._port = port
+        self._max_batch = max_batch
+        self._queue = queue.Queue()
+
+    def submit(self, request, n_answers):
+        """ Queue a request.
+
+        :param request: formatted request(s).
+        :param n_answers: number of 4-byte answers expected.
+        :return: future resolving to the number of bytes of the request that
+            were sent and the answers received.
+        """
+        future = Future()
+        self._queue.put((bytes(request), n_answers, future))
+        return future
+
+    def stop(self):
+        """ Process the queued requests, then stop the thread.
+
+        :return:
+        """
+        self._queue.put(None)
+        self.join()
+
+    def run(self):
+        running = True
+        while running:
+            batch = [self._queue.get()]
+            while len(batch) < self._max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            if None in batch:
+                running = False
+                batch = batch[:batch.index(None)]
+
+            self._process(
+                [
+                    item for item in batch
+                    if item[2].set_running_or_notify_cancel()
+                ]
+            )
+
+    def _process(self, batch):
+        if not batch:
+            return
+
+        n_answers = sum(item[1] for item in batch)
+        try:
+            n_sent = self._port.write(b"".join(item[0] for item in batch))
+            if n_sent is None:
+                n_sent = sum(len(item[0]) for item in batch)
+
+            answers = bytearray(READ_ANSWER_SIZE * n_answers)
+            if n_answers:
+                answers = answers[:self._port.readinto(answers)]
+                if len(answers) < READ_ANSWER_SIZE * n_answers:
+                    # late answers would shift those of the next requests
+                    self._port.reset_input_buffer()
+        except Exception as error:  # pylint: disable=broad-except
+            for item in batch:
+                item[2].set_exception(error)
+            return
+
+        for request, n_request_answers, future in batch:
+            size = READ_ANSWER_SIZE * n_request_answers
+            future.set_result(
+                (max(0, min(len(request), n_sent)), bytes(answers[:size]))
+            )
+            n_sent -= len(request)
+            del answers[:size]
+
+
+class _LinkStats:
+    """ Counters and latency histograms of the link.
+
+    Latencies are recorded in log2 buckets of microseconds: bucket 0 counts
+    round trips below 1 us, bucket i those in [2**(i-1), 2**i) us.
+    """
+    def __init__(self):
+        self.groups = {}
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """ Reset the counters and histograms.
+
+        :return:
+        """
+        with self._lock:
+            self.reads = 0
+            self.writes = 0
+            self.bytes_out = 0
+            self.bytes_in = 0
+            self.timeouts = 0
+            self.short_reads = 0
+            self.latency = {}
+
+    def get_group(self, addresses):
+        """ Return the group of the addresses, "mixed" if they belong to
+        different groups.
+
+        :param addresses: iterable of addresses.
+        :return: group name.
+        """
+        groups = {self.groups.get(address, "other") for address in addresses}
+        return groups.pop() if len(groups) == 1 else "mixed"
+
+    def record(self, group, start, n_out, n_answers, n_in):
+        """ Record an exchange.
+
+        :param group: register group of the exchange.
+        :param start: time.perf_counter_ns() before sending the requests.
+        :param n_out: number of bytes sent.
+        :param n_answers: number of answers expected.
+        :param n_in: number of bytes received.
+        :return:
+        """
+        elapsed_us = (time.perf_counter_ns() - start) // 1000
+        bucket = min(elapsed_us.bit_length(), N_LATENCY_BUCKETS - 1)
+
+        with self._lock:
+            self.reads += n_answers
+            self.writes += (
+                (n_out - READ_REQUEST_SIZE * n_answers) // WRITE_REQUEST_SIZE
+            )
+            self.bytes_out += n_out
+            self.bytes_in += n_in
+            if n_in < READ_ANSWER_SIZE * n_answers:
+                if n_in == 0:
+                    self.timeouts += 1
+                else:
+                    self.short_reads += 1
+
+            histogram = self.latency.get(group)
+            if histogram is None:
+                histogram = self.latency[group] = [0] * N_LATENCY_BUCKETS
+            histogram[bucket] += 1
+
+    def snapshot(self):
+        """ Return a copy of the counters and histograms.
+
+        :return: dictionary of the counters, with the histograms under
+            "latency" as group -> list of counts.
+        """
+        with self._lock:
+            return {
+                "reads": self.reads,
+                "writes": self.writes,
+                "bytes_out": self.bytes_out,
+                "bytes_in": self.bytes_in,
+                "timeouts": self.timeouts,
+                "short_reads": self.short_reads,
+                "latency": {
+                    group: list(histogram)
+                    for group, histogram in self.latency.items()
+                },
+            }
+
+
+def _completed(result):
+    future = Future()
+    future.set_result(result)
+    return future
+
+
+def _chain(future, function):
+    """ Return a future resolving to function(result of future). """
+    chained = Future()
+
+    def callback(done):
+        try:
+            chained.set_result(function(done.result()))
+        except Exception as error:  # pylint: disable=broad-except
+            chained.set_exception(error)
+
+    future.add_done_callback(callback)
+    return chained
+
+
 class RegisterInterface:
     """ Communication interface for the FPGA.
 
-    This class allows writing and reading data from the FPGA.
+    This class allows writing and reading data from the FPGA. Concurrent
+    calls from several threads are serialized, so that requests and answers
+    cannot interleave.
+
+    In threaded mode, a dedicated I/O thread owns the serial port. Requests
+    from all threads are queued, sent in large batched writes and their
+    answers dispatched in order. The submit_* methods return
+    concurrent.futures.Future objects instead of blocking (in non-threaded
+    mode, they run immediately and return completed futures).
+
+    Optionally, a shadow register file can record the last value written to
+    each address. Writes that would not change the value of a register are
+    then skipped, unless forced.
+
+    Reads can also be served from a cache, according to a per-address
+    caching policy (see CachePolicy and set_cache_policy). By default, all
+    addresses are read from the FPGA.
 
+    Optionally, the interface counts the requests, bytes, timeouts and short
+    reads, and records histograms of the round trip latencies per register
+    group (see set_stats_group and get_stats). The traffic can also be
+    recorded to a binary log (see set_recorder).
+
+    Finally, a chain of interceptors (see Interceptor and set_interceptors)
+    can observe, modify or answer the requests before they are sent, and
+    writes can be grouped into a single transmission with batch.
+
+    Args:
+        known_device (str): device to connect to if several compatible
+            devices are detected.
+        use_shadow (bool): True to skip redundant writes using a shadow
+            register file.
+        threaded (bool): True to run the communication in a dedicated I/O
+            thread.
+        transport (str or Transport): transport, or URL of the transport (see
+            transport.open_transport), to use instead of detecting the USB
+            port of the FPGA.
+        use_stats (bool): True to record link statistics.
     """
-    def __init__(self, known_device=None):
+    def __init__(
+            self,
+            known_device=None,
+            use_shadow=False,
+            threaded=False,
+            transport=None,
+            use_stats=False,
+    ):
         self._connected = False
-        devices = _find_port()
 
-        if devices:
-            if len(devices) == 1:
-                self._device = devices[0]
+        # cached addresses -> (policy, ttl), and address -> (value, expiry)
+        self._policies = {}
+        self._cache = {}
+
+        # shadow register file, address -> last value written
+        self._shadow = None
+        if use_shadow:
+            self._shadow = {}
+        self._sent_writes = 0
+        self._skipped_writes = 0
+
+        self._stats = _LinkStats() if use_stats else None
+        self._recorder = None
+        self._monitored = use_stats
+
+        # interceptor chain, and pending writes of the open batch of each
+        # thread
+        self._interceptors = ()
+        self._local = threading.local()
+        self._n_batches = 0
+        self._batch_lock = threading.Lock()
+        self._hooked = False
+
+        # reusable buffers, avoiding allocations on each request
+        self._write_buffer = bytearray(WRITE_REQUEST_SIZE)
+        self._read_buffer = bytearray(READ_REQUEST_SIZE)
+        self._answer = memoryview(bytearray(READ_ANSWER_SIZE))
+
+        self._lock = threading.Lock()
+        self._threaded = threaded
+        self._io_thread = None
+
+        if transport is not None:
+            self._serial = open_transport(transport)
+            self._device = self._serial.name
+            self.__connect()
+        else:
+            self._device = select_device(known_device)
+            if self._device is not None:
+                self._serial = SerialTransport(self._device, BAUDRATE, TIMEOUT)
                 self.__connect()
             else:
-                if known_device in devices:
-                    self._device = known_device
-                    self.__connect()
-                else:
-                    self.__not_connected()
-                    warnings.warn(
-                        f"Cannot choose between detected devices {devices} "
-                        f"(known_device={known_device}). Choose a device from"
-                        f" the list and pass it as known_device parameter to "
-                        f"the controller. If there is no detected device in "
-                        f"the list, check the physical device connection."
-                    )
-        else:
-            self.__not_connected()
-            warnings.warn("No device found.")
+                self.__not_connected()
 
     def __connect(self):
-        assert self._device is not None
-        self._serial = serial.Serial(self._device, 57600, timeout=1)
+        assert self._serial is not None
         self._connected = True
+        if self._threaded:
+            self._start_io_thread()
 
     def __not_connected(self):
         self._device = None
         self._serial = None
         self._connected = False
 
+    def _start_io_thread(self):
+        self._io_thread = _IOThread(self._serial)
+        self._io_thread.start()
+
     def is_connected(self):
         """ Check if it is connected to a USB port.
 
@@ -153,14 +713,33 @@ class RegisterInterface:
         """
         return self._connected
 
+    def is_threaded(self):
+        """ Check if the communication runs in a dedicated I/O thread.
+
+        :return: True if it does, False otherwise.
+        """
+        return self._io_thread is not None
+
     def disconnect(self):
         """ Disconnect from the USB port.
 
+        In threaded mode, the queued requests are processed before
+        disconnecting.
+
         :return:
         """
+        self._connected = False
+        if self._io_thread is not None:
+            self._io_thread.stop()
+            self._io_thread = None
+
         if self._serial:
             self._serial.close()
-        self._connected = False
+
+        # the device state is unknown upon the next connection
+        if self._shadow is not None:
+            self._shadow.clear()
+        self._cache.clear()
 
     def get_device(self):
         """ Return the device.
@@ -169,19 +748,507 @@ class RegisterInterface:
         """
         return self._device
 
-    def write(self, address, value):
+    def _exchange(self, request, n_answers, addresses=()):
+        """ Send requests and read their answers.
+
+        :param request: formatted request(s).
+        :param n_answers: number of 4-byte answers expected.
+        :param addresses: iterable of the addresses of the requests, only used
+            to record statistics.
+        :return: future resolving to the number of bytes sent and the answers
+            received (possibly incomplete).
+        """
+        stats = self._stats
+        recorder = self._recorder
+        start = 0 if stats is None else time.perf_counter_ns()
+        sent = 0 if recorder is None else time.monotonic_ns()
+
+        if self._io_thread is not None:
+            future = self._io_thread.submit(request, n_answers)
+            if stats is not None or recorder is not None:
+                group = None if stats is None else stats.get_group(addresses)
+
+                def on_done(done):
+                    if done.cancelled() or done.exception() is not None:
+                        return
+
+                    answers = done.result()[1]
+                    if stats is not None:
+                        stats.record(
+                            group, start, len(request), n_answers, len(answers)
+                        )
+                    if recorder is not None:
+                        recorder.record_exchange(
+                            request, answers, sent, time.monotonic_ns()
+                        )
+
+                future.add_done_callback(on_done)
+            return future
+
+        with self._lock:
+            n_sent = self._serial.write(request)
+            answers = bytearray(READ_ANSWER_SIZE * n_answers)
+            if n_answers:
+                answers = answers[:self._serial.readinto(answers)]
+                if len(answers) < READ_ANSWER_SIZE * n_answers:
+                    self._serial.reset_input_buffer()
+
+            if recorder is not None:
+                recorder.record_exchange(
+                    request, answers, sent, time.monotonic_ns()
+                )
+
+        if stats is not None:
+            stats.record(
+                stats.get_group(addresses), start, len(request), n_answers,
+                len(answers)
+            )
+
+        return _completed(
+            (len(request) if n_sent is None else n_sent, answers)
+        )
+
+    def set_recorder(self, recorder):
+        """ Record the requests sent and answers received (see
+        recorder.Recorder).
+
+        :param recorder: Recorder, None to stop recording.
+        :return:
+        """
+        self._recorder = recorder
+        self._monitored = self._stats is not None or recorder is not None
+
+    def set_interceptors(self, interceptors):
+        """ Set the chain of interceptors of the requests (see Interceptor).
+
+        :param interceptors: sequence of interceptors, in the order in which
+            they see the requests, or None to remove all interceptors.
+        :return:
+        """
+        with self._batch_lock:
+            self._interceptors = tuple(interceptors) if interceptors else ()
+            self._hooked = bool(self._interceptors) or self._n_batches > 0
+
+    def get_interceptors(self):
+        """ Return the chain of interceptors.
+
+        :return: tuple of interceptors.
+        """
+        return self._interceptors
+
+    @contextlib.contextmanager
+    def batch(self):
+        """ Group the writes into a single transmission.
+
+        Within the block, the writes of the current thread are queued (and
+        report success), then sent at once when the block exits. If the block
+        exits with an exception, the queued writes are dropped. Reads of the
+        current thread flush its queued writes first, so that they are
+        ordered. Blocks can be nested, the writes being sent at the end of
+        the outermost one. Each thread has its own batch, the writes of the
+        other threads are sent as usual.
+
+        :return: context manager.
+        """
+        if self._get_batch() is not None:
+            yield self
+            return
+
+        self._local.batch = []
+        with self._batch_lock:
+            self._n_batches += 1
+            self._hooked = True
+        for interceptor in self._interceptors:
+            interceptor.batch_begin()
+
+        try:
+            yield self
+        except BaseException:
+            self._local.batch = []
+            raise
+        finally:
+            try:
+                self._flush_batch()
+            finally:
+                self._local.batch = None
+                with self._batch_lock:
+                    self._n_batches -= 1
+                    self._hooked = (
+                        bool(self._interceptors) or self._n_batches > 0
+                    )
+                for interceptor in reversed(self._interceptors):
+                    interceptor.batch_end()
+
+    def _get_batch(self):
+        # writes queued by the current thread, None outside of a batch
+        return getattr(self._local, "batch", None)
+
+    def _flush_batch(self):
+        pending = self._get_batch()
+        if pending:
+            self._local.batch = []
+            self._submit_write_many(
+                [(address, value) for address, value, _ in pending],
+                any(force for _, _, force in pending)
+            ).result()
+
+    def _intercept_write(self, address, value):
+        for interceptor in self._interceptors:
+            value = interceptor.on_write(address, value)
+            if value is SKIP:
+                break
+        return value
+
+    def _intercept_read(self, address):
+        for interceptor in self._interceptors:
+            value = interceptor.on_read(address)
+            if value is not None:
+                return value
+        return None
+
+    def _intercept_answer(self, address, value):
+        for interceptor in reversed(self._interceptors):
+            value = interceptor.on_answer(address, value)
+        return value
+
+    def write(self, address, value, force=False):
         """ Write a new value at the specified address.
 
+        If the shadow register file is enabled, the request is not sent when
+        the address already holds the value, unless force is True.
+
         :param address: address at which to write the value.
         :param value: new value.
-        :return: True if the request was sent, False if the device is not
-            connected.
+        :param force: True to send the request even if it is redundant.
+        :return: True if the request was sent (or skipped because redundant),
+            False if the device is not connected.
         """
         if self._connected:
-            self._serial.write(format_write_request(address, value))
+            if self._hooked:
+                value = self._intercept_write(address, value)
+                if value is SKIP:
+                    return True
+                batch = self._get_batch()
+                if batch is not None:
+                    _check_address(address)
+                    _check_value(value)
+                    batch.append((address, value, force))
+                    return True
+
+            shadow = self._shadow
+            if shadow is not None:
+                if not force and shadow.get(address) == value:
+                    self._skipped_writes += 1
+                    return True
+
+            if self._io_thread is None and not self._monitored:
+                with self._lock:
+                    pack_write_request_into(
+                        self._write_buffer, 0, address, value
+                    )
+                    self._serial.write(self._write_buffer)
+            else:
+                self._exchange(
+                    format_write_request(address, value), 0, (address,)
+                ).result()
+
+            if shadow is not None:
+                shadow[address] = value
+                self._sent_writes += 1
+            if address in self._policies:
+                self._cache_write(address, value)
             return True
         return False
 
+    def submit_write(self, address, value, force=False):
+        """ Write a new value at the specified address without waiting for the
+        request to be sent.
+
+        Contrary to write, invalid values do not raise an error but result in
+        False.
+
+        :param address: address at which to write the value.
+        :param value: new value.
+        :param force: True to send the request even if it is redundant.
+        :return: future resolving to the result of write.
+        """
+        return _chain(
+            self.submit_write_many([(address, value)], force),
+            lambda status: status[0]
+        )
+
+    def write_many(self, pairs, force=False):
+        """ Write several values in a single transmission.
+
+        All (address, value) pairs are validated and formatted into one
+        contiguous buffer, which is then sent with a single write. Pairs that
+        cannot be formatted (e.g. out of range) are not sent, but do not
+        prevent the other pairs from being sent. If the shadow register file
+        is enabled, redundant pairs are skipped unless force is True.
+
+        :param pairs: iterable of (address, value) pairs.
+        :param force: True to send all requests even if they are redundant.
+        :return: list of booleans, one per pair, True if the corresponding
+            request was sent (or skipped because redundant), False if it was
+            invalid, not fully transmitted or if the device is not connected.
+        """
+        return self.submit_write_many(pairs, force).result()
+
+    def submit_write_many(self, pairs, force=False):
+        """ Write several values in a single transmission without waiting for
+        the requests to be sent.
+
+        :param pairs: iterable of (address, value) pairs.
+        :param force: True to send all requests even if they are redundant.
+        :return: future resolving to the result of write_many.
+        """
+        if not self._hooked:
+            return self._submit_write_many(pairs, force)
+
+        pairs = list(pairs)
+        status = [False] * len(pairs)
+        if not self._connected:
+            return _completed(status)
+
+        for interceptor in self._interceptors:
+            interceptor.batch_begin()
+
+        try:
+            # requests dropped by the interceptors succeed
+            kept = []
+            for i, (address, value) in enumerate(pairs):
+                value = self._intercept_write(address, value)
+                if value is SKIP:
+                    status[i] = True
+                else:
+                    kept.append((i, (address, value)))
+
+            batch = self._get_batch()
+            if batch is not None:
+                for i, (address, value) in kept:
+                    try:
+                        _check_address(address)
+                        _check_value(value)
+                    except ValueError:
+                        continue
+                    batch.append((address, value, force))
+                    status[i] = True
+                return _completed(status)
+
+            def merge(kept_status):
+                for (i, _), sent in zip(kept, kept_status):
+                    status[i] = sent
+                return status
+
+            return _chain(
+                self._submit_write_many([pair for _, pair in kept], force),
+                merge
+            )
+        finally:
+            for interceptor in reversed(self._interceptors):
+                interceptor.batch_end()
+
+    def write_compiled(self, request, pairs):
+        """ Send write requests formatted in advance, in a single
+        transmission.
+
+        The requests are sent as they are, regardless of the shadow register
+        file, which is then updated along with the cache. If interceptors are
+        set or a batch is open, the pairs are written with write_many instead,
+        so that the interceptors see them.
+
+        :param request: formatted write requests (see format_write_request).
+        :param pairs: (address, value) pairs of the requests, in the same
+            order.
+        :return: True if all requests were sent, False otherwise (e.g. the
+            device is not connected).
+        """
+        if not self._connected:
+            return False
+        if self._hooked:
+            return all(self.write_many(pairs, force=True))
+
+        n_sent = self._exchange(request, 0, (a for a, _ in pairs)).result()[0]
+        n_written = n_sent // WRITE_REQUEST_SIZE
+
+        shadow = self._shadow
+        for address, value in pairs[:n_written]:
+            if shadow is not None:
+                shadow[address] = value
+                self._sent_writes += 1
+            if address in self._policies:
+                self._cache_write(address, value)
+
+        return n_written == len(pairs)
+
+    def _submit_write_many(self, pairs, force):
+        pairs = list(pairs)
+        status = [False] * len(pairs)
+        if not self._connected:
+            return _completed(status)
+
+        shadow = self._shadow
+        pending = {}
+        buff = bytearray(WRITE_REQUEST_SIZE * len(pairs))
+        offset = 0
+        sent = []
+        for i, (address, value) in enumerate(pairs):
+            if shadow is not None and not force:
+                if pending.get(address, shadow.get(address)) == value:
+                    self._skipped_writes += 1
+                    status[i] = True
+                    continue
+
+            try:
+                offset = pack_write_request_into(buff, offset, address, value)
+            except ValueError:
+                continue
+            sent.append(i)
+            pending[address] = value
+
+        if not sent:
+            return _completed(status)
+
+        def on_sent(result):
+            # only the requests that were entirely transmitted succeeded
+            for i in sent[:result[0] // WRITE_REQUEST_SIZE]:
+                status[i] = True
+
+                if shadow is not None:
+                    shadow[pairs[i][0]] = pairs[i][1]
+                    self._sent_writes += 1
+                if pairs[i][0] in self._policies:
+                    self._cache_write(*pairs[i])
+
+            return status
+
+        return _chain(
+            self._exchange(
+                memoryview(buff)[:offset], 0, (pairs[i][0] for i in sent)
+            ),
+            on_sent
+        )
+
+    def set_cache_policy(self, address, policy, ttl=None):
+        """ Set the caching policy of an address.
+
+        :param address: address.
+        :param policy: CachePolicy of the address.
+        :param ttl: time (s) after which a cached value is read again from the
+            FPGA, None to keep it indefinitely.
+        :return:
+        """
+        self._cache.pop(address, None)
+        if policy is CachePolicy.LIVE:
+            self._policies.pop(address, None)
+        else:
+            self._policies[address] = (policy, ttl)
+
+    def clear_cache(self):
+        """ Forget all cached values.
+
+        :return:
+        """
+        self._cache.clear()
+
+    def forget(self, addresses, shadow=True):
+        """ Forget the cached values of addresses, and optionally their
+        shadow values.
+
+        The next read of these addresses is answered by the FPGA, e.g. to
+        verify that values were applied. If the shadow values are forgotten,
+        the next write to these addresses is sent regardless of its value.
+
+        :param addresses: iterable of addresses.
+        :param shadow: True to also forget the shadow values.
+        :return:
+        """
+        for address in addresses:
+            self._cache.pop(address, None)
+            if shadow and self._shadow is not None:
+                self._shadow.pop(address, None)
+
+    def _cache_value(self, address, value):
+        ttl = self._policies[address][1]
+        expiry = float("inf") if ttl is None else time.monotonic() + ttl
+        self._cache[address] = (value, expiry)
+
+    def _cache_write(self, address, value):
+        if self._policies[address][0] is CachePolicy.WRITE_THROUGH:
+            self._cache_value(address, value)
+        else:
+            self._cache.pop(address, None)
+
+    def _get_cached(self, address):
+        entry = self._cache.get(address)
+        if entry is not None and entry[1] >= time.monotonic():
+            return entry[0]
+        return None
+
+    def get_shadow_counters(self):
+        """ Return the number of write requests sent and skipped since the
+        shadow register file was enabled or cleared.
+
+        :return: dictionary with "sent" and "skipped" number of requests.
+        """
+        return {"sent": self._sent_writes, "skipped": self._skipped_writes}
+
+    def clear_shadow(self):
+        """ Forget the values of the shadow register file and reset its
+        counters.
+
+        The next write to each address will be sent regardless of its value,
+        which is useful if the FPGA state was modified externally (e.g. after
+        a reset).
+
+        :return:
+        """
+        if self._shadow is not None:
+            self._shadow.clear()
+        self._sent_writes = 0
+        self._skipped_writes = 0
+
+    def set_stats_group(self, address, group):
+        """ Set the register group of an address, under which the latencies of
+        its requests are recorded. Requests to addresses without group are
+        recorded under "other", and batches spanning several groups under
+        "mixed".
+
+        :param address: address.
+        :param group: group name.
+        :return:
+        """
+        if self._stats is not None:
+            self._stats.groups[address] = group
+
+    def get_stats(self):
+        """ Return a snapshot of the link statistics.
+
+        The statistics consist of the number of read and write requests sent,
+        the number of bytes sent and received, the number of reads that timed
+        out without receiving any answer and of short reads (answers received
+        partially). The latencies of the round trips (from sending the
+        requests to receiving the answers, or to sending the requests for
+        writes) are counted in histograms per register group, with
+        N_LATENCY_BUCKETS log2 buckets: bucket 0 counts latencies below 1 us,
+        bucket i latencies in [2**(i-1), 2**i) us.
+
+        :return: dictionary of the statistics, with the histograms under
+            "latency" as group -> list of counts, or None if the statistics
+            are disabled.
+        """
+        if self._stats is None:
+            return None
+        return self._stats.snapshot()
+
+    def reset_stats(self):
+        """ Reset the link statistics.
+
+        :return:
+        """
+        if self._stats is not None:
+            self._stats.reset()
+
     def read(self, address):
         """ Write a read request to the address and reads 4 bytes.
 
@@ -189,6 +1256,170 @@ class RegisterInterface:
         :return: value returned by the FPGA.
         """
         if self._connected:
-            self._serial.write(format_read_request(address))
-            return format_to_int(self._serial.read(4))
+            if self._hooked:
+                return self._read_hooked(address)
+
+            if self._cache:
+                value = self._get_cached(address)
+                if value is not None:
+                    return value
+
+            if self._io_thread is not None or self._monitored:
+                answer = self._exchange(
+                    format_read_request(address), 1, (address,)
+                ).result()[1]
+                value = format_to_int(answer)
+            else:
+                with self._lock:
+                    pack_read_request_into(self._read_buffer, 0, address)
+                    self._serial.write(self._read_buffer)
+
+                    n_bytes = self._serial.readinto(self._answer)
+                    if n_bytes == READ_ANSWER_SIZE:
+                        value = _READ_ANSWER.unpack_from(self._answer)[0]
+                    else:
+                        self._serial.reset_input_buffer()
+                        value = format_to_int(self._answer[:n_bytes])
+
+            if address in self._policies:
+                self._cache_value(address, value)
+            return value
         return -1
+
+    def _read_hooked(self, address):
+        value = self._intercept_read(address)
+        if value is not None:
+            return value
+
+        self._flush_batch()
+
+        if self._cache:
+            value = self._get_cached(address)
+        if value is None:
+            value = format_to_int(
+                self._exchange(
+                    format_read_request(address), 1, (address,)
+                ).result()[1]
+            )
+            if address in self._policies:
+                self._cache_value(address, value)
+
+        return self._intercept_answer(address, value)
+
+    def submit_read(self, address):
+        """ Read the value at the specified address without waiting for the
+        answer.
+
+        Contrary to read, a missing answer results in -1.
+
+        :param address: address to read from.
+        :return: future resolving to the value returned by the FPGA.
+        """
+        return _chain(self.submit_read_many([address]), lambda val: val[0])
+
+    def read_many(self, addresses):
+        """ Read several addresses with pipelined requests.
+
+        All read requests are sent back to back in a single transmission,
+        then the answers are read at once and decoded in the order of the
+        requests. This costs a single round trip instead of one per address.
+
+        :param addresses: iterable of addresses to read from.
+        :return: list of values returned by the FPGA, in the same order as the
+            addresses. Values that were not received are -1, as are all values
+            if the device is not connected.
+        """
+        return self.submit_read_many(addresses).result()
+
+    def submit_read_many(self, addresses):
+        """ Read several addresses with pipelined requests without waiting for
+        the answers.
+
+        :param addresses: iterable of addresses to read from.
+        :return: future resolving to the result of read_many.
+        """
+        if not self._hooked:
+            return self._submit_read_many(addresses)
+
+        addresses = list(addresses)
+        values = [-1] * len(addresses)
+        if not self._connected:
+            return _completed(values)
+
+        for interceptor in self._interceptors:
+            interceptor.batch_begin()
+
+        try:
+            # addresses answered by the interceptors are not read
+            missing = []
+            for i, address in enumerate(addresses):
+                value = self._intercept_read(address)
+                if value is None:
+                    missing.append(i)
+                else:
+                    values[i] = value
+
+            self._flush_batch()
+
+            def merge(read_values):
+                for i, value in zip(missing, read_values):
+                    values[i] = self._intercept_answer(addresses[i], value)
+                return values
+
+            return _chain(
+                self._submit_read_many([addresses[i] for i in missing]),
+                merge
+            )
+        finally:
+            for interceptor in reversed(self._interceptors):
+                interceptor.batch_end()
+
+    def _submit_read_many(self, addresses):
+        addresses = list(addresses)
+        values = [-1] * len(addresses)
+        if not self._connected:
+            return _completed(values)
+
+        # only read the values that are not cached
+        if self._cache:
+            missing = []
+            for i, address in enumerate(addresses):
+                value = self._get_cached(address)
+                if value is None:
+                    missing.append(i)
+                else:
+                    values[i] = value
+        else:
+            missing = range(len(addresses))
+
+        if not missing:
+            return _completed(values)
+
+        buff = bytearray(READ_REQUEST_SIZE * len(missing))
+        offset = 0
+        for i in missing:
+            offset = pack_read_request_into(buff, offset, addresses[i])
+
+        def on_answers(result):
+            answers = result[1]
+            n_values = len(answers) // READ_ANSWER_SIZE
+
+            policies = self._policies
+            for i, (value,) in zip(
+                missing,
+                _READ_ANSWER.iter_unpack(
+                    memoryview(answers)[:READ_ANSWER_SIZE * n_values]
+                )
+            ):
+                values[i] = value
+                if addresses[i] in policies:
+                    self._cache_value(addresses[i], value)
+
+            return values
+
+        return _chain(
+            self._exchange(
+                buff, len(missing), (addresses[i] for i in missing)
+            ),
+            on_answers
+        )
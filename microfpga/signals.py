@@ -1,10 +1,22 @@
 """ Module defining the different signals (I/O or parameters) classes of
 MicroFPGA.
 """
+import array
+import warnings
 from abc import ABC, abstractmethod
+from collections.abc import Mapping
 from enum import Enum
+from typing import NamedTuple
 from microfpga import regint
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# pylint: disable=too-many-arguments
+# pylint: disable=too-many-lines
+
 # constants, defined similarly in the FPGA configuration source
 NUM_LASERS = 8
 NUM_TTL = 4
@@ -51,6 +63,10 @@ MAX_CAM_EXPOSURE = 1048575
 MAX_LASER_DELAY = 65535
 MAX_START = 1
 
+# number of frames of a laser trigger sequence, the first frame being the
+# most significant bit
+SEQUENCE_FRAMES = 16
+
 
 class LaserTriggerMode(Enum):
     """The different laser trigger modes.
@@ -123,6 +139,110 @@ def format_sequence(sequence):
     return -1
 
 
+def every(period, phase=0, n_frames=SEQUENCE_FRAMES):
+    """Return a binary sequence triggering every period-th frame.
+
+    :param period: number of frames between two triggers.
+    :param phase: index of the first triggered frame, in [0, period).
+    :param n_frames: length of the sequence.
+    :return: String of zeroes and ones, e.g. "0100" for every(4, 1, 4).
+    """
+    if not 0 <= phase < period:
+        raise ValueError(f"Phase {phase} is not in [0, {period}).")
+    return "".join(
+        "1" if frame % period == phase else "0" for frame in range(n_frames)
+    )
+
+
+def _check_window(n_frames):
+    if n_frames < SEQUENCE_FRAMES and (
+            n_frames == 0 or SEQUENCE_FRAMES % n_frames
+    ):
+        raise ValueError(
+            f"A pattern of {n_frames} frames cannot be repeated in the "
+            f"{SEQUENCE_FRAMES}-frame sequences."
+        )
+
+
+def _compile_frames(frames):
+    """Return the sequence of a pattern of frames (string or booleans)."""
+    if isinstance(frames, str):
+        bits = frames
+    else:
+        bits = "".join(
+            "1" if frame is True or frame == 1 else
+            "0" if frame is False or frame == 0 else "x"
+            for frame in frames
+        )
+    if bits.strip("01"):
+        raise ValueError(f"Pattern {frames!r} is not binary.")
+
+    _check_window(len(bits))
+    window = (bits * (SEQUENCE_FRAMES // len(bits) or 1))[:SEQUENCE_FRAMES]
+    if (window * (len(bits) // SEQUENCE_FRAMES + 1))[:len(bits)] != bits:
+        raise ValueError(
+            f"Pattern {bits} does not repeat every {SEQUENCE_FRAMES} frames."
+        )
+    return int(window, 2)
+
+
+def compile_sequences(pattern):
+    """Compile the laser trigger sequences of several lasers at once.
+
+    The pattern describes which frames trigger each laser. It is either a
+    matrix (lasers x frames) of booleans or 0/1, e.g. a numpy array, whose
+    rows can also be binary strings, or a mapping of laser channel to the
+    frames of this laser, for instance:
+
+        {0: "10", 1: "01", 2: every(4)}
+
+    alternates lasers 0 and 1, and triggers laser 2 every 4th frame. Patterns
+    shorter than the sequences must divide their length and are repeated,
+    longer patterns must repeat every SEQUENCE_FRAMES frames. The first frame
+    is the most significant bit of the sequence, as in format_sequence.
+
+    If numpy is available, numeric matrices are compiled in bulk.
+
+    :param pattern: matrix or mapping.
+    :return: list of the sequences of the lasers 0, 1, 2..., or a dictionary
+        of laser channel to sequence if the pattern is a mapping.
+    """
+    if isinstance(pattern, Mapping):
+        return {
+            channel: _compile_frames(frames)
+            for channel, frames in pattern.items()
+        }
+
+    if np is None or not isinstance(pattern, np.ndarray):
+        # e.g. generator, which can only be iterated once
+        pattern = list(pattern)
+
+    if np is not None and not any(isinstance(row, str) for row in pattern):
+        matrix = np.asarray(pattern)
+        if matrix.ndim != 2 or matrix.dtype.kind not in "biuf":
+            raise ValueError("The pattern is not a matrix of booleans.")
+        if not np.isin(matrix, (0, 1)).all():
+            raise ValueError("The pattern is not binary.")
+
+        n_frames = matrix.shape[1]
+        _check_window(n_frames)
+        if n_frames < SEQUENCE_FRAMES:
+            window = np.tile(matrix, SEQUENCE_FRAMES // n_frames)
+        else:
+            window = matrix[:, :SEQUENCE_FRAMES]
+            repeated = np.tile(window, -(-n_frames // SEQUENCE_FRAMES))
+            if not (repeated[:, :n_frames] == matrix).all():
+                raise ValueError(
+                    f"The pattern does not repeat every {SEQUENCE_FRAMES} "
+                    f"frames."
+                )
+
+        weights = 1 << np.arange(SEQUENCE_FRAMES - 1, -1, -1)
+        return (window.astype(np.int64) @ weights).tolist()
+
+    return [_compile_frames(frames) for frames in pattern]
+
+
 def get_compatible_ids():
     """Return a list of board IDs compatible with MicroFPGA.
 
@@ -142,6 +262,309 @@ def get_analog_ids():
     return ID_AU, ID_AUP, ID_MOJO
 
 
+def get_board_name(board_id):
+    """Return the human-readable name of a board.
+
+    :param board_id: board ID.
+    :return: board name, or "Unknown" if the ID is not compatible.
+    """
+    names = {ID_AU: "Au", ID_AUP: "Au+", ID_CU: "Cu", ID_MOJO: "Mojo"}
+    return names.get(board_id, "Unknown")
+
+
+def check_compatibility(version, board_id):
+    """Check that the configuration version and board ID are compatible
+    with this library, and emit warnings if they are not.
+
+    :param version: version read from the FPGA.
+    :param board_id: board ID read from the FPGA.
+    :return: True if compatible, False otherwise.
+    """
+    if version != CURR_VER:
+        warnings.warn(
+            f"Wrong version: expected {str(CURR_VER)}, "
+            f"got {str(version)}. The port has been "
+            f"disconnected"
+        )
+
+    if board_id not in get_compatible_ids():
+        warnings.warn(
+            f"Wrong board id: expected {ID_MOJO} (Mojo),"
+            f" {ID_CU} (Cu), {ID_AU} (Au) or"
+            f" {ID_AUP} (Au+),"
+            f" got {board_id}. The port has been disconnected"
+        )
+
+    return version == CURR_VER and board_id in get_compatible_ids()
+
+
+class Access(Enum):
+    """Access of the registers from the host.
+
+    READ_ONLY: registers set by the FPGA (e.g. analog inputs).
+    READ_WRITE: registers set by the host.
+    """
+
+    READ_ONLY = "r"
+    READ_WRITE = "rw"
+
+
+class RegisterBlock(NamedTuple):
+    """Block of consecutive registers of the same kind, one per channel.
+
+    Attributes:
+        name: name of the block.
+        address: address of the first register.
+        count: number of registers (channels).
+        width: width of the registers in the FPGA (bits).
+        max: maximum value of the registers, the minimum being 0.
+        access: Access of the registers.
+        group: group of the block (e.g. "laser").
+        cache: regint.CachePolicy of the registers.
+    """
+
+    name: str
+    address: int
+    count: int
+    width: int
+    max: int
+    access: Access
+    group: str
+    cache: regint.CachePolicy
+
+
+class RegisterMap:
+    """Register layout of a MicroFPGA configuration.
+
+    The map is built from a table of RegisterBlock, from which the signals,
+    the validation of the values, the caching policies, the statistics
+    groups and the emulator are derived. The maximum writable value of each
+    address is kept in a compact array for bulk validation.
+
+    Args:
+        blocks (sequence of RegisterBlock): register blocks.
+    """
+
+    def __init__(self, blocks):
+        self.blocks = {block.name: block for block in blocks}
+
+        size = max(block.address + block.count for block in blocks)
+        self._blocks = [None] * size
+        self._max = array.array("q", [-1]) * size
+        for block in blocks:
+            for address in range(block.address, block.address + block.count):
+                if self._blocks[address] is not None:
+                    raise ValueError(
+                        f"Address {address} is mapped to both "
+                        f"{self._blocks[address].name} and {block.name}."
+                    )
+
+                self._blocks[address] = block
+                if block.access is Access.READ_WRITE:
+                    self._max[address] = block.max
+
+    def __getitem__(self, name):
+        return self.blocks[name]
+
+    def __iter__(self):
+        return iter(self.blocks.values())
+
+    def get_block(self, address):
+        """Return the block of an address.
+
+        :param address: register address.
+        :return: RegisterBlock, or None if the address is not mapped.
+        """
+        if 0 <= address < len(self._blocks):
+            return self._blocks[address]
+        return None
+
+    def get_addresses(self, name, channels=None):
+        """Return the addresses of channels of a block.
+
+        :param name: block name.
+        :param channels: iterable of channels, by default all channels.
+        :return: list of addresses.
+        """
+        block = self.blocks[name]
+        if channels is None:
+            return list(range(block.address, block.address + block.count))
+
+        addresses = []
+        for channel in channels:
+            if not 0 <= channel < block.count:
+                raise ValueError(
+                    f"{channel} exceeds maximum number of {name} registers."
+                )
+            addresses.append(block.address + channel)
+        return addresses
+
+    def is_allowed(self, address, value):
+        """Check if a value can be written to an address.
+
+        :param address: register address.
+        :param value: value.
+        :return: True if the address is writable and the value in range.
+        """
+        return (
+            0 <= address < len(self._max) and 0 <= value <= self._max[address]
+        )
+
+    def check_writes(self, pairs):
+        """Check that values can be written to their addresses.
+
+        :param pairs: iterable of (address, value) pairs.
+        :return: list of the pairs.
+        """
+        pairs = list(pairs)
+        maxima = self._max
+        for address, value in pairs:
+            if not (0 <= address < len(maxima) and
+                    0 <= value <= maxima[address]):
+                block = self.get_block(address)
+                if block is None:
+                    raise ValueError(f"Address {address} is not mapped.")
+                if block.access is Access.READ_ONLY:
+                    raise ValueError(
+                        f"{block.name} (address {address}) is read-only."
+                    )
+                raise ValueError(
+                    f"Value {value} not allowed in {block.name} "
+                    f"(address {address})."
+                )
+        return pairs
+
+    def get_writable_addresses(self):
+        """Return the addresses writable by the host.
+
+        :return: frozenset of addresses.
+        """
+        return frozenset(
+            address for address, maximum in enumerate(self._max)
+            if maximum >= 0
+        )
+
+    def get_cache_policies(self):
+        """Return the caching policy of each register.
+
+        :return: dictionary of address -> regint.CachePolicy.
+        """
+        return {
+            address: block.cache
+            for block in self
+            for address in range(block.address, block.address + block.count)
+        }
+
+    def get_groups(self):
+        """Return the group of each register.
+
+        :return: dictionary of address -> group name.
+        """
+        return {
+            address: block.group
+            for block in self
+            for address in range(block.address, block.address + block.count)
+        }
+
+    def read(self, serial_com, name, channels=None):
+        """Read the registers of a block in a single transmission.
+
+        :param serial_com: register interface.
+        :param name: block name.
+        :param channels: iterable of channels, by default all channels.
+        :return: list of values (see RegisterInterface.read_many).
+        """
+        return serial_com.read_many(self.get_addresses(name, channels))
+
+
+_WRITE_THROUGH = regint.CachePolicy.WRITE_THROUGH
+_LIVE = regint.CachePolicy.LIVE
+_STATIC = regint.CachePolicy.STATIC
+_RW = Access.READ_WRITE
+_RO = Access.READ_ONLY
+
+# Register layout of the current configuration version (CURR_VER).
+REGISTER_MAP = RegisterMap((
+    RegisterBlock(
+        "mode", ADDR_MODE, NUM_LASERS, 3, MAX_MODE, _RW, "laser",
+        _WRITE_THROUGH
+    ),
+    RegisterBlock(
+        "duration", ADDR_DUR, NUM_LASERS, 20, MAX_DURATION, _RW, "laser",
+        _WRITE_THROUGH
+    ),
+    RegisterBlock(
+        "sequence", ADDR_SEQ, NUM_LASERS, 16, MAX_SEQUENCE, _RW, "laser",
+        _WRITE_THROUGH
+    ),
+    RegisterBlock(
+        "ttl", ADDR_TTL, NUM_TTL, 1, MAX_TTL, _RW, "ttl", _WRITE_THROUGH
+    ),
+    RegisterBlock(
+        "servo", ADDR_SERVO, NUM_SERVOS, 16, MAX_SERVO, _RW, "servo",
+        _WRITE_THROUGH
+    ),
+    RegisterBlock(
+        "pwm", ADDR_PWM, NUM_PWM, 8, MAX_PWM, _RW, "pwm", _WRITE_THROUGH
+    ),
+    RegisterBlock(
+        "active_sync", ADDR_ACTIVE_SYNC, 1, 1, TriggerSyncMode.ACTIVE.value,
+        _RW, "camera", _WRITE_THROUGH
+    ),
+    RegisterBlock(
+        "start_trigger", ADDR_START_TRIGGER, 1, 1, MAX_START, _RW, "camera",
+        _LIVE
+    ),
+    RegisterBlock(
+        "camera_pulse", ADDR_CAM_PULSE, 1, 20, MAX_CAM_PULSE, _RW, "camera",
+        _WRITE_THROUGH
+    ),
+    RegisterBlock(
+        "camera_readout", ADDR_CAM_READOUT, 1, 16, MAX_CAM_READOUT, _RW,
+        "camera", _WRITE_THROUGH
+    ),
+    RegisterBlock(
+        "camera_exposure", ADDR_CAM_EXPO, 1, 20, MAX_CAM_EXPOSURE, _RW,
+        "camera", _WRITE_THROUGH
+    ),
+    RegisterBlock(
+        "laser_delay", ADDR_LASER_DELAY, 1, 16, MAX_LASER_DELAY, _RW,
+        "camera", _WRITE_THROUGH
+    ),
+    RegisterBlock(
+        "analog", ADDR_AI, NUM_AI, 16, MAX_AI, _RO, "analog", _LIVE
+    ),
+    RegisterBlock(
+        "version", ADDR_VER, 1, 32, regint.MAX_INT, _RO, "board", _STATIC
+    ),
+    RegisterBlock(
+        "id", ADDR_ID, 1, 32, regint.MAX_INT, _RO, "board", _STATIC
+    ),
+))
+
+
+def get_cache_policies():
+    """Return the caching policy of each MicroFPGA register.
+
+    The version and board ID never change, the laser, camera and output
+    registers only change when written by the host, while the analog inputs
+    and the camera start/stop state are always read from the FPGA.
+
+    :return: dictionary of address -> regint.CachePolicy.
+    """
+    return REGISTER_MAP.get_cache_policies()
+
+
+def get_register_groups():
+    """Return the group of each MicroFPGA register, under which the link
+    statistics of its requests are recorded.
+
+    :return: dictionary of address -> group name ("board", "laser", "ttl",
+        "servo", "pwm", "camera" or "analog").
+    """
+    return REGISTER_MAP.get_groups()
+
+
 class Signal(ABC):
     """Base class for all MicroFPGA inputs/outputs and parameters.
 
@@ -152,6 +575,11 @@ class Signal(ABC):
     Each signal class has a maximum number of channels of possible instances,
     each indexed by a channel id.
 
+    Subclasses are views on a block of the register map (REGISTER_MAP), set
+    by their register_block class attribute. The absolute address of the
+    signal register (address attribute) and its bounds are resolved once at
+    instantiation.
+
     Args:
         channel_id (int): channel ID.
         serial_com (RegisterInterface): register interface taking care of the
@@ -160,6 +588,9 @@ class Signal(ABC):
             signal is read-only.
     """
 
+    __slots__ = ("channel_id", "output", "address", "_max", "_serial_com")
+    register_block = None
+
     def __init__(
         self,
         channel_id: int,
@@ -170,13 +601,16 @@ class Signal(ABC):
             self.channel_id = channel_id
             self.output = output
             self._serial_com = serial_com
+
+            # read-only signals do not allow any value
+            self.address = self.get_address() + channel_id
+            self._max = self.get_max() if output else -1
         else:
             raise ValueError(
                 f"{channel_id} exceeds maximum number of {self.get_name()} "
                 f"signals."
             )
 
-    @abstractmethod
     def get_address(self):
         """Return the signal read/write address.
 
@@ -185,8 +619,8 @@ class Signal(ABC):
 
         :return: address.
         """
+        return REGISTER_MAP[self.register_block].address
 
-    @abstractmethod
     def get_max(self):
         """Get the maximum value of the signal.
 
@@ -194,6 +628,7 @@ class Signal(ABC):
 
         :return: maximum value.
         """
+        return REGISTER_MAP[self.register_block].max
 
     def is_allowed(self, value: int):
         """Check if the value is a valid signal value.
@@ -204,7 +639,7 @@ class Signal(ABC):
         :param value: value to test.
         :return: True if the value is allowed, False otherwise.
         """
-        return 0 <= value <= self.get_max() and self.output
+        return 0 <= value <= self._max
 
     def is_read_only(self):
         """ Check if the signal is read-only.
@@ -213,9 +648,9 @@ class Signal(ABC):
         """
         return not self.output
 
-    @abstractmethod
     def get_num_signal(self):
         """Return the maximum number of channels for the signal type."""
+        return REGISTER_MAP[self.register_block].count
 
     @abstractmethod
     def get_name(self):
@@ -224,39 +659,37 @@ class Signal(ABC):
         :return: signal name.
         """
 
-    def set_state(self, value: int):
+    def set_state(self, value: int, force: bool = False):
         """Set the signal state.
 
         Throws errors if the signal is read-only or the value not allowed.
 
         :param value: new state.
+        :param force: True to send the request even if the register interface
+            knows that the signal is already in this state.
         :return: True if the request was sent, False if the device is not
             connected.
         """
-        if not self.output:
-            raise ValueError(
-                f"{self.get_name()} (channel {self.channel_id}) is "
-                f"read-only."
-            )
-
-        if not self.is_allowed(value):
-            if self.output:
+        if not 0 <= value <= self._max:
+            if not self.output:
                 raise ValueError(
-                    f"Value {value} not allowed in {self.get_name()} "
-                    f"(channel {self.channel_id})."
+                    f"{self.get_name()} (channel {self.channel_id}) is "
+                    f"read-only."
                 )
 
-        return self._serial_com.write(
-            self.get_address() + self.channel_id,
-            value
-        )
+            raise ValueError(
+                f"Value {value} not allowed in {self.get_name()} "
+                f"(channel {self.channel_id})."
+            )
+
+        return self._serial_com.write(self.address, value, force)
 
     def get_state(self):
         """Read the state of the signal.
 
         :return: signal state.
         """
-        return self._serial_com.read(self.get_address() + self.channel_id)
+        return self._serial_com.read(self.address)
 
 
 class Ttl(Signal):
@@ -266,18 +699,12 @@ class Ttl(Signal):
     HIGH.
     """
 
+    __slots__ = ()
+    register_block = "ttl"
+
     def __init__(self, channel_id: int, serial_com: regint.RegisterInterface):
         Signal.__init__(self, channel_id, serial_com)
 
-    def get_address(self):
-        return ADDR_TTL
-
-    def get_max(self):
-        return MAX_TTL
-
-    def get_num_signal(self):
-        return NUM_TTL
-
     def get_name(self):
         return "TTL"
 
@@ -289,18 +716,12 @@ class Pwm(Signal):
     [0, 255].
     """
 
+    __slots__ = ()
+    register_block = "pwm"
+
     def __init__(self, channel_id: int, serial_com: regint.RegisterInterface):
         Signal.__init__(self, channel_id, serial_com)
 
-    def get_address(self):
-        return ADDR_PWM
-
-    def get_max(self):
-        return MAX_PWM
-
-    def get_num_signal(self):
-        return NUM_PWM
-
     def get_name(self):
         return "PWM"
 
@@ -314,18 +735,12 @@ class Servo(Signal):
     avoid vibrations on the optical table.
     """
 
+    __slots__ = ()
+    register_block = "servo"
+
     def __init__(self, channel_id: int, serial_com: regint.RegisterInterface):
         Signal.__init__(self, channel_id, serial_com)
 
-    def get_address(self):
-        return ADDR_SERVO
-
-    def get_max(self):
-        return MAX_SERVO
-
-    def get_num_signal(self):
-        return NUM_SERVOS
-
     def get_name(self):
         return "Servos"
 
@@ -338,18 +753,16 @@ class Analog(Signal):
     range.
     """
 
+    __slots__ = ()
+    register_block = "analog"
+
     def __init__(self, channel_id: int, serial_com: regint.RegisterInterface):
         Signal.__init__(self, channel_id, serial_com, False)
 
-    def get_address(self):
-        return ADDR_AI
-
     def get_max(self):
+        # read-only, see MAX_AI for the range of the values
         return -1
 
-    def get_num_signal(self):
-        return NUM_AI
-
     def get_name(self):
         return "AI"
 
@@ -362,18 +775,12 @@ class _Mode(Signal):
     LaserTriggerMode enum.
     """
 
+    __slots__ = ()
+    register_block = "mode"
+
     def __init__(self, channel_id: int, serial_com: regint.RegisterInterface):
         Signal.__init__(self, channel_id, serial_com)
 
-    def get_address(self):
-        return ADDR_MODE
-
-    def get_max(self):
-        return MAX_MODE
-
-    def get_num_signal(self):
-        return NUM_LASERS
-
     def is_allowed(self, value):
         """Check if the value is a valid mode state.
 
@@ -388,10 +795,10 @@ class _Mode(Signal):
             return Signal.is_allowed(self, value.value)
         return Signal.is_allowed(self, value)
 
-    def set_state(self, value):
+    def set_state(self, value, force=False):
         if isinstance(value, LaserTriggerMode):
-            return Signal.set_state(self, value.value)
-        return Signal.set_state(self, value)
+            return Signal.set_state(self, value.value, force)
+        return Signal.set_state(self, value, force)
 
     def get_name(self):
         return "Laser mode"
@@ -405,18 +812,12 @@ class _Duration(Signal):
     falling trigger modes.
     """
 
+    __slots__ = ()
+    register_block = "duration"
+
     def __init__(self, channel_id: int, serial_com: regint.RegisterInterface):
         Signal.__init__(self, channel_id, serial_com)
 
-    def get_address(self):
-        return ADDR_DUR
-
-    def get_max(self):
-        return MAX_DURATION
-
-    def get_num_signal(self):
-        return NUM_LASERS
-
     def get_name(self):
         return "Laser duration"
 
@@ -431,18 +832,12 @@ class _Sequence(Signal):
     the sequence.
     """
 
+    __slots__ = ()
+    register_block = "sequence"
+
     def __init__(self, channel_id: int, serial_com: regint.RegisterInterface):
         Signal.__init__(self, channel_id, serial_com)
 
-    def get_address(self):
-        return ADDR_SEQ
-
-    def get_max(self):
-        return MAX_SEQUENCE
-
-    def get_num_signal(self):
-        return NUM_LASERS
-
     def get_name(self):
         return "Laser sequence"
 
@@ -460,6 +855,7 @@ class LaserTrigger:
     """
     def __init__(self, channel_id: int, serial_com: regint.RegisterInterface):
         self.channel_id = channel_id
+        self._serial_com = serial_com
 
         self.mode = _Mode(channel_id, serial_com)
         self.duration = _Duration(channel_id, serial_com)
@@ -541,9 +937,13 @@ class LaserTrigger:
     def get_state(self):
         """ Return a list of the laser trigger parameters value.
 
+        The parameters are read with a single pipelined request.
+
         :return: list of parameters value.
         """
-        return [self.get_mode(), self.get_duration(), self.get_sequence()]
+        return self._serial_com.read_many(
+            [self.mode.address, self.duration.address, self.seq.address]
+        )
 
 
 class _CameraPulse(Signal):
@@ -552,17 +952,12 @@ class _CameraPulse(Signal):
 
     Pulse only has effect in active synchronization mode.
     """
-    def __init__(self, serial_com: regint.RegisterInterface):
-        Signal.__init__(self, 0, serial_com)
 
-    def get_address(self):
-        return ADDR_CAM_PULSE
-
-    def get_max(self):
-        return MAX_CAM_PULSE
+    __slots__ = ()
+    register_block = "camera_pulse"
 
-    def get_num_signal(self):
-        return 1
+    def __init__(self, serial_com: regint.RegisterInterface):
+        Signal.__init__(self, 0, serial_com)
 
     def get_name(self):
         return "Camera fire pulse length"
@@ -574,17 +969,12 @@ class _CameraReadout(Signal):
 
     Read-out only has effect in active synchronization mode.
     """
-    def __init__(self, serial_com: regint.RegisterInterface):
-        Signal.__init__(self, 0, serial_com)
 
-    def get_address(self):
-        return ADDR_CAM_READOUT
-
-    def get_max(self):
-        return MAX_CAM_READOUT
+    __slots__ = ()
+    register_block = "camera_readout"
 
-    def get_num_signal(self):
-        return 1
+    def __init__(self, serial_com: regint.RegisterInterface):
+        Signal.__init__(self, 0, serial_com)
 
     def get_name(self):
         return "Camera read-out time"
@@ -596,17 +986,12 @@ class _CameraExposure(Signal):
 
     Exposure only has effect in active synchronization mode.
     """
-    def __init__(self, serial_com: regint.RegisterInterface):
-        Signal.__init__(self, 0, serial_com)
-
-    def get_address(self):
-        return ADDR_CAM_EXPO
 
-    def get_max(self):
-        return MAX_CAM_EXPOSURE
+    __slots__ = ()
+    register_block = "camera_exposure"
 
-    def get_num_signal(self):
-        return 1
+    def __init__(self, serial_com: regint.RegisterInterface):
+        Signal.__init__(self, 0, serial_com)
 
     def get_name(self):
         return "Camera exposure"
@@ -618,17 +1003,12 @@ class _LaserDelay(Signal):
 
     Delay only has effect in active synchronization mode.
     """
-    def __init__(self, serial_com: regint.RegisterInterface):
-        Signal.__init__(self, 0, serial_com)
-
-    def get_address(self):
-        return ADDR_LASER_DELAY
 
-    def get_max(self):
-        return MAX_LASER_DELAY
+    __slots__ = ()
+    register_block = "laser_delay"
 
-    def get_num_signal(self):
-        return 1
+    def __init__(self, serial_com: regint.RegisterInterface):
+        Signal.__init__(self, 0, serial_com)
 
     def get_name(self):
         return "Laser trigger delay with respect to the camera fire"
@@ -639,17 +1019,12 @@ class _CameraStart(Signal):
 
     Start/stop synchronization only has effect in active synchronization mode.
     """
-    def __init__(self, serial_com: regint.RegisterInterface):
-        Signal.__init__(self, 0, serial_com)
 
-    def get_address(self):
-        return ADDR_START_TRIGGER
+    __slots__ = ()
+    register_block = "start_trigger"
 
-    def get_max(self):
-        return 1
-
-    def get_num_signal(self):
-        return 1
+    def __init__(self, serial_com: regint.RegisterInterface):
+        Signal.__init__(self, 0, serial_com)
 
     def get_name(self):
         return "Camera start/stop"
@@ -684,17 +1059,12 @@ class SyncMode(Signal):
     synchronization, the FPGA receives an external exposure signal (generated
     from a camera) and processes it to trigger the lasers.
     """
-    def __init__(self, serial_com: regint.RegisterInterface):
-        Signal.__init__(self, 0, serial_com)
 
-    def get_address(self):
-        return ADDR_ACTIVE_SYNC
+    __slots__ = ()
+    register_block = "active_sync"
 
-    def get_max(self):
-        return TriggerSyncMode.ACTIVE.value
-
-    def get_num_signal(self):
-        return 1
+    def __init__(self, serial_com: regint.RegisterInterface):
+        Signal.__init__(self, 0, serial_com)
 
     def get_name(self):
         return "Active/passive synchronisation"
@@ -740,6 +1110,8 @@ class Camera:
         - start/stop: start/stop generating the signals.
     """
     def __init__(self, serial_com: regint.RegisterInterface):
+        self._serial_com = serial_com
+
         self._pulse = _CameraPulse(serial_com)
         self._readout = _CameraReadout(serial_com)
         self._exposure = _CameraExposure(serial_com)
@@ -808,34 +1180,73 @@ class Camera:
         """
         return self._delay.get_state()
 
-    def set_state(self, pulse, delay, exposure, readout):
-        """ Set the camera synchronization parameters.
+    def set_state(self, pulse, delay, exposure, readout, force=False):
+        """ Set the camera synchronization parameters in a single
+        transmission.
+
+        All values are validated before anything is sent.
 
         :param pulse: pulse length (us) of the fire signal.
         :param delay: delay (us) between fire and exposure signal pulses.
         :param exposure: pulse length (us) of the exposure signal.
         :param readout: delay (us) between end of the exposure signal pulse
             and beginning of the fire signal pulse.
-        :return:
+        :param force: True to send the requests even if the register
+            interface knows that the parameters are already in this state.
+        :return: True if the requests were sent, False if the device is not
+            connected.
         """
-        self.set_pulse(pulse)
-        self.set_delay(delay)
-        self.set_exposure(exposure)
-        self.set_readout(readout)
+        return all(
+            self._serial_com.write_many(
+                self.get_requests(pulse, delay, exposure, readout), force
+            )
+        )
+
+    def get_requests(self, pulse, delay, exposure, readout):
+        """ Return the write requests setting the camera synchronization
+        parameters, e.g. to send them with an asynchronous interface.
+
+        :param pulse: pulse length (us) of the fire signal.
+        :param delay: delay (us) between fire and exposure signal pulses.
+        :param exposure: pulse length (us) of the exposure signal.
+        :param readout: delay (us) between end of the exposure signal pulse
+            and beginning of the fire signal pulse.
+        :return: list of (address, value) pairs.
+        """
+        return REGISTER_MAP.check_writes(
+            zip(
+                (signal.address for signal in self.get_signals().values()),
+                (pulse, delay, exposure, readout)
+            )
+        )
+
+    def get_signals(self):
+        """ Return the signals of the camera synchronization parameters.
+
+        :return: A dictionary of the signals, indexed by ActiveParameters enum
+            values in the order pulse, delay, exposure and readout.
+        """
+        return {
+            ActiveParameters.PULSE.value: self._pulse,
+            ActiveParameters.DELAY.value: self._delay,
+            ActiveParameters.EXPOSURE.value: self._exposure,
+            ActiveParameters.READOUT.value: self._readout,
+        }
 
     def get_state(self):
         """ Return the camera synchronization parameters.
 
-        The dictionary is indexed by ActiveParameters enum values.
+        The dictionary is indexed by ActiveParameters enum values. The
+        parameters are read with a single pipelined request.
 
         :return: A dictionary of the parameters.
         """
-        return {
-            ActiveParameters.PULSE.value: self.get_pulse(),
-            ActiveParameters.DELAY.value: self.get_delay(),
-            ActiveParameters.EXPOSURE.value: self.get_exposure(),
-            ActiveParameters.READOUT.value: self.get_readout(),
-        }
+        parameters = self.get_signals()
+        values = self._serial_com.read_many(
+            [signal.address for signal in parameters.values()]
+        )
+
+        return dict(zip(parameters.keys(), values))
 
     def start(self):
         """ Start generating camera fire and laser trigger signals.
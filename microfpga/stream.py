@@ -0,0 +1,245 @@
+""" Streaming acquisition of the analog inputs.
+
+An AnalogStream reads a set of analog inputs continuously from a background
+thread. Each burst of pipelined read requests samples every channel several
+times in a single round trip, and with a threaded register interface several
+bursts are kept in flight, so that the link is never idle. The samples land
+in a preallocated numpy ring buffer along with host monotonic timestamps,
+from which they are consumed in chunks:
+
+    with mufpga.open_analog_stream(channels=[0, 1]) as stream:
+        for chunk in stream:
+            process(chunk.timestamps, chunk.values)
+
+The timestamps of a burst are spread evenly over the time the FPGA took to
+answer it. If the consumer falls behind by more than the capacity of the
+buffer, the oldest samples are dropped and counted. Bursts with missing
+answers are counted as failed, and the acquisition stops if the device is
+disconnected.
+
+AnalogStream requires numpy.
+"""
+import threading
+import time
+from collections import deque
+from typing import NamedTuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Delay (s) before a new burst is requested after a failed one.
+RETRY_DELAY = 0.01
+
+# pylint: disable=too-many-arguments
+# pylint: disable=too-many-instance-attributes
+
+
+class AnalogChunk(NamedTuple):
+    """ Samples read from an AnalogStream.
+
+    Attributes:
+        timestamps: time.monotonic() timestamps (s) of the samples, float64
+            array of shape (n_samples,).
+        values: values of the samples, uint16 array of shape (n_samples,
+            n_channels), in the order of the stream channels.
+    """
+    timestamps: "np.ndarray"
+    values: "np.ndarray"
+
+
+class AnalogStream:
+    """ Continuous acquisition of analog inputs into a ring buffer.
+
+    The acquisition runs between start and stop, or within a with block.
+
+    Args:
+        serial_com (RegisterInterface): register interface.
+        addresses: register addresses of the analog inputs to sample.
+        capacity (int): number of samples held by the ring buffer.
+        burst (int): number of samples of each channel read per round trip.
+        depth (int): number of bursts in flight, only used if the register
+            interface is threaded.
+    """
+    def __init__(
+            self,
+            serial_com,
+            addresses,
+            capacity=65536,
+            burst=32,
+            depth=2,
+    ):
+        if np is None:
+            raise ImportError("AnalogStream requires numpy.")
+        addresses = tuple(addresses)
+        if not addresses:
+            raise ValueError("No analog input to sample.")
+        if capacity < burst:
+            raise ValueError(
+                f"The capacity ({capacity}) is smaller than a burst "
+                f"({burst})."
+            )
+
+        self._serial_com = serial_com
+        self.addresses = addresses
+        self.capacity = capacity
+        self.burst = burst
+        self.depth = depth if serial_com.is_threaded() else 1
+
+        self._requests = list(self.addresses) * burst
+        self._values = np.zeros((capacity, len(self.addresses)), np.uint16)
+        self._timestamps = np.zeros(capacity, np.float64)
+        self._spread = (np.arange(burst) + 0.5) / burst
+
+        self._condition = threading.Condition()
+        self._thread = None
+        self._running = False
+        self.n_samples = 0
+        self.n_dropped = 0
+        self.n_failed = 0
+        self._consumed = 0
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def __iter__(self):
+        return self.chunks()
+
+    def start(self):
+        """ Start the acquisition.
+
+        :return:
+        """
+        with self._condition:
+            if self._running:
+                return
+            self._running = True
+
+        self._thread = threading.Thread(
+            target=self._run, name="AnalogStream", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        """ Stop the acquisition. Samples not yet consumed can still be read.
+
+        :return:
+        """
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def is_running(self):
+        """ Check if the acquisition is running.
+
+        :return: True if it is, False otherwise.
+        """
+        return self._running
+
+    def _run(self):
+        pending = deque()
+        last = time.monotonic()
+        try:
+            while self._running:
+                while len(pending) < self.depth:
+                    pending.append(
+                        (
+                            time.monotonic(),
+                            self._serial_com.submit_read_many(self._requests)
+                        )
+                    )
+
+                sent, future = pending.popleft()
+                values = future.result()
+                received = time.monotonic()
+
+                # pipelined bursts are answered after the previous one
+                start = max(sent, last)
+                last = received
+                if not self._store(start, received, values):
+                    # missing answers, e.g. timeout or disconnection
+                    self.n_failed += self.burst
+                    if not self._serial_com.is_connected():
+                        break
+                    time.sleep(RETRY_DELAY)
+        finally:
+            for _, future in pending:
+                future.cancel()
+            with self._condition:
+                self._running = False
+                self._condition.notify_all()
+
+    def _store(self, start, end, values):
+        if len(values) != len(self._requests):
+            return False
+        values = np.array(values, dtype=np.int64).reshape(self.burst, -1)
+        if (values < 0).any():
+            return False
+
+        timestamps = start + (end - start) * self._spread
+        with self._condition:
+            index = self.n_samples % self.capacity
+            n_first = min(self.burst, self.capacity - index)
+            self._values[index:index + n_first] = values[:n_first]
+            self._timestamps[index:index + n_first] = timestamps[:n_first]
+            self._values[:self.burst - n_first] = values[n_first:]
+            self._timestamps[:self.burst - n_first] = timestamps[n_first:]
+            self.n_samples += self.burst
+
+            overrun = self.n_samples - self._consumed - self.capacity
+            if overrun > 0:
+                self.n_dropped += overrun
+                self._consumed += overrun
+            self._condition.notify_all()
+        return True
+
+    def read(self, max_samples=None, timeout=None):
+        """ Return the samples acquired since the last read.
+
+        :param max_samples: maximum number of samples returned.
+        :param timeout: maximum time (s) to wait for samples if there are
+            none, None to wait until samples are acquired or the acquisition
+            stops.
+        :return: AnalogChunk, possibly empty.
+        """
+        with self._condition:
+            self._condition.wait_for(
+                lambda: self.n_samples > self._consumed or not self._running,
+                timeout
+            )
+
+            n_available = self.n_samples - self._consumed
+            if max_samples is not None:
+                n_available = min(n_available, max_samples)
+
+            indices = (
+                np.arange(self._consumed, self._consumed + n_available) %
+                self.capacity
+            )
+            self._consumed += n_available
+            return AnalogChunk(
+                timestamps=self._timestamps[indices],
+                values=self._values[indices],
+            )
+
+    def chunks(self, max_samples=None):
+        """ Iterate over the samples in chunks until the acquisition stops.
+
+        :param max_samples: maximum number of samples per chunk.
+        :return: iterator of AnalogChunk.
+        """
+        while True:
+            chunk = self.read(max_samples)
+            if len(chunk.timestamps):
+                yield chunk
+            elif not self._running:
+                return
@@ -0,0 +1,306 @@
+""" Transports carrying the bytes of the register interface protocol.
+
+A transport is a byte stream to the FPGA, with a pyserial-like interface
+(write, read, readinto, reset_input_buffer and close). The following
+transports are available:
+    - SerialTransport: USB serial port (or any pyserial URL).
+    - TcpTransport: raw TCP socket, e.g. to a serial-over-Ethernet bridge.
+    - LoopbackTransport: in-memory connection to a local peer answering the
+        protocol, by default a RegisterFile.
+
+Transports can also be created from a URL with open_transport:
+    - "tcp://<host>:<port>"
+    - "loop://"
+    - "serial://<device>" or "<device>"
+"""
+import io
+import socket
+import struct
+import threading
+from abc import ABC, abstractmethod
+import serial
+
+# Serial communication parameters.
+BAUDRATE = 57600
+TIMEOUT = 1
+
+# Request flag and formats, as seen from the FPGA side.
+_WRITE_FLAG = 1 << 7
+_WRITE_REQUEST = struct.Struct("<BII")
+_READ_REQUEST = struct.Struct("<BI")
+_ANSWER = struct.Struct("<I")
+
+
+class Transport(ABC):
+    """ Base class of the transports.
+
+    Reads return fewer bytes than requested if the data is not available
+    before the transport timeout.
+    """
+
+    name = None
+
+    @abstractmethod
+    def write(self, data):
+        """ Write data.
+
+        :param data: bytes-like data.
+        :return: number of bytes written.
+        """
+
+    @abstractmethod
+    def read(self, size):
+        """ Read up to size bytes.
+
+        :param size: number of bytes to read.
+        :return: bytes read.
+        """
+
+    def readinto(self, buffer):
+        """ Read up to len(buffer) bytes into a buffer.
+
+        :param buffer: writable buffer.
+        :return: number of bytes read.
+        """
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def reset_input_buffer(self):
+        """ Discard the data received and not read yet, e.g. the answers
+        arriving after a read timed out. Does nothing by default.
+
+        :return:
+        """
+
+    @abstractmethod
+    def close(self):
+        """ Close the transport. """
+
+    def fileno(self):
+        """ Return the file descriptor of the transport, if any.
+
+        :return: file descriptor.
+        """
+        raise io.UnsupportedOperation(f"{type(self).__name__} has no fileno")
+
+
+class SerialTransport(Transport):
+    """ Transport over a serial port.
+
+    Args:
+        device (str): serial port, or pyserial URL.
+        baudrate (int): baud rate.
+        timeout (float): read timeout (s).
+    """
+    def __init__(self, device, baudrate=BAUDRATE, timeout=TIMEOUT):
+        self.name = device
+        self._serial = serial.serial_for_url(
+            device, baudrate=baudrate, timeout=timeout
+        )
+
+    def write(self, data):
+        return self._serial.write(data)
+
+    def read(self, size):
+        return self._serial.read(size)
+
+    def readinto(self, buffer):
+        return self._serial.readinto(buffer)
+
+    def reset_input_buffer(self):
+        self._serial.reset_input_buffer()
+
+    def close(self):
+        self._serial.close()
+
+    def fileno(self):
+        return self._serial.fileno()
+
+
+class TcpTransport(Transport):
+    """ Transport over a raw TCP socket, e.g. to a serial-over-Ethernet
+    bridge.
+
+    Args:
+        host (str): host name or IP address.
+        port (int): TCP port.
+        timeout (float): connection and read timeout (s).
+    """
+    def __init__(self, host, port, timeout=TIMEOUT):
+        self.name = f"tcp://{host}:{port}"
+        self._socket = socket.create_connection((host, port), timeout=timeout)
+        self._socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def write(self, data):
+        self._socket.sendall(data)
+        return len(data)
+
+    def readinto(self, buffer):
+        view = memoryview(buffer).cast("B")
+        n_bytes = 0
+        while n_bytes < len(view):
+            try:
+                received = self._socket.recv_into(view[n_bytes:])
+            except socket.timeout:
+                break
+
+            if received == 0:
+                break
+            n_bytes += received
+
+        return n_bytes
+
+    def read(self, size):
+        buff = bytearray(size)
+        return bytes(buff[:self.readinto(buff)])
+
+    def reset_input_buffer(self):
+        timeout = self._socket.gettimeout()
+        self._socket.setblocking(False)
+        try:
+            while self._socket.recv(4096):
+                pass
+        except (BlockingIOError, InterruptedError):
+            pass
+        finally:
+            self._socket.settimeout(timeout)
+
+    def close(self):
+        self._socket.close()
+
+    def fileno(self):
+        return self._socket.fileno()
+
+
+class RegisterFile:
+    """ In-memory register file answering the register interface protocol.
+
+    Write requests update the registers, read requests are answered with the
+    register value (0 if never written). Requests can be split across several
+    calls to process.
+
+    Args:
+        registers (dict): initial address -> value of the registers.
+    """
+    def __init__(self, registers=None):
+        self.registers = dict(registers) if registers else {}
+        self._requests = bytearray()
+
+    def write_register(self, address, value):
+        """ Process a write request.
+
+        :param address: register address.
+        :param value: new value.
+        :return:
+        """
+        self.registers[address] = value
+
+    def read_register(self, address):
+        """ Process a read request.
+
+        :param address: register address.
+        :return: register value.
+        """
+        return self.registers.get(address, 0)
+
+    def process(self, data):
+        """ Process incoming requests.
+
+        :param data: bytes received from the host.
+        :return: answers to the complete read requests.
+        """
+        requests = self._requests
+        requests += data
+
+        answers = bytearray()
+        offset = 0
+        while offset < len(requests):
+            if requests[offset] & _WRITE_FLAG:
+                if len(requests) - offset < _WRITE_REQUEST.size:
+                    break
+                _, address, value = _WRITE_REQUEST.unpack_from(
+                    requests, offset
+                )
+                self.write_register(address, value)
+                offset += _WRITE_REQUEST.size
+            else:
+                if len(requests) - offset < _READ_REQUEST.size:
+                    break
+                _, address = _READ_REQUEST.unpack_from(requests, offset)
+                answers += _ANSWER.pack(self.read_register(address))
+                offset += _READ_REQUEST.size
+
+        del requests[:offset]
+        return bytes(answers)
+
+
+class LoopbackTransport(Transport):
+    """ In-memory transport to a local peer.
+
+    The data written is passed to the peer, and its answers are buffered to
+    be read. Reads never block: if not enough data is available, fewer bytes
+    are returned, as if the read had timed out.
+
+    Args:
+        peer: object processing the requests with a process(data) method
+            returning the answers, by default a new RegisterFile.
+    """
+    def __init__(self, peer=None):
+        self.name = "loop://"
+        self.peer = RegisterFile() if peer is None else peer
+        self._answers = bytearray()
+        self._lock = threading.Lock()
+
+    def write(self, data):
+        answers = self.peer.process(bytes(data))
+        with self._lock:
+            self._answers += answers
+        return len(data)
+
+    def read(self, size):
+        with self._lock:
+            data = bytes(self._answers[:size])
+            del self._answers[:size]
+        return data
+
+    def readinto(self, buffer):
+        with self._lock:
+            n_bytes = min(len(buffer), len(self._answers))
+            buffer[:n_bytes] = self._answers[:n_bytes]
+            del self._answers[:n_bytes]
+        return n_bytes
+
+    def reset_input_buffer(self):
+        with self._lock:
+            self._answers.clear()
+
+    def close(self):
+        with self._lock:
+            self._answers.clear()
+
+
+def open_transport(url):
+    """ Open a transport from a URL.
+
+    Supported URLs are "tcp://<host>:<port>", "loop://" and
+    "serial://<device>". Any other string is considered to be a serial device
+    or pyserial URL.
+
+    :param url: URL, or Transport which is then returned as is.
+    :return: transport.
+    """
+    if isinstance(url, Transport):
+        return url
+
+    if url.startswith("tcp://"):
+        host, port = url[len("tcp://"):].rsplit(":", 1)
+        return TcpTransport(host, int(port))
+
+    if url == "loop://":
+        return LoopbackTransport()
+
+    if url.startswith("serial://"):
+        url = url[len("serial://"):]
+
+    return SerialTransport(url)